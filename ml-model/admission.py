@@ -0,0 +1,206 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+from config import Config
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued; carries a retry hint"""
+
+    status_code = 503
+
+    def __init__(self, message, lane, retry_after):
+        super().__init__(message)
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class LaneFull(Overloaded):
+    """The lane's wait queue is full: the caller is sending faster than it is served"""
+
+    status_code = 429
+
+
+class LaneTimeout(Overloaded):
+    """The request waited `max_wait` seconds without getting a slot"""
+
+
+class _Ticket:
+    __slots__ = ('event', 'granted', 'queued_at')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.queued_at = time.perf_counter()
+
+
+class Lane:
+    """One request class: its wait queue, scheduling weight and latency history"""
+
+    def __init__(self, name, weight, max_queue, max_wait, max_active, latency_window=1000):
+        self.name = name
+        self.weight = weight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_active = max_active
+        self.waiting = deque()
+        self.active = 0
+        self.current_weight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_times = deque(maxlen=latency_window)
+        self.latencies = deque(maxlen=latency_window)
+
+    def service_time(self):
+        """Mean time a request of this lane holds its slot"""
+        if not self.latencies:
+            return 0.05
+        return max(float(np.mean(self.latencies)) - float(np.mean(self.wait_times)), 0.001)
+
+    def get_stats(self):
+        def percentiles(values):
+            if not values:
+                return None
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+        return {
+            'weight': self.weight,
+            'queue_depth': len(self.waiting),
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'max_active': self.max_active,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'wait': percentiles(self.wait_times),
+            'latency': percentiles(self.latencies)
+        }
+
+
+class AdmissionController:
+    """Admission control and weighted scheduling of request lanes.
+
+    At most `slots` requests run at once; the rest wait in a bounded queue
+    per lane. Whenever a slot frees up, the next request is taken from the
+    lanes with waiters by smooth weighted round-robin, so a burst of bulk
+    work gets its share of slots without starving interactive calls. A lane
+    can also be capped below `slots` (bulk by default), which keeps a slot
+    free for interactive requests however large the backlog is.
+
+    Work that cannot be queued is shed right away: a full lane raises
+    LaneFull (429) and a request that waited `max_wait` raises LaneTimeout
+    (503), both with a Retry-After estimate.
+    """
+
+    def __init__(self, slots=None, lanes=None):
+        self.slots = slots or Config.ADMISSION_SLOTS
+        if lanes is None:
+            lanes = [
+                Lane(INTERACTIVE, Config.INTERACTIVE_WEIGHT, Config.INTERACTIVE_QUEUE_SIZE,
+                     Config.INTERACTIVE_MAX_WAIT, self.slots),
+                Lane(BULK, Config.BULK_WEIGHT, Config.BULK_QUEUE_SIZE, Config.BULK_MAX_WAIT,
+                     Config.BULK_MAX_ACTIVE or max(1, self.slots - 1))
+            ]
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.active = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, lane_name, blocking=False):
+        """Hold one execution slot for the duration of the block.
+
+        `blocking` callers (background job workers, whose backlog is already
+        bounded) wait for a slot as long as it takes and are never shed.
+        """
+        lane = self.lanes[lane_name]
+        ticket = self._enqueue(lane, blocking)
+        if not ticket.event.wait(None if blocking else lane.max_wait):
+            self._abandon(lane, ticket)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(lane, ticket, started)
+
+    def _enqueue(self, lane, blocking):
+        with self._lock:
+            if not blocking and len(lane.waiting) >= lane.max_queue:
+                lane.rejected += 1
+                raise LaneFull(f"{lane.name} queue is full ({lane.max_queue} waiting requests)",
+                               lane.name, self._retry_after(lane))
+            ticket = _Ticket()
+            lane.waiting.append(ticket)
+            self._dispatch()
+            return ticket
+
+    def _abandon(self, lane, ticket):
+        with self._lock:
+            # The slot may have been granted between the timeout and the lock
+            if ticket.granted:
+                return
+            lane.waiting.remove(ticket)
+            lane.timed_out += 1
+            raise LaneTimeout(f"{lane.name} request waited more than {lane.max_wait:g}s for a slot",
+                              lane.name, self._retry_after(lane))
+
+    def _release(self, lane, ticket, started):
+        finished = time.perf_counter()
+        with self._lock:
+            lane.active -= 1
+            self.active -= 1
+            lane.wait_times.append(started - ticket.queued_at)
+            lane.latencies.append(finished - ticket.queued_at)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiting requests (called with the lock held)"""
+        while self.active < self.slots:
+            ready = [lane for lane in self.lanes.values() if lane.waiting and lane.active < lane.max_active]
+            if not ready:
+                return
+            # Smooth weighted round-robin over the lanes that have work
+            total = 0
+            for lane in ready:
+                lane.current_weight += lane.weight
+                total += lane.weight
+            chosen = max(ready, key=lambda lane: lane.current_weight)
+            chosen.current_weight -= total
+
+            ticket = chosen.waiting.popleft()
+            ticket.granted = True
+            chosen.active += 1
+            chosen.admitted += 1
+            self.active += 1
+            ticket.event.set()
+
+    def _retry_after(self, lane):
+        """Seconds until the lane's current backlog should have drained"""
+        backlog = len(lane.waiting) + lane.active
+        return max(1, math.ceil(backlog * lane.service_time() / max(lane.max_active, 1)))
+
+    def lane_for(self, requested, default):
+        """Lane a client asked for (e.g. with an X-Request-Lane header), or the route default.
+
+        Lanes are listed from highest to lowest priority; clients may only
+        move their own requests down, never ahead of the route's lane.
+        """
+        names = list(self.lanes)
+        if requested in self.lanes and names.index(requested) > names.index(default):
+            return requested
+        return default
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'active': self.active,
+                'lanes': {name: lane.get_stats() for name, lane in self.lanes.items()}
+            }
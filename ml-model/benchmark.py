@@ -0,0 +1,522 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import msgpack
+from cascade import CascadeStats
+from config import Config
+
+
+def build_sample_predictions(n_emails, include_features=True):
+    """Build representative /batch_predict payloads without needing trained models"""
+    predictions = []
+    for i in range(n_emails):
+        prediction = {
+            'isImportant': i % 3 == 0,
+            'confidence': 0.8731 - (i % 10) * 0.01,
+            'primaryCategory': Config.CATEGORIES[i % len(Config.CATEGORIES)],
+            'categoryConfidence': 0.6512,
+            'categories': [
+                {'name': 'opportunities', 'confidence': 0.6512},
+                {'name': 'jobs', 'confidence': 0.2213},
+                {'name': 'events', 'confidence': 0.1275}
+            ],
+            'index': i
+        }
+        if include_features:
+            prediction['features'] = {
+                'textLength': 1200 + i,
+                'hasDeadline': i % 2 == 0,
+                'hasUrgent': False,
+                'senderDomain': 'university.example.com'
+            }
+        predictions.append(prediction)
+
+    return {
+        'predictions': predictions,
+        'errors': [],
+        'total_processed': n_emails,
+        'total_errors': 0,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def _time_per_email(func, repeats, n_emails):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / (repeats * n_emails) * 1e6
+
+
+def benchmark_serialization(n_emails=100, repeats=200):
+    """Compare JSON and MessagePack encode/decode cost per email"""
+    print(f"Serialization benchmark ({n_emails} emails/batch, {repeats} repeats)")
+    print(f"{'format':<10}{'features':<10}{'bytes/email':>12}{'encode us':>12}{'decode us':>12}")
+
+    results = {}
+    for with_features in (True, False):
+        payload = build_sample_predictions(n_emails, include_features=with_features)
+
+        json_body = json.dumps(payload).encode('utf-8')
+        msgpack_body = msgpack.packb(payload, use_bin_type=True)
+
+        formats = {
+            'json': (
+                lambda: json.dumps(payload).encode('utf-8'),
+                lambda: json.loads(json_body),
+                json_body
+            ),
+            'msgpack': (
+                lambda: msgpack.packb(payload, use_bin_type=True),
+                lambda: msgpack.unpackb(msgpack_body, raw=False),
+                msgpack_body
+            )
+        }
+
+        for name, (encode, decode, body) in formats.items():
+            encode_us = _time_per_email(encode, repeats, n_emails)
+            decode_us = _time_per_email(decode, repeats, n_emails)
+            results[(name, with_features)] = {
+                'bytes_per_email': len(body) / n_emails,
+                'encode_us': encode_us,
+                'decode_us': decode_us
+            }
+            print(f"{name:<10}{str(with_features):<10}{len(body) / n_emails:>12.1f}"
+                  f"{encode_us:>12.2f}{decode_us:>12.2f}")
+
+    return results
+
+
+def build_sample_emails(n_emails):
+    """Build HTML and plain-text emails of realistic length"""
+    paragraph = (
+        "We are excited to announce applications for our summer internship program. "
+        "Students can apply now for software engineering and data science positions. "
+        "The deadline is March 15th, and selected candidates will receive mentorship. "
+    )
+    emails = []
+    for i in range(n_emails):
+        body = paragraph * (4 + i % 6)
+        emails.append({
+            'subject': f"Internship opportunity #{i} - apply before the deadline!",
+            'body': {'html': f"<html><body><p>{body}</p><ul><li>Apply</li></ul></body></html>"} if i % 2 else body,
+            'sender': f"careers{i % 13}@company{i % 29}.com"
+        })
+    return emails
+
+
+def benchmark_preprocessing_scaling(n_emails=2000):
+    """Measure preprocessing throughput of the worker pool against core count"""
+    from worker_pool import PreprocessingPool
+
+    emails = build_sample_emails(n_emails)
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({0, 1, 2, 4, cores} & set(range(cores + 1)))
+
+    print(f"Preprocessing scaling benchmark ({n_emails} emails, {cores} cores)")
+    print(f"{'workers':<10}{'emails/s':>12}{'speedup':>10}")
+
+    results = {}
+    baseline = None
+    for workers in worker_counts:
+        pool = PreprocessingPool(max_workers=workers)
+        try:
+            # Warm up so worker start-up is not measured
+            pool.extract_batch(emails[:max(workers, 1) * 4])
+            start = time.perf_counter()
+            pool.extract_batch(emails)
+            throughput = n_emails / (time.perf_counter() - start)
+        finally:
+            pool.shutdown()
+
+        baseline = baseline or throughput
+        results[workers] = throughput
+        label = 'inline' if workers == 0 else str(workers)
+        print(f"{label:<10}{throughput:>12.1f}{throughput / baseline:>9.2f}x")
+
+    return results
+
+
+def benchmark_cascade(n_emails=500):
+    """Compare cascade inference with the full models alone on a trained artifact"""
+    from predict import EmailPredictor
+    from worker_pool import PreprocessingPool
+
+    predictor = EmailPredictor()
+    try:
+        predictor.load_models()
+    except FileNotFoundError as e:
+        print(f"Skipping cascade benchmark: {e}")
+        return None
+    finally:
+        predictor.preprocessing.shutdown()
+
+    fast_models = {name: predictor.models.pop(name, None) for name in ('fast_importance', 'fast_category')}
+    if not any(fast_models.values()):
+        print("Skipping cascade benchmark: model has no fast stage (retrain with train_model.py)")
+        return None
+
+    pool = PreprocessingPool(max_workers=0)
+    features = pool.extract_batch(build_sample_emails(n_emails))
+    features = [f for f, error in features if error is None]
+
+    print(f"Cascade benchmark ({len(features)} emails, threshold {Config.CASCADE_THRESHOLD})")
+    print(f"{'mode':<10}{'us/email':>12}{'fast share':>12}{'agreement':>12}")
+
+    results = {}
+    for mode in ('full', 'cascade'):
+        if mode == 'cascade':
+            predictor.models.update(fast_models)
+        predictor.cascade_stats = CascadeStats()
+        start = time.perf_counter()
+        predictions = [predictor._predict_from_features(f) for f in features]
+        latency_us = (time.perf_counter() - start) / len(features) * 1e6
+        results[mode] = {'latency_us': latency_us, 'predictions': predictions}
+
+    full = results['full']['predictions']
+    cascade = results['cascade']['predictions']
+    agreement = sum(
+        a['isImportant'] == b['isImportant'] and a['primaryCategory'] == b['primaryCategory']
+        for a, b in zip(full, cascade)
+    ) / len(full)
+    served = predictor.cascade_stats.get_stats()
+    fast_share = served.get('category', {}).get('fast_share', 0.0)
+    results['cascade']['agreement'] = agreement
+    results['cascade']['served'] = served
+
+    print(f"{'full':<10}{results['full']['latency_us']:>12.1f}{0.0:>12.1%}{1.0:>12.1%}")
+    print(f"{'cascade':<10}{results['cascade']['latency_us']:>12.1f}{fast_share:>12.1%}{agreement:>12.1%}")
+
+    # Held-out accuracy measured at training time
+    for head, metrics in (predictor.cascade_report or {}).items():
+        print(f"{head}: held-out accuracy {metrics['cascade_accuracy']:.4f} cascade vs "
+              f"{metrics['full_accuracy']:.4f} full ({metrics['fast_share']:.1%} answered by fast stage)")
+
+    return results
+
+
+def benchmark_inference_kernel(n_emails=500):
+    """Per-email model latency of the compiled numpy kernel against scikit-learn"""
+    from predict import EmailPredictor
+    from worker_pool import PreprocessingPool
+
+    features = [f for f, error in PreprocessingPool(max_workers=0).extract_batch(build_sample_emails(n_emails))
+                if error is None]
+
+    print(f"Inference kernel benchmark ({len(features)} emails)")
+    print(f"{'backend':<10}{'us/email':>12}{'speedup':>10}")
+
+    results = {}
+    original = Config.INFERENCE_KERNEL_ENABLED
+    try:
+        for backend, enabled in (('sklearn', False), ('kernel', True)):
+            Config.INFERENCE_KERNEL_ENABLED = enabled
+            predictor = EmailPredictor()
+            predictor.preprocessing.shutdown()
+            try:
+                predictor.load_models()
+            except FileNotFoundError as e:
+                print(f"Skipping inference kernel benchmark: {e}")
+                return None
+            if enabled and predictor.kernel is None:
+                print("Skipping kernel: no compiled kernel was exported (retrain with train_model.py)")
+                break
+
+            predictor._predict_from_features(features[0])
+            start = time.perf_counter()
+            for f in features:
+                predictor._predict_from_features(f)
+            results[backend] = (time.perf_counter() - start) / len(features) * 1e6
+            print(f"{backend:<10}{results[backend]:>12.1f}{results['sklearn'] / results[backend]:>9.2f}x")
+    finally:
+        Config.INFERENCE_KERNEL_ENABLED = original
+
+    return results
+
+
+def benchmark_deadlines(n_emails=2000, repeats=5):
+    """Throughput of deadline extraction alone and its share of preprocessing"""
+    from deadlines import DeadlineExtractor
+    from data_processor import EmailDataProcessor
+
+    emails = build_sample_emails(n_emails)
+    processor = EmailDataProcessor()
+    texts = []
+    for email in emails:
+        body = email['body']
+        if isinstance(body, dict):
+            body = processor.clean_html(body['html'])
+        texts.append(f"{email['subject']} {body} Submit by Friday 5pm or within 2 weeks of 04/02/2024.")
+
+    extractor = DeadlineExtractor()
+    reference = datetime(2024, 3, 6)
+    n_bytes = sum(len(text) for text in texts)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in texts:
+            extractor.extract(text, reference)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for email in emails[:200]:
+        processor.extract_features(email)
+    preprocess_per_email = (time.perf_counter() - start) / 200
+
+    print(f"Deadline extraction benchmark ({n_emails} emails, {n_bytes / n_emails:.0f} chars/email)")
+    print(f"{'emails/s':>12}{'MB/s':>10}{'us/email':>12}{'% of preprocessing':>20}")
+    per_email = elapsed / n_emails
+    print(f"{n_emails / elapsed:>12.0f}{n_bytes / elapsed / 1e6:>10.1f}{per_email * 1e6:>12.1f}"
+          f"{per_email / preprocess_per_email:>20.1%}")
+
+    return {'emails_per_second': n_emails / elapsed, 'share_of_preprocessing': per_email / preprocess_per_email}
+
+
+def benchmark_similar(n_docs=2000000, n_users=5000, n_queries=500, vocabulary_size=50000, k=10):
+    """Load time and top-k query latency of the similar-email index on synthetic emails"""
+    import tempfile
+    import numpy as np
+    from similar import SimilarityIndex
+
+    rng = np.random.default_rng(0)
+    index_dir = tempfile.mkdtemp(prefix='similar-')
+    index = SimilarityIndex(index_dir)
+    n_terms = index.terms_per_doc
+
+    # Zipf-distributed term ids, like real email vocabularies, written straight to the record file
+    records = np.zeros(n_docs, dtype=index.record_dtype)
+    records['terms'] = np.minimum(rng.zipf(1.3, size=(n_docs, n_terms)) - 1, vocabulary_size - 1)
+    weights = rng.random((n_docs, n_terms)).astype(np.float32)
+    records['weights'] = weights / np.linalg.norm(weights, axis=1, keepdims=True)
+    records['owner'] = rng.integers(0, n_users, size=n_docs)
+    index.close()
+    records.tofile(os.path.join(index_dir, 'records.bin'))
+    with open(os.path.join(index_dir, 'ids.txt'), 'w') as f:
+        f.write(''.join(f"email-{i}\t{owner}\n" for i, owner in enumerate(records['owner'])))
+
+    start = time.perf_counter()
+    index = SimilarityIndex(index_dir)
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for i in rng.integers(0, n_docs, size=n_queries):
+        owner = str(records['owner'][i])
+        indices, values = index.vector(f"email-{i}", owner)
+        start = time.perf_counter()
+        index.query(indices, values, owner=owner, k=k)
+        latencies.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+
+    stats = index.get_stats()
+    index.close()
+    print(f"Similar-email index benchmark ({n_docs} emails, {n_users} users, {stats['postings']} postings, "
+          f"{stats['memory_bytes'] / 1e6:.0f} MB, loaded in {load_seconds:.1f}s)")
+    print(f"top-{k} query: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+    return {'load_seconds': load_seconds, 'p50_ms': p50, 'p95_ms': p95}
+
+
+class _SharedCpu:
+    """Processor-sharing model of a server with `cores` cores.
+
+    Each call to `run` needs `seconds` of CPU and progresses at
+    min(1, cores / running) of real time, the way an OS scheduler shares
+    cores between runnable threads. Python's own interpreter lock does not
+    share a core like this, so spinning threads would not show the effect.
+    """
+
+    def __init__(self, cores):
+        self.cores = cores
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def run(self, seconds):
+        with self._lock:
+            self.running += 1
+        try:
+            last = time.perf_counter()
+            while seconds > 0:
+                time.sleep(0.0002)
+                now = time.perf_counter()
+                with self._lock:
+                    share = min(1.0, self.cores / self.running)
+                seconds -= (now - last) * share
+                last = now
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def benchmark_admission(duration=3.0, cores=4, bulk_clients=16, interactive_work=0.002, bulk_work=0.02):
+    """Interactive latency under a bulk burst, with and without admission control"""
+    import numpy as np
+    from admission import AdmissionController, Lane, Overloaded, INTERACTIVE, BULK
+
+    def run(controller):
+        cpu = _SharedCpu(cores)
+        stop = threading.Event()
+        counts = {'bulk': 0, 'shed': 0}
+        lock = threading.Lock()
+
+        def call(lane, work):
+            if controller is None:
+                cpu.run(work)
+                return True
+            try:
+                with controller.admit(lane):
+                    cpu.run(work)
+                return True
+            except Overloaded:
+                return False
+
+        def bulk_client():
+            while not stop.is_set():
+                served = call(BULK, bulk_work)
+                with lock:
+                    counts['bulk' if served else 'shed'] += 1
+                if not served:
+                    time.sleep(0.01)
+
+        threads = [threading.Thread(target=bulk_client) for _ in range(bulk_clients)]
+        for thread in threads:
+            thread.start()
+        latencies = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            call(INTERACTIVE, interactive_work)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return np.percentile(latencies, [50, 99]) * 1000, counts
+
+    # One slot per core, bulk limited to all but one of them
+    controller = AdmissionController(slots=cores, lanes=[
+        Lane(INTERACTIVE, Config.INTERACTIVE_WEIGHT, Config.INTERACTIVE_QUEUE_SIZE, Config.INTERACTIVE_MAX_WAIT, cores),
+        Lane(BULK, Config.BULK_WEIGHT, Config.BULK_QUEUE_SIZE, Config.BULK_MAX_WAIT, cores - 1)
+    ])
+    results = {'no admission': run(None), 'admission': run(controller)}
+
+    print(f"Admission control benchmark ({cores} cores, {bulk_clients} bulk clients x {bulk_work * 1000:.0f} ms, "
+          f"interactive {interactive_work * 1000:.0f} ms)")
+    print(f"{'mode':<14}{'interactive p50':>17}{'p99':>10}{'bulk/s':>10}{'shed/s':>10}")
+    for label, ((p50, p99), counts) in results.items():
+        print(f"{label:<14}{p50:>14.1f} ms{p99:>7.1f} ms{counts['bulk'] / duration:>10.0f}"
+              f"{counts['shed'] / duration:>10.0f}")
+
+    return {label: {'p50_ms': p50, 'p99_ms': p99, **counts} for label, ((p50, p99), counts) in results.items()}
+
+
+def _sample_training_rows(n_rows):
+    """Rows shaped like the training dataset, with distinct text per row"""
+    words = "intern appli program softwar engin data scienc deadlin march mentor select candid summer".split()
+    for i in range(n_rows):
+        text = ' '.join(words[(i + j) % len(words)] for j in range(60)) + f" ref{i}"
+        yield {
+            'text': text, 'subject_length': 40 + i % 30, 'body_length': len(text) * 2,
+            'sender_domain': f"company{i % 997}.com", 'has_deadline': i % 3 == 0, 'has_urgent': i % 7 == 0,
+            'has_apply': i % 2 == 0, 'has_opportunity': i % 5 == 0, 'word_count': 61 + i % 40,
+            'exclamation_count': i % 4, 'question_count': i % 3, 'caps_ratio': (i % 100) / 1000,
+            'user_id': f"user{i % 500}", 'category': Config.CATEGORIES[i % len(Config.CATEGORIES)],
+            'is_important': i % 4 == 0, 'confidence': (i % 10) / 10
+        }
+
+
+def _dataset_in_subprocess(layout, step, n_rows, path):
+    """Build and save, or load, one dataset layout; report frame size, time and peak RSS growth"""
+    import resource
+    import joblib
+    import pandas as pd
+    from data_processor import (
+        NUMERICAL_FEATURES, training_frame_from_rows, save_training_dataset, load_training_dataset
+    )
+    from train_model import EmailClassifierTrainer
+
+    trainer = EmailClassifierTrainer()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if step == 'load':
+        df = load_training_dataset(path) if layout == 'compact' else joblib.load(path)
+    elif layout == 'compact':
+        df = training_frame_from_rows(_sample_training_rows(n_rows))
+    else:
+        # The previous layout: a list of row dicts turned into object/int64/float64/bool columns
+        df = pd.DataFrame(list(_sample_training_rows(n_rows)))
+
+    if layout == 'compact':
+        trainer.prepare_data(df)
+    else:
+        # The previous prepare_data copied both column groups through fillna
+        df['text'].fillna('')
+        df[NUMERICAL_FEATURES].fillna(0)
+    elapsed = time.perf_counter() - start
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) * 1024
+
+    if step == 'build':
+        if layout == 'compact':
+            save_training_dataset(df, path)
+        else:
+            joblib.dump(df, path)
+    return df.memory_usage(deep=True).sum(), elapsed, peak
+
+
+def benchmark_dataset(n_rows=200000):
+    """Memory and load time of the typed training DataFrame against the previous object layout"""
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    def measure(*args):
+        # A fresh process per step: Linux keeps the peak RSS across fork/exec, so the parent stays small
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            return pool.submit(_dataset_in_subprocess, *args).result()
+
+    print(f"Training dataset benchmark ({n_rows} rows)")
+    print(f"{'layout':<10}{'step':<8}{'frame MB':>10}{'peak RSS MB':>13}{'seconds':>10}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for layout, file_name in (('object', 'dataset.joblib'), ('compact', 'dataset.parquet')):
+            for step in ('build', 'load'):
+                size, elapsed, peak = measure(layout, step, n_rows, os.path.join(tmp_dir, file_name))
+                results[f"{layout}_{step}"] = {'frame_bytes': int(size), 'peak_rss_bytes': int(peak), 'seconds': elapsed}
+                print(f"{layout:<10}{step:<8}{size / 1e6:>10.1f}{peak / 1e6:>13.1f}{elapsed:>10.2f}")
+
+    return results
+
+
+BENCHMARKS = {
+    'serialization': benchmark_serialization,
+    'preprocessing': benchmark_preprocessing_scaling,
+    'cascade': benchmark_cascade,
+    'kernel': benchmark_inference_kernel,
+    'deadlines': benchmark_deadlines,
+    'similar': benchmark_similar,
+    'admission': benchmark_admission,
+    'dataset': benchmark_dataset
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MailSift ML micro-benchmarks')
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"Benchmarks to run (default: all): {', '.join(sorted(BENCHMARKS))}")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    print("⏱️  MailSift ML Benchmarks")
+    print("="*40)
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import threading
+import numpy as np
+from config import Config
+
+FAST_STAGE = 'fast'
+FULL_STAGE = 'full'
+
+
+class CascadeStats:
+    """Thread-safe counts of which cascade stage answered each head"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, head, stage):
+        with self._lock:
+            counts = self._counts.setdefault(head, {FAST_STAGE: 0, FULL_STAGE: 0})
+            counts[stage] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {}
+            for head, counts in self._counts.items():
+                total = counts[FAST_STAGE] + counts[FULL_STAGE]
+                stats[head] = dict(counts, fast_share=counts[FAST_STAGE] / total if total else 0.0)
+            return stats
+
+
+def cascade_predict_proba(fast_model, full_model, X_sparse, dense_input, threshold=None):
+    """Return (probabilities, stage) from the cheap model if it is confident enough.
+
+    `dense_input` is a callable so the dense feature row for the full model is
+    only built when the fast stage defers.
+    """
+    threshold = Config.CASCADE_THRESHOLD if threshold is None else threshold
+    if fast_model is not None:
+        probs = fast_model.predict_proba(X_sparse)[0]
+        if probs.max() >= threshold:
+            return probs, FAST_STAGE
+    return full_model.predict_proba(dense_input())[0], FULL_STAGE
+
+
+def evaluate_cascade(fast_probs, full_probs, y_true, threshold=None):
+    """Share of rows the fast stage answers, accuracy of cascade vs full model, and how often they agree"""
+    threshold = Config.CASCADE_THRESHOLD if threshold is None else threshold
+    confident = fast_probs.max(axis=1) >= threshold
+    full_pred = full_probs.argmax(axis=1)
+    cascade_pred = np.where(confident, fast_probs.argmax(axis=1), full_pred)
+    y_true = np.asarray(y_true)
+    return {
+        'threshold': threshold,
+        'fast_share': float(confident.mean()),
+        'fast_accuracy': float((fast_probs.argmax(axis=1)[confident] == y_true[confident]).mean()) if confident.any() else None,
+        'cascade_accuracy': float((cascade_pred == y_true).mean()),
+        'full_accuracy': float((full_pred == y_true).mean()),
+        'agreement': float((cascade_pred == full_pred).mean())
+    }
@@ -14,16 +14,141 @@ class Config:
     MODEL_PATH = os.getenv('MODEL_PATH', 'models/')
     MODEL_NAME = os.getenv('MODEL_NAME', 'email_classifier.joblib')
     VECTORIZER_NAME = os.getenv('VECTORIZER_NAME', 'tfidf_vectorizer.joblib')
+    USER_HEADS_NAME = os.getenv('USER_HEADS_NAME', 'user_heads.bin')
+    KERNEL_NAME = os.getenv('KERNEL_NAME', 'inference_kernel.joblib')
+    DOMAIN_INDEX_NAME = os.getenv('DOMAIN_INDEX_NAME', 'domain_index.joblib')
+    IDF_REFRESH_NAME = os.getenv('IDF_REFRESH_NAME', 'idf_refresh.joblib')
+    
+    # Serve from the compiled numpy kernel instead of scikit-learn when it was exported
+    INFERENCE_KERNEL_ENABLED = os.getenv('INFERENCE_KERNEL_ENABLED', 'True').lower() == 'true'
     
     # Training configuration
     TEST_SIZE = float(os.getenv('TEST_SIZE', 0.2))
     RANDOM_STATE = int(os.getenv('RANDOM_STATE', 42))
     MAX_FEATURES = int(os.getenv('MAX_FEATURES', 10000))
     
+    # Training pipeline stage cache
+    PIPELINE_CACHE_ENABLED = os.getenv('PIPELINE_CACHE_ENABLED', 'True').lower() == 'true'
+    PIPELINE_CACHE_DIR = os.getenv('PIPELINE_CACHE_DIR', 'cache/')
+    PIPELINE_CACHE_KEEP = int(os.getenv('PIPELINE_CACHE_KEEP', 3))
+    # Store the dataset stage as Parquet and reload it memory-mapped
+    PIPELINE_CACHE_PARQUET = os.getenv('PIPELINE_CACHE_PARQUET', 'True').lower() == 'true'
+    
+    # Training resource budget (0 = unbudgeted; setting either enables budgeted training)
+    TRAINING_MEMORY_LIMIT_MB = int(os.getenv('TRAINING_MEMORY_LIMIT_MB', 0))
+    TRAINING_CORES = int(os.getenv('TRAINING_CORES', 0))
+    TRAINING_REPORT_NAME = os.getenv('TRAINING_REPORT_NAME', 'training_report.json')
+    
+    # Hyperparameter search (successive halving with a wall-clock budget)
+    TUNING_ENABLED = os.getenv('TUNING_ENABLED', 'False').lower() == 'true'
+    TUNING_BUDGET_SECONDS = float(os.getenv('TUNING_BUDGET_SECONDS', 300))
+    TUNING_N_CANDIDATES = int(os.getenv('TUNING_N_CANDIDATES', 27))
+    TUNING_HALVING_FACTOR = int(os.getenv('TUNING_HALVING_FACTOR', 3))
+    TUNING_CV_FOLDS = int(os.getenv('TUNING_CV_FOLDS', 5))
+    TUNING_MAX_FEATURES = [int(k) for k in os.getenv('TUNING_MAX_FEATURES', '2000,5000').split(',') if k]
+    N_JOBS = int(os.getenv('N_JOBS', -1))
+    
+    # Vocabulary construction: 'exact' (scikit-learn), 'sketch' (count-min,
+    # bounded memory) or 'auto' (sketch for corpora above VOCAB_SKETCH_MIN_DOCS)
+    VOCAB_BUILDER = os.getenv('VOCAB_BUILDER', 'auto')
+    VOCAB_SKETCH_MIN_DOCS = int(os.getenv('VOCAB_SKETCH_MIN_DOCS', 50000))
+    VOCAB_CANDIDATE_FACTOR = int(os.getenv('VOCAB_CANDIDATE_FACTOR', 4))
+    VOCAB_CHUNK_SIZE = int(os.getenv('VOCAB_CHUNK_SIZE', 1000))
+    SKETCH_WIDTH = int(os.getenv('SKETCH_WIDTH', 2 ** 20))
+    SKETCH_DEPTH = int(os.getenv('SKETCH_DEPTH', 4))
+    
+    # Per-user importance heads on top of the shared featurizer
+    USER_HEAD_MIN_SAMPLES = int(os.getenv('USER_HEAD_MIN_SAMPLES', 20))
+    USER_HEAD_C = float(os.getenv('USER_HEAD_C', 10.0))
+    USER_HEAD_CACHE_SIZE = int(os.getenv('USER_HEAD_CACHE_SIZE', 1024))
+    
+    # Cascade inference: a linear first stage answers when it is this confident
+    CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', 'True').lower() == 'true'
+    CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', 0.9))
+    CASCADE_C = float(os.getenv('CASCADE_C', 10.0))
+    
+    # Sender-domain shortcut: answer from per-domain statistics when a domain is predictable
+    DOMAIN_SHORTCUT_ENABLED = os.getenv('DOMAIN_SHORTCUT_ENABLED', 'True').lower() == 'true'
+    DOMAIN_SHORTCUT_MIN_EMAILS = int(os.getenv('DOMAIN_SHORTCUT_MIN_EMAILS', 30))
+    DOMAIN_SHORTCUT_MIN_SHARE = float(os.getenv('DOMAIN_SHORTCUT_MIN_SHARE', 0.95))
+    # Share of shortcut answers re-scored by the models; each audit counts for 1 / rate emails
+    DOMAIN_SHORTCUT_AUDIT_RATE = float(os.getenv('DOMAIN_SHORTCUT_AUDIT_RATE', 0.05))
+    DOMAIN_INDEX_DECAY = float(os.getenv('DOMAIN_INDEX_DECAY', 0.98))
+    DOMAIN_INDEX_CAPACITY = int(os.getenv('DOMAIN_INDEX_CAPACITY', 100000))
+    # Served updates are written back next to the models this often (and at shutdown)
+    DOMAIN_INDEX_SAVE_EVERY = int(os.getenv('DOMAIN_INDEX_SAVE_EVERY', 1000))
+    
+    # Shadow evaluation of a candidate model directory (disabled when empty)
+    SHADOW_MODEL_PATH = os.getenv('SHADOW_MODEL_PATH', '')
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 0.1))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', 1000))
+    
+    # Deadline extraction (numeric dates are read month-first unless DMY)
+    DEADLINE_EXTRACTION_ENABLED = os.getenv('DEADLINE_EXTRACTION_ENABLED', 'True').lower() == 'true'
+    DEADLINE_DATE_ORDER = os.getenv('DEADLINE_DATE_ORDER', 'MDY')
+    DEADLINE_CUE_WINDOW = int(os.getenv('DEADLINE_CUE_WINDOW', 40))
+    DEADLINE_MAX_DATES = int(os.getenv('DEADLINE_MAX_DATES', 5))
+    
+    # Similar-email search over the TF-IDF vectors of classified emails
+    SIMILAR_ENABLED = os.getenv('SIMILAR_ENABLED', 'True').lower() == 'true'
+    SIMILAR_INDEX_DIR = os.getenv('SIMILAR_INDEX_DIR', 'similar_index/')
+    SIMILAR_TERMS_PER_DOC = int(os.getenv('SIMILAR_TERMS_PER_DOC', 16))
+    SIMILAR_QUERY_TERMS = int(os.getenv('SIMILAR_QUERY_TERMS', 8))
+    SIMILAR_MAX_POSTINGS = int(os.getenv('SIMILAR_MAX_POSTINGS', 2000))
+    SIMILAR_MERGE_DOCS = int(os.getenv('SIMILAR_MERGE_DOCS', 20000))
+    SIMILAR_DEFAULT_K = int(os.getenv('SIMILAR_DEFAULT_K', 10))
+    SIMILAR_MAX_K = int(os.getenv('SIMILAR_MAX_K', 100))
+    
+    # Explanations (opt-in per request with ?explain=true)
+    EXPLAIN_ENABLED = os.getenv('EXPLAIN_ENABLED', 'True').lower() == 'true'
+    EXPLAIN_TOP_K = int(os.getenv('EXPLAIN_TOP_K', 5))
+    
+    # Vocabulary drift: streaming document frequencies of served text; the
+    # IDF weights can be refreshed from them once enough emails were seen
+    VOCAB_DRIFT_ENABLED = os.getenv('VOCAB_DRIFT_ENABLED', 'True').lower() == 'true'
+    VOCAB_DRIFT_SAMPLE_RATE = float(os.getenv('VOCAB_DRIFT_SAMPLE_RATE', 0.25))
+    VOCAB_DRIFT_EMERGING_TERMS = int(os.getenv('VOCAB_DRIFT_EMERGING_TERMS', 20))
+    VOCAB_DRIFT_SKETCH_WIDTH = int(os.getenv('VOCAB_DRIFT_SKETCH_WIDTH', 2 ** 18))
+    IDF_REFRESH_MIN_DOCUMENTS = int(os.getenv('IDF_REFRESH_MIN_DOCUMENTS', 500))
+    
     # Text processing
     MIN_CONFIDENCE = float(os.getenv('MIN_CONFIDENCE', 0.5))
     MAX_TEXT_LENGTH = int(os.getenv('MAX_TEXT_LENGTH', 10000))
     
+    # Concurrency: feature extraction runs in a process pool (0 = inline per thread)
+    PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', os.cpu_count() or 1))
+    PREPROCESS_START_METHOD = os.getenv('PREPROCESS_START_METHOD', 'spawn')
+    
+    # Admission control: at most ADMISSION_SLOTS requests run at once, the rest
+    # wait in a bounded queue per lane and are scheduled by weight
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+    ADMISSION_SLOTS = int(os.getenv('ADMISSION_SLOTS', os.cpu_count() or 1))
+    INTERACTIVE_WEIGHT = int(os.getenv('INTERACTIVE_WEIGHT', 4))
+    INTERACTIVE_QUEUE_SIZE = int(os.getenv('INTERACTIVE_QUEUE_SIZE', 64))
+    INTERACTIVE_MAX_WAIT = float(os.getenv('INTERACTIVE_MAX_WAIT', 1.0))
+    BULK_WEIGHT = int(os.getenv('BULK_WEIGHT', 1))
+    BULK_QUEUE_SIZE = int(os.getenv('BULK_QUEUE_SIZE', 8))
+    BULK_MAX_WAIT = float(os.getenv('BULK_MAX_WAIT', 10.0))
+    BULK_MAX_ACTIVE = int(os.getenv('BULK_MAX_ACTIVE', 0))  # 0 = all slots but one
+    
+    # Asynchronous batch jobs
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 50))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_MAX_EMAILS = int(os.getenv('JOB_MAX_EMAILS', 5000))
+    JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', 30))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+    
+    # Near-duplicate detection (MinHash + LSH over preprocessed text)
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'True').lower() == 'true'
+    DEDUP_SIMILARITY_THRESHOLD = float(os.getenv('DEDUP_SIMILARITY_THRESHOLD', 0.8))
+    DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', 64))
+    DEDUP_SHINGLE_SIZE = int(os.getenv('DEDUP_SHINGLE_SIZE', 2))
+    DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', 16))
+    DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', 10000))
+    
+    # Response configuration
+    INCLUDE_FEATURES = os.getenv('INCLUDE_FEATURES', 'True').lower() == 'true'
+    
     # Categories for classification
     CATEGORIES = [
         'opportunities',
@@ -0,0 +1,69 @@
+import string
+import pytest
+from config import Config
+
+TOPICS = [
+    ('Software Engineering Internship', 'We are hiring interns. Apply now for this internship opportunity.'),
+    ('Hackathon registration open', 'Join the biggest hackathon! Coding competition with prizes.'),
+    ('Scholarship application', 'Scholarship grant funding and financial aid for tuition.'),
+    ('Weekly newsletter', 'Here are this week top stories and updates from our blog.'),
+]
+
+
+def marker(i):
+    """Letters-only token that survives preprocessing and is unique per email"""
+    letters = string.ascii_lowercase
+    token = ''
+    i += 1
+    while i:
+        i, rem = divmod(i - 1, 26)
+        token = letters[rem] + token
+    return f"zq{token}xv"
+
+
+def make_email(i):
+    subject, body = TOPICS[i % len(TOPICS)]
+    tag = marker(i)
+    # Unclosed tags leave html2text mid-parse if its state were shared
+    html = f"<div><ul><li>{body} <b>{tag}</b><li>Reference {tag}<p>Deadline is soon"
+    return {
+        'subject': f"{subject} {tag}",
+        'body': {'html': html} if i % 2 else f"{body} {tag}",
+        'sender': f"team{i}@example{i % 7}.com",
+        'user_id': f"user{i % 3}"
+    }
+
+
+def train_pipeline(tmp_path_factory, trainer, n_emails=160):
+    """Train `trainer` on make_email data into fresh model and cache directories"""
+    model_path = str(tmp_path_factory.mktemp('models')) + '/'
+    original = Config.MODEL_PATH, Config.PIPELINE_CACHE_DIR
+    Config.MODEL_PATH = model_path
+    Config.PIPELINE_CACHE_DIR = str(tmp_path_factory.mktemp('cache'))
+    try:
+        results = trainer.train_full_pipeline([make_email(i) for i in range(n_emails)])
+    finally:
+        Config.MODEL_PATH, Config.PIPELINE_CACHE_DIR = original
+    return model_path, results
+
+
+@pytest.fixture(scope='session')
+def trained_model_path(tmp_path_factory):
+    """Models trained once per session; tests must not write into this directory"""
+    from train_model import EmailClassifierTrainer
+
+    return train_pipeline(tmp_path_factory, EmailClassifierTrainer())[0]
+
+
+@pytest.fixture
+def api_client(trained_model_path, monkeypatch, tmp_path):
+    """Flask test client of the API serving the shared models"""
+    import predict
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path / 'similar'))
+    predictor = predict.EmailPredictor()
+    predictor.load_models()
+    monkeypatch.setattr(predict, 'predictor', predictor)
+    return predict.app.test_client()
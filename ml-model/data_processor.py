@@ -1,17 +1,31 @@
 import re
+import sys
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from bs4 import BeautifulSoup
 import html2text
 from email.utils import parseaddr
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import LabelEncoder
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
 import joblib
 from config import Config
+from deadlines import DeadlineExtractor, next_deadline, parse_reference_date
+
+# Any nltk import runs nltk/__init__, which imports its scikit-learn classifier
+# wrapper and with it scikit-learn. Preprocessing only needs the tokenizer,
+# stemmer and stopwords, and the wrapper tolerates a missing scikit-learn, so
+# hide it while nltk loads; the kernel-serving API then never imports it.
+_sklearn_loaded = 'sklearn' in sys.modules
+if not _sklearn_loaded:
+    sys.modules['sklearn'] = None
+try:
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    from nltk.stem import PorterStemmer
+finally:
+    if not _sklearn_loaded:
+        del sys.modules['sklearn']
 
 # Download required NLTK data
 try:
@@ -24,6 +38,86 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
+# Column types of the training dataset. Text columns are Arrow strings (one
+# buffer instead of a Python object per row), flags are Arrow bitmaps and
+# counts fit in 32 bits.
+TRAINING_SCHEMA = {
+    'text': pd.StringDtype('pyarrow'),
+    'subject_length': np.int32,
+    'body_length': np.int32,
+    'sender_domain': pd.StringDtype('pyarrow'),
+    'has_deadline': pd.ArrowDtype(pa.bool_()),
+    'has_urgent': pd.ArrowDtype(pa.bool_()),
+    'has_apply': pd.ArrowDtype(pa.bool_()),
+    'has_opportunity': pd.ArrowDtype(pa.bool_()),
+    'word_count': np.int32,
+    'exclamation_count': np.int32,
+    'question_count': np.int32,
+    'caps_ratio': np.float32,
+    'user_id': pd.StringDtype('pyarrow'),
+    'category': pd.CategoricalDtype(Config.CATEGORIES),
+    'is_important': pd.ArrowDtype(pa.bool_()),
+    'confidence': np.float32
+}
+
+# Numerical and boolean columns, in feature-matrix order after the TF-IDF terms
+NUMERICAL_FEATURES = [
+    'subject_length', 'body_length', 'word_count', 'exclamation_count', 'question_count',
+    'caps_ratio', 'has_deadline', 'has_urgent', 'has_apply', 'has_opportunity'
+]
+
+# Parquet reload keeps the Arrow-backed columns instead of converting them to Python objects
+_ARROW_TYPES = {
+    pa.string(): pd.StringDtype('pyarrow'),
+    pa.large_string(): pd.StringDtype('pyarrow'),
+    pa.bool_(): pd.ArrowDtype(pa.bool_())
+}
+
+
+# Rows are converted to typed columns this many at a time, so only one chunk
+# of Python objects is alive while a large dataset is built
+DATASET_CHUNK_ROWS = 10000
+
+
+def training_frame(columns):
+    """Build a training DataFrame with TRAINING_SCHEMA from a dict of column lists"""
+    df = pd.DataFrame({
+        name: pd.Series(columns[name], dtype=dtype) for name, dtype in TRAINING_SCHEMA.items()
+    })
+    if df['category'].isna().any():
+        unknown = {c for c, ok in zip(columns['category'], df['category'].notna()) if not ok}
+        raise ValueError(f"Unknown categories in training data: {sorted(map(str, unknown))}")
+    return df
+
+
+def training_frame_from_rows(rows, chunk_rows=None):
+    """Build a training DataFrame from an iterable of row dicts, one chunk at a time"""
+    chunk_rows = chunk_rows or DATASET_CHUNK_ROWS
+    frames = []
+    columns = {name: [] for name in TRAINING_SCHEMA}
+    for row in rows:
+        for name, values in columns.items():
+            values.append(row[name])
+        if len(columns['text']) >= chunk_rows:
+            frames.append(training_frame(columns))
+            columns = {name: [] for name in TRAINING_SCHEMA}
+    if columns['text'] or not frames:
+        frames.append(training_frame(columns))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def save_training_dataset(df, path):
+    """Write a training dataset to Parquet"""
+    df.to_parquet(path, engine='pyarrow', index=False)
+
+
+def load_training_dataset(path):
+    """Read a Parquet training dataset through a memory map, keeping its compact column types"""
+    return pq.read_table(path, memory_map=True).to_pandas(types_mapper=_ARROW_TYPES.get)
+
+
 class EmailDataProcessor:
     def __init__(self):
         self.stemmer = PorterStemmer()
@@ -31,6 +125,7 @@ class EmailDataProcessor:
         self.html_converter = html2text.HTML2Text()
         self.html_converter.ignore_links = True
         self.html_converter.ignore_images = True
+        self.deadline_extractor = DeadlineExtractor() if Config.DEADLINE_EXTRACTION_ENABLED else None
         
     def clean_html(self, html_content):
         """Convert HTML to clean text"""
@@ -126,6 +221,14 @@ class EmailDataProcessor:
             'caps_ratio': sum(1 for c in full_text if c.isupper()) / max(len(full_text), 1)
         })
         
+        # Dates are read from the original text (preprocessing strips digits),
+        # resolved against the email's own date
+        if self.deadline_extractor is not None:
+            reference = parse_reference_date(email_data.get('date'))
+            dates = self.deadline_extractor.extract(full_text, reference)
+            features['dates'] = dates
+            features['deadline'] = next_deadline(dates, reference)
+        
         return features
     
     def label_email_with_keywords(self, email_data):
@@ -152,10 +255,12 @@ class EmailDataProcessor:
         
         return 'other', 0.0
     
-    def create_training_dataset(self, emails_data):
-        """Create training dataset from email data"""
-        training_data = []
-        
+    def create_training_dataset(self, emails_data, chunk_rows=None):
+        """Create training dataset from email data, with the compact TRAINING_SCHEMA types"""
+        return training_frame_from_rows(self._training_rows(emails_data), chunk_rows)
+    
+    def _training_rows(self, emails_data):
+        """Yield one training row per email"""
         for email in emails_data:
             # Extract features
             features = self.extract_features(email)
@@ -163,10 +268,13 @@ class EmailDataProcessor:
             # Get label using keyword matching
             category, confidence = self.label_email_with_keywords(email)
             
-            # Determine if important (binary classification)
-            is_important = category in ['opportunities', 'scholarships', 'jobs'] or confidence > 0.7
+            # Determine if important (binary classification); explicit user
+            # labels (e.g. emails a user starred) take precedence
+            is_important = email.get('is_important')
+            if is_important is None:
+                is_important = category in ['opportunities', 'scholarships', 'jobs'] or confidence > 0.7
             
-            training_data.append({
+            yield {
                 'text': features['processed_text'],
                 'subject_length': features['subject_length'],
                 'body_length': features['body_length'],
@@ -179,12 +287,11 @@ class EmailDataProcessor:
                 'exclamation_count': features['exclamation_count'],
                 'question_count': features['question_count'],
                 'caps_ratio': features['caps_ratio'],
+                'user_id': str(email['user_id']) if email.get('user_id') else '',
                 'category': category,
-                'is_important': is_important,
+                'is_important': bool(is_important),
                 'confidence': confidence
-            })
-        
-        return pd.DataFrame(training_data)
+            }
     
     def save_preprocessor(self, vectorizer, label_encoder, filepath):
         """Save preprocessing objects"""
@@ -216,7 +323,9 @@ def create_sample_training_data():
     {
         'subject': 'Email subject',
         'body': 'Email body text' or {'text': '...', 'html': '...'},
-        'sender': 'sender@example.com'
+        'sender': 'sender@example.com',
+        'user_id': 'owner id (optional, enables per-user heads)',
+        'is_important': True  # optional label from the user
     }
     """
     
@@ -0,0 +1,226 @@
+import re
+from datetime import date, datetime, time, timedelta
+from config import Config
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
+}
+
+_MONTH = r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+_ORDINAL = r'(?:st|nd|rd|th)?'
+_NUMBER = r'(?:\d{1,2}|' + '|'.join(NUMBER_WORDS) + r')'
+
+# Every date form is one alternative of a single pattern, so each email is
+# scanned once no matter how many forms are supported. Patterns run on
+# lowercased text, and the lookahead skips words no alternative can start.
+DATE_PATTERN = re.compile(
+    r'\b(?=[\dacdefijmnostw])(?:'
+    r'(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})'
+    r'|(?P<num_a>\d{1,2})/(?P<num_b>\d{1,2})(?:/(?P<num_y>\d{4}|\d{2}))?'
+    rf'|(?P<md_m>{_MONTH})\.?\s+(?P<md_d>\d{{1,2}}){_ORDINAL}(?:,?\s+(?P<md_y>\d{{4}}))?'
+    rf'|(?P<dm_d>\d{{1,2}}){_ORDINAL}\s+(?:of\s+)?(?P<dm_m>{_MONTH})\.?(?:,?\s+(?P<dm_y>\d{{4}}))?'
+    r'|(?P<rel_day>today|tonight|tomorrow)'
+    r'|(?:(?P<wd_mod>this|next|coming)\s+)?(?P<wd>' + '|'.join(WEEKDAYS) + r')'
+    rf'|(?:in|within)\s+(?P<in_n>{_NUMBER})\s+(?P<in_unit>day|week|month)s?'
+    r'|end\s+of\s+(?:the\s+)?(?P<end>day|week|month)'
+    r'|(?P<unit_mod>this|next)\s+(?P<unit>week|month)'
+    r')\b'
+    # Optional time of day right after the date
+    r'(?:,?\s*(?:at|by|@)?\s*(?:'
+    r'(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>[ap])\.?m\b\.?'
+    r'|(?P<hour24>\d{1,2}):(?P<minute24>\d{2})\b'
+    r'|(?P<named_time>noon|midnight)\b'
+    r'))?'
+)
+
+# Words that make a date a deadline when they appear just before it
+DEADLINE_CUE = re.compile(
+    r'\b(?:deadline|due|by|before|until|till|closes?|closing|ends?|expires?|no later than|last day|apply|register|submit)\b'
+)
+
+
+def parse_reference_date(value):
+    """Parse an email's sent/received timestamp, falling back to now"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def _nearest_year(month, day, reference):
+    """Resolve a date without a year to the occurrence closest to the reference"""
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(date(year, month, day))
+        except ValueError:
+            continue
+    if not candidates:
+        return None
+    # Ties go to the future occurrence
+    return min(candidates, key=lambda d: (abs((d - reference.date()).days), d < reference.date()))
+
+
+def _make_date(year, month, day, reference):
+    if year is None:
+        return _nearest_year(month, day, reference)
+    year = int(year)
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    for last in (31, 30, 29, 28):
+        try:
+            return date(year, month, min(day.day, last))
+        except ValueError:
+            continue
+
+
+class DeadlineExtractor:
+    """Find date mentions in email text and normalize them to ISO dates.
+
+    Absolute dates without a year and relative expressions ("tomorrow",
+    "next Friday", "in 2 weeks") are resolved against the email's own date.
+    A mention counts as a deadline when a cue word ("due", "by",
+    "deadline", ...) appears shortly before it.
+    """
+
+    def __init__(self, date_order=None, cue_window=None, max_dates=None):
+        self.date_order = (date_order or Config.DEADLINE_DATE_ORDER).upper()
+        self.cue_window = cue_window or Config.DEADLINE_CUE_WINDOW
+        self.max_dates = max_dates or Config.DEADLINE_MAX_DATES
+
+    def _resolve_date(self, match, reference):
+        groups = match.groupdict()
+        today = reference.date()
+
+        if groups['iso_y']:
+            return _make_date(groups['iso_y'], int(groups['iso_m']), int(groups['iso_d']), reference)
+        if groups['num_a']:
+            first, second = int(groups['num_a']), int(groups['num_b'])
+            month, day = (first, second) if self.date_order == 'MDY' else (second, first)
+            if month > 12 and day <= 12 and groups['num_y']:
+                month, day = day, month
+            return _make_date(groups['num_y'], month, day, reference)
+        if groups['md_m']:
+            return _make_date(groups['md_y'], MONTHS[groups['md_m'][:3]], int(groups['md_d']), reference)
+        if groups['dm_m']:
+            return _make_date(groups['dm_y'], MONTHS[groups['dm_m'][:3]], int(groups['dm_d']), reference)
+        if groups['rel_day']:
+            return today + timedelta(days=1 if groups['rel_day'] == 'tomorrow' else 0)
+        if groups['wd']:
+            ahead = (WEEKDAYS.index(groups['wd']) - today.weekday()) % 7
+            if groups['wd_mod'] and groups['wd_mod'] == 'next' and ahead == 0:
+                ahead = 7
+            return today + timedelta(days=ahead)
+        if groups['in_n']:
+            n = groups['in_n']
+            n = int(n) if n.isdigit() else NUMBER_WORDS[n]
+            unit = groups['in_unit']
+            if unit == 'month':
+                return _add_months(today, n)
+            return today + timedelta(days=n * (7 if unit == 'week' else 1))
+        if groups['end']:
+            unit = groups['end']
+            if unit == 'day':
+                return today
+            if unit == 'week':
+                return today + timedelta(days=(4 - today.weekday()) % 7)
+            return _add_months(today.replace(day=1), 1) - timedelta(days=1)
+        if groups['unit']:
+            unit = groups['unit']
+            if groups['unit_mod'] == 'this':
+                # "this week" / "this month" mean by the end of it
+                if unit == 'week':
+                    return today + timedelta(days=(4 - today.weekday()) % 7)
+                return _add_months(today.replace(day=1), 1) - timedelta(days=1)
+            if unit == 'week':
+                return today + timedelta(days=7 - today.weekday())
+            return _add_months(today.replace(day=1), 1)
+        return None
+
+    @staticmethod
+    def _resolve_time(groups):
+        if groups['hour']:
+            hour = int(groups['hour']) % 12 + (12 if groups['ampm'] == 'p' else 0)
+            minute = int(groups['minute'] or 0)
+        elif groups['hour24']:
+            hour, minute = int(groups['hour24']), int(groups['minute24'])
+        elif groups['named_time']:
+            hour, minute = (12, 0) if groups['named_time'] == 'noon' else (23, 59)
+        else:
+            return None
+        if hour > 23 or minute > 59:
+            return None
+        return time(hour, minute)
+
+    def extract(self, text, reference=None):
+        """Return the date mentions in `text`, deadlines first, then by date"""
+        if not text:
+            return []
+        reference = reference or datetime.now()
+
+        # Lowercasing can change the length of some non-ASCII text; offsets
+        # into the original are only used when it does not
+        lowered = text.lower()
+        original = text if len(lowered) == len(text) else lowered
+        
+        found = {}
+        resolved = {}
+        for match in DATE_PATTERN.finditer(lowered):
+            start = match.start()
+            # Cue words only count within the same sentence
+            window = max(0, start - self.cue_window)
+            window = max(window, *(lowered.rfind(c, window, start) + 1 for c in '.!?\n'))
+            is_deadline = DEADLINE_CUE.search(lowered, window, start) is not None
+            # "3/15" without a year is only a date when it reads like a deadline ("due 3/15")
+            if match.group('num_a') and not match.group('num_y') and not is_deadline:
+                continue
+            # Lowercase "may" without a year is almost always the verb
+            month = 'md_m' if match.group('md_m') else 'dm_m'
+            if (match.group(month) == 'may' and not (match.group('md_y') or match.group('dm_y'))
+                    and original[match.start(month)] == 'm'):
+                continue
+            # Repeated mentions (signatures, quoted replies) are resolved once
+            key = match.group(0)
+            if key not in resolved:
+                day = self._resolve_date(match, reference)
+                at = self._resolve_time(match.groupdict()) if day else None
+                resolved[key] = datetime.combine(day, at).isoformat() if at else day and day.isoformat()
+            iso = resolved[key]
+            if iso is None:
+                continue
+
+            entry = found.get(iso)
+            if entry is None:
+                found[iso] = {'date': iso, 'text': original[start:match.end()].strip(' ,.'), 'isDeadline': is_deadline}
+            elif is_deadline:
+                entry['isDeadline'] = True
+
+        dates = sorted(found.values(), key=lambda entry: (not entry['isDeadline'], entry['date']))
+        return dates[:self.max_dates]
+
+
+def next_deadline(dates, reference=None):
+    """Earliest deadline mention that is not already in the past"""
+    today = (reference or datetime.now()).date().isoformat()
+    upcoming = [entry['date'] for entry in dates if entry['isDeadline'] and entry['date'][:10] >= today]
+    return min(upcoming) if upcoming else None
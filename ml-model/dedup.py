@@ -0,0 +1,143 @@
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from config import Config
+
+# Mersenne prime used for the universal hash family (a * x + b) mod p
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHasher:
+    """MinHash signatures over word shingles of preprocessed text"""
+
+    def __init__(self, num_perm=64, shingle_size=2, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, np.iinfo(np.int32).max, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, np.iinfo(np.int32).max, size=num_perm).astype(np.uint64)
+
+    def shingles(self, text):
+        """Hash word n-grams of the text into 32-bit integers"""
+        tokens = text.split()
+        if len(tokens) < self.shingle_size:
+            grams = [' '.join(tokens)] if tokens else []
+        else:
+            grams = [
+                ' '.join(tokens[i:i + self.shingle_size])
+                for i in range(len(tokens) - self.shingle_size + 1)
+            ]
+        return np.array(
+            sorted({zlib.crc32(gram.encode('utf-8')) for gram in grams}),
+            dtype=np.uint64
+        )
+
+    def signature(self, text):
+        """Compute the MinHash signature for a piece of text"""
+        hashed = self.shingles(text)
+        if hashed.size == 0:
+            return None
+        values = (np.outer(hashed, self.a) + self.b) % _MERSENNE_PRIME
+        return (values & _MAX_HASH).min(axis=0)
+
+
+class NearDuplicateIndex:
+    """LSH index over MinHash signatures of recently classified emails.
+
+    Signatures are split into bands; emails sharing any band bucket are
+    candidates and are confirmed by their estimated Jaccard similarity.
+    Only the most recent `capacity` emails are kept.
+    """
+
+    def __init__(self, threshold=None, num_perm=None, bands=None, capacity=None):
+        self.threshold = threshold if threshold is not None else Config.DEDUP_SIMILARITY_THRESHOLD
+        num_perm = num_perm or Config.DEDUP_NUM_PERM
+        self.bands = bands or Config.DEDUP_BANDS
+        if num_perm % self.bands != 0:
+            raise ValueError("DEDUP_NUM_PERM must be divisible by DEDUP_BANDS")
+        self.rows = num_perm // self.bands
+        self.capacity = capacity or Config.DEDUP_CACHE_SIZE
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=Config.DEDUP_SHINGLE_SIZE)
+
+        self._entries = OrderedDict()  # entry id -> (signature, band keys, prediction)
+        self._buckets = {}  # (band, band hash) -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def lookup(self, text):
+        """Return (prediction, signature) for the closest recent near-duplicate.
+
+        The prediction is None when no near-duplicate is found. The signature is
+        returned so callers can `add` the text without hashing it twice.
+        """
+        signature = self.hasher.signature(text)
+        with self._lock:
+            self.lookups += 1
+            if signature is None:
+                return None, None
+
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_id, best_similarity = None, self.threshold
+            for entry_id in candidates:
+                similarity = float(np.mean(self._entries[entry_id][0] == signature))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                return None, signature
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2], signature
+
+    def add(self, signature, prediction):
+        """Remember a classified email so later near-duplicates can reuse it"""
+        if signature is None:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            keys = self._band_keys(signature)
+            self._entries[entry_id] = (signature, keys, prediction)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.capacity:
+                old_id, (_, old_keys, _) = self._entries.popitem(last=False)
+                for key in old_keys:
+                    bucket = self._buckets.get(key)
+                    if bucket is not None:
+                        bucket.discard(old_id)
+                        if not bucket:
+                            del self._buckets[key]
+
+    def clear(self):
+        """Forget every remembered prediction, e.g. after the features behind them changed"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get_stats(self):
+        """Return dedup hit rate and index size"""
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'dedup_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'similarity_threshold': self.threshold,
+                'indexed_emails': len(self._entries)
+            }
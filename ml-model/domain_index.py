@@ -0,0 +1,219 @@
+import copy
+import os
+import random
+import threading
+import joblib
+import numpy as np
+from config import Config
+
+
+class DomainIndex:
+    """Per-sender-domain category counts and importance rates.
+
+    Each domain owns one row of a float32 table: one column per category,
+    then the number of important emails and the total. A second table holds
+    the same counts with exponential decay, i.e. roughly the last
+    1 / (1 - decay) emails of that domain. A domain is answered from the
+    index only when both views agree on a dominant category and a clear
+    importance side, so a domain whose mail changed recently falls back to
+    the models until the recent view settles again.
+
+    While a domain is answered from the index, only audited emails reach the
+    models; each counts for 1 / audit rate emails so the recent view moves
+    at the pace of the domain's traffic. Updates made while serving are
+    saved with `save` and survive a restart.
+    """
+
+    def __init__(self, categories, capacity=None, min_emails=None, min_share=None, decay=None):
+        self.categories = list(categories)
+        self.capacity = capacity or Config.DOMAIN_INDEX_CAPACITY
+        self.min_emails = min_emails or Config.DOMAIN_SHORTCUT_MIN_EMAILS
+        self.min_share = min_share or Config.DOMAIN_SHORTCUT_MIN_SHARE
+        self.decay = decay or Config.DOMAIN_INDEX_DECAY
+        self._slots = {}
+        n_columns = len(self.categories) + 2
+        self.counts = np.zeros((0, n_columns), dtype=np.float32)
+        self.recent = np.zeros((0, n_columns), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.unsaved = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.lookups = 0
+        self.hits = 0
+        self.audits = 0
+        self.audit_agreements = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state.pop('_save_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.unsaved = 0
+
+    def _slot(self, domain):
+        slot = self._slots.get(domain)
+        if slot is None and len(self._slots) < self.capacity:
+            slot = len(self._slots)
+            if slot == len(self.counts):
+                # Grow both tables geometrically
+                grow = max(64, len(self.counts))
+                padding = np.zeros((grow, self.counts.shape[1]), dtype=np.float32)
+                self.counts = np.vstack([self.counts, padding])
+                self.recent = np.vstack([self.recent, padding])
+            self._slots[domain] = slot
+        return slot
+
+    def fit(self, domains, category_indices, important):
+        """Build the index from labeled training emails"""
+        with self._lock:
+            slots = [self._slot(domain) if domain else None for domain in domains]
+            known = np.array([slot is not None for slot in slots], dtype=bool)
+            slots = np.array([slot for slot in slots if slot is not None], dtype=np.int64)
+            category_indices = np.asarray(category_indices)[known]
+            important = np.asarray(important, dtype=np.float32)[known]
+
+            n_categories = len(self.categories)
+            np.add.at(self.counts, (slots, category_indices), 1)
+            np.add.at(self.counts, (slots, n_categories), important)
+            np.add.at(self.counts, (slots, n_categories + 1), 1)
+
+            # Training data has no order; seed the recent view with the
+            # lifetime distribution at the size of the decay window
+            window = 1.0 / (1.0 - self.decay)
+            totals = self.counts[:, -1:]
+            self.recent = self.counts * np.minimum(1.0, window / np.maximum(totals, 1))
+        return self
+
+    def update(self, domain, category_index, is_important, weight=1.0):
+        """Count one model prediction for a domain, standing for `weight` emails like it"""
+        if not domain:
+            return
+        with self._lock:
+            slot = self._slot(domain)
+            if slot is None:
+                return
+            row = np.zeros(self.counts.shape[1], dtype=np.float32)
+            row[category_index] = 1
+            row[-2] = float(is_important)
+            row[-1] = 1
+            self.counts[slot] += row * weight
+            # `weight` identical emails in a row: the old view decays weight times
+            decay = self.decay ** weight
+            self.recent[slot] = self.recent[slot] * decay + row * ((1 - decay) / (1 - self.decay))
+            self.unsaved += 1
+
+    def _decision(self, row):
+        """(category index, importance rate, category shares) if the row is confident"""
+        total = row[-1]
+        if total <= 0:
+            return None
+        shares = row[:-2] / total
+        top = int(np.argmax(shares))
+        rate = row[-2] / total
+        if shares[top] < self.min_share or self.min_share > rate > 1 - self.min_share:
+            return None
+        return top, rate, shares
+
+    def _shortcut(self, slot):
+        """Decision of a domain row if it is confident and stable, else None"""
+        if self.counts[slot, -1] < self.min_emails:
+            return None
+        lifetime = self._decision(self.counts[slot])
+        recent = self._decision(self.recent[slot])
+        if lifetime is None or recent is None:
+            return None
+        if lifetime[0] != recent[0] or (lifetime[1] > 0.5) != (recent[1] > 0.5):
+            return None
+        return recent
+
+    def shortcut_domains(self):
+        """Number of domains that are currently answered from the index"""
+        with self._lock:
+            return sum(self._shortcut(slot) is not None for slot in self._slots.values())
+
+    def lookup(self, domain):
+        """Return a prediction for the domain, or None if the models must decide"""
+        with self._lock:
+            self.lookups += 1
+            slot = self._slots.get(domain) if domain else None
+            recent = self._shortcut(slot) if slot is not None else None
+            if recent is None:
+                return None
+            self.hits += 1
+
+        top, rate, shares = recent
+        categories = [
+            {'name': self.categories[i], 'confidence': float(shares[i])}
+            for i in np.argsort(-shares)[:3] if shares[i] > 0.1
+        ]
+        return {
+            'isImportant': bool(rate > Config.MIN_CONFIDENCE),
+            'confidence': float(rate),
+            'primaryCategory': self.categories[top],
+            'categoryConfidence': float(shares[top]),
+            'categories': categories,
+            'personalized': False
+        }
+
+    def should_audit(self):
+        """Whether a shortcut answer should also be checked against the models"""
+        return random.random() < Config.DOMAIN_SHORTCUT_AUDIT_RATE
+
+    def record_audit(self, shortcut, prediction):
+        agreed = (shortcut['primaryCategory'] == prediction['primaryCategory']
+                  and shortcut['isImportant'] == prediction['isImportant'])
+        with self._lock:
+            self.audits += 1
+            self.audit_agreements += int(agreed)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'domains': len(self._slots),
+                'shortcut_domains': sum(self._shortcut(slot) is not None for slot in self._slots.values()),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'audits': self.audits,
+                'audit_accuracy': self.audit_agreements / self.audits if self.audits else None,
+                'memory_bytes': int(self.counts.nbytes + self.recent.nbytes)
+            }
+
+    def save(self, path):
+        """Write a consistent copy of the index, replacing `path` atomically"""
+        with self._save_lock:
+            with self._lock:
+                snapshot = copy.copy(self)
+                snapshot._slots = dict(self._slots)
+                snapshot.counts, snapshot.recent = self.counts.copy(), self.recent.copy()
+                self.unsaved = 0
+            tmp_path = f"{path}.tmp"
+            joblib.dump(snapshot, tmp_path)
+            os.replace(tmp_path, path)
+
+    def save_if_due(self, path, every=None):
+        """Save once `every` updates accumulated since the last save"""
+        every = every or Config.DOMAIN_INDEX_SAVE_EVERY
+        if self.unsaved >= every and not self._save_lock.locked():
+            self.save(path)
+
+
+def domain_index_path():
+    return os.path.join(Config.MODEL_PATH, Config.DOMAIN_INDEX_NAME)
+
+
+def load_domain_index():
+    """Load the trained domain index if it exists"""
+    path = domain_index_path()
+    if not os.path.exists(path):
+        return None
+    index = joblib.load(path)
+    index._reset_stats()
+    return index
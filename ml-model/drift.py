@@ -0,0 +1,172 @@
+import os
+import random
+import threading
+import joblib
+import numpy as np
+from config import Config
+from vocabulary import CountMinSketch
+
+# Distinct pending out-of-vocabulary terms before they are added to the sketch
+_FLUSH_TERMS = 2048
+
+
+def document_frequencies(idf, n_documents):
+    """Recover training document frequencies from scikit-learn's smoothed IDF"""
+    # idf = ln((1 + n) / (1 + df)) + 1
+    return (1.0 + n_documents) * np.exp(1.0 - np.asarray(idf, dtype=np.float64)) - 1.0
+
+
+def smoothed_idf(doc_counts, n_documents):
+    """scikit-learn's smoothed IDF for the given document frequencies"""
+    return np.log((1.0 + n_documents) / (1.0 + doc_counts)) + 1.0
+
+
+class VocabularyMonitor:
+    """Streaming document frequencies of incoming text against a fitted vocabulary.
+
+    A sample of served emails is run through the vectorizer's analyzer.
+    In-vocabulary terms are counted exactly (one counter per column); terms
+    outside the vocabulary go into a count-min sketch with a bounded set of
+    heavy-hitter candidates, which is what `emerging_terms` reports. The
+    training document frequencies are recovered from the fitted IDF, so the
+    streamed counts can be added to them to give a refreshed IDF for the
+    same vocabulary, which the models adopt without refitting.
+    """
+
+    def __init__(self, vocabulary, idf, n_documents, analyzer, sample_rate=None,
+                 emerging_terms=None, width=None, depth=None):
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.n_documents = n_documents
+        self.analyzer = analyzer
+        self.sample_rate = Config.VOCAB_DRIFT_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.emerging_terms = emerging_terms or Config.VOCAB_DRIFT_EMERGING_TERMS
+        self.capacity = self.emerging_terms * Config.VOCAB_CANDIDATE_FACTOR
+
+        # Older artifacts do not record their corpus size; they only get drift statistics
+        self._base_counts = None if n_documents is None else document_frequencies(self.idf, n_documents)
+        self.doc_counts = np.zeros(len(self.idf), dtype=np.int64)
+        self.oov_counts = CountMinSketch(width or Config.VOCAB_DRIFT_SKETCH_WIDTH, depth)
+        self.candidates = set()
+        self._pending = {}
+        self.observed = 0
+        self.words = 0
+        self.oov_words = 0
+        self.oov_documents = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def can_refresh(self):
+        return self._base_counts is not None
+
+    def observe(self, text):
+        """Count one incoming document if it is sampled; returns whether it was"""
+        if random.random() >= self.sample_rate:
+            return False
+
+        columns = []
+        oov = []
+        n_words = 0
+        for term in set(self.analyzer(text)):
+            column = self.vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+            # Only single words count towards the OOV rate; most bigrams are unseen by construction
+            if ' ' not in term:
+                n_words += 1
+                if column is None:
+                    oov.append(term)
+
+        with self._lock:
+            self.doc_counts[columns] += 1
+            self.observed += 1
+            self.words += n_words
+            self.oov_words += len(oov)
+            self.oov_documents += int(bool(oov))
+            # Sketch updates touch every row, so OOV counts are applied in batches
+            for term in oov:
+                self._pending[term] = self._pending.get(term, 0) + 1
+            if len(self._pending) >= _FLUSH_TERMS:
+                self._flush()
+        return True
+
+    def _flush(self):
+        terms = list(self._pending)
+        if terms:
+            self.oov_counts.add(terms, [self._pending[term] for term in terms])
+            self.candidates.update(terms)
+            self._pending = {}
+        if len(self.candidates) > 2 * self.capacity:
+            self._prune(self.capacity)
+
+    def _prune(self, keep):
+        terms = list(self.candidates)
+        top = np.argsort(-self.oov_counts.estimate(terms), kind='stable')[:keep]
+        self.candidates = {terms[i] for i in top}
+
+    def refreshed_idf(self):
+        """IDF of the training corpus plus every document observed since"""
+        if not self.can_refresh:
+            raise ValueError("The model does not record its training corpus size; retrain to enable IDF refresh")
+        with self._lock:
+            return smoothed_idf(self._base_counts + self.doc_counts, self.n_documents + self.observed)
+
+    def refresh(self):
+        """Fold the observed documents into the baseline and return the new IDF"""
+        if not self.can_refresh:
+            raise ValueError("The model does not record its training corpus size; retrain to enable IDF refresh")
+        with self._lock:
+            self._base_counts = self._base_counts + self.doc_counts
+            self.n_documents += self.observed
+            self.idf = smoothed_idf(self._base_counts, self.n_documents)
+            self.doc_counts[:] = 0
+            self.observed = 0
+            self.refreshes += 1
+            return self.idf
+
+    def get_stats(self):
+        with self._lock:
+            self._flush()
+            terms = list(self.candidates)
+            counts = self.oov_counts.estimate(terms)
+            top = np.argsort(-counts, kind='stable')[:self.emerging_terms]
+            stats = {
+                'vocabulary_size': len(self.idf),
+                'sample_rate': self.sample_rate,
+                'training_documents': self.n_documents,
+                'observed_documents': self.observed,
+                # Share of the distinct words of an email that the vocabulary does not know
+                'oov_rate': self.oov_words / self.words if self.words else 0.0,
+                'oov_document_rate': self.oov_documents / self.observed if self.observed else 0.0,
+                'emerging_terms': [{'term': terms[i], 'documents': int(counts[i])} for i in top],
+                'refreshes': self.refreshes,
+                'can_refresh': self.can_refresh
+            }
+        if self.can_refresh and stats['observed_documents']:
+            # Mean absolute change of the IDF weights if the refresh were adopted now
+            stats['idf_shift'] = float(np.abs(self.refreshed_idf() - self.idf).mean())
+        return stats
+
+
+def idf_refresh_path(model_dir=None):
+    return os.path.join(model_dir or Config.MODEL_PATH, Config.IDF_REFRESH_NAME)
+
+
+def save_idf_refresh(fingerprint, idf, n_documents, path=None):
+    """Persist an adopted IDF so a restarted server keeps serving it"""
+    path = path or idf_refresh_path()
+    tmp_path = f"{path}.tmp"
+    joblib.dump({'vocabulary': fingerprint, 'idf': np.asarray(idf), 'n_documents': n_documents}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_idf_refresh(fingerprint, path=None):
+    """The adopted IDF for this vocabulary, or None"""
+    path = path or idf_refresh_path()
+    if not os.path.exists(path):
+        return None
+    refresh = joblib.load(path)
+    if refresh['vocabulary'] != fingerprint:
+        return None
+    return refresh
@@ -0,0 +1,106 @@
+import numpy as np
+from config import Config
+from inference_kernel import CompiledForest, CompiledLinear, UnsupportedModel, compile_model
+
+
+class LinearExplainer:
+    """Contributions of a linear model: each non-zero feature times its weight.
+
+    Contributions are in the model's score units (log-odds for binary and
+    one-vs-rest models, the class logit for multinomial ones); together with
+    `bias` they add up to the score of the explained class.
+    """
+
+    unit = 'logit'
+
+    def __init__(self, model):
+        self.model = model
+
+    def _weights(self, class_index):
+        model = self.model
+        if model.link in ('binary_sigmoid', 'binary_softmax'):
+            # One weight row scores class 1; class 0 is its mirror image
+            scale = (2.0 if model.link == 'binary_softmax' else 1.0) * (1 if class_index == 1 else -1)
+            return model.coef[0] * scale, float(model.intercept[0]) * scale
+        return model.coef[class_index], float(model.intercept[class_index])
+
+    def explain(self, indices, values, dense_input, class_index):
+        weights, bias = self._weights(class_index)
+        return indices, values * weights[indices], bias
+
+
+class ForestExplainer:
+    """Path contributions of a random forest from a per-node table.
+
+    Every node stores how much it moved the class distribution relative to
+    its parent and which feature made that split. Walking an email down the
+    trees (as prediction does anyway) and summing the stored changes of the
+    visited nodes per feature gives contributions that, with `bias` (the
+    root distribution), add up exactly to the predicted probability.
+    """
+
+    unit = 'probability'
+
+    def __init__(self, forest):
+        self.forest = forest
+        nodes = np.arange(len(forest.left))
+        internal = forest.left != nodes
+        parent = nodes.copy()
+        parent[forest.left[internal]] = nodes[internal]
+        parent[forest.right[internal]] = nodes[internal]
+        self.split_feature = forest.feature[parent]
+        self.delta = (forest.value - forest.value[parent]) / len(forest.roots)
+        self.bias = forest.value[forest.roots].mean(axis=0)
+
+    def explain(self, indices, values, dense_input, class_index):
+        forest = self.forest
+        x = np.asarray(dense_input()[0], dtype=np.float32)
+        node = forest.roots
+        visited = []
+        while True:
+            child = np.where(x[forest.feature[node]] <= forest.threshold[node], forest.left[node], forest.right[node])
+            moved = child != node
+            if not moved.any():
+                break
+            visited.append(child[moved])
+            node = child
+        if not visited:
+            return np.empty(0, dtype=np.int64), np.empty(0), float(self.bias[class_index])
+
+        visited = np.concatenate(visited)
+        features, inverse = np.unique(self.split_feature[visited], return_inverse=True)
+        contributions = np.bincount(inverse, weights=self.delta[visited, class_index])
+        return features, contributions, float(self.bias[class_index])
+
+
+def build_explainer(model):
+    """Explainer for a fitted scikit-learn or compiled model, or None if unsupported"""
+    if model is None:
+        return None
+    if not isinstance(model, (CompiledLinear, CompiledForest)):
+        try:
+            model = compile_model(model)
+        except UnsupportedModel:
+            return None
+    if isinstance(model, CompiledLinear):
+        return LinearExplainer(model)
+    if isinstance(model, CompiledForest):
+        return ForestExplainer(model)
+    return None
+
+
+def top_contributions(feature_names, n_text, indices, contributions, top_k=None):
+    """The features that pushed hardest towards the explained class"""
+    top_k = top_k or Config.EXPLAIN_TOP_K
+    positive = np.flatnonzero(contributions > 0)
+    if len(positive) > top_k:
+        positive = positive[np.argpartition(-contributions[positive], top_k - 1)[:top_k]]
+    positive = positive[np.argsort(-contributions[positive])]
+    return [
+        {
+            'feature': feature_names[indices[i]],
+            'type': 'term' if indices[i] < n_text else 'feature',
+            'contribution': float(contributions[i])
+        }
+        for i in positive
+    ]
@@ -0,0 +1,321 @@
+import os
+import re
+import joblib
+import numpy as np
+from config import Config
+
+# This module must not import scikit-learn: the compiled pipeline is what the
+# API serves, and it only needs numpy. Fitted estimators are read by duck
+# typing when compiling at training time.
+
+
+def _dense(array):
+    """ndarray of a fitted attribute; estimators fitted on sparse input store some as sparse matrices"""
+    return array.toarray() if hasattr(array, 'toarray') else array
+
+
+class UnsupportedModel(ValueError):
+    """Raised when a fitted estimator has no compiled equivalent"""
+
+
+class CompiledVectorizer:
+    """TF-IDF transform of one document using a plain vocabulary dict and idf array"""
+
+    def __init__(self, vocabulary, idf, token_pattern, stop_words=None, ngram_range=(1, 1),
+                 lowercase=True, norm='l2', sublinear_tf=False):
+        self.vocabulary = dict(vocabulary)
+        self.idf = idf
+        self.token_pattern = token_pattern
+        self.stop_words = frozenset(stop_words or ())
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self.n_features = len(self.vocabulary)
+        self._token_re = re.compile(token_pattern)
+
+    @classmethod
+    def from_sklearn(cls, vectorizer):
+        if (vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None
+                or vectorizer.preprocessor is not None or vectorizer.strip_accents is not None):
+            raise UnsupportedModel("Only word analyzers with the default tokenizer can be compiled")
+        if vectorizer.norm not in (None, 'l1', 'l2'):
+            raise UnsupportedModel(f"Unsupported TF-IDF norm: {vectorizer.norm}")
+        return cls(
+            vocabulary={term: int(i) for term, i in vectorizer.vocabulary_.items()},
+            idf=np.asarray(vectorizer.idf_, dtype=np.float64) if vectorizer.use_idf else None,
+            token_pattern=vectorizer.token_pattern,
+            stop_words=vectorizer.get_stop_words(),
+            ngram_range=vectorizer.ngram_range,
+            lowercase=vectorizer.lowercase,
+            norm=vectorizer.norm,
+            sublinear_tf=vectorizer.sublinear_tf
+        )
+
+    def terms(self, text):
+        """Word n-grams of a document, as TfidfVectorizer's analyzer produces them"""
+        if self.lowercase:
+            text = text.lower()
+        tokens = [token for token in self._token_re.findall(text) if token not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        terms = tokens if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            terms.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, text):
+        """Return (column indices, tf-idf values) of the non-zero entries"""
+        counts = {}
+        vocabulary = self.vocabulary
+        for term in self.terms(text):
+            column = vocabulary.get(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.sublinear_tf:
+            values = np.log(values) + 1
+        if self.idf is not None:
+            values *= self.idf[indices]
+        if self.norm == 'l2' and len(values):
+            values /= np.sqrt(np.dot(values, values))
+        elif self.norm == 'l1' and len(values):
+            values /= np.abs(values).sum()
+        return indices, values
+
+
+class CompiledLinear:
+    """Logistic regression as a weight matrix, bias vector and link function"""
+
+    def __init__(self, coef, intercept, link):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.link = link
+
+    @classmethod
+    def from_sklearn(cls, model):
+        n_classes = len(model.classes_)
+        multi_class = model.multi_class
+        if multi_class == 'auto':
+            multi_class = 'ovr' if model.solver == 'liblinear' or n_classes == 2 else 'multinomial'
+        if n_classes == 2:
+            link = 'binary_softmax' if multi_class == 'multinomial' else 'binary_sigmoid'
+        else:
+            link = multi_class
+        return cls(model.coef_, model.intercept_, link)
+
+    def predict_proba(self, X):
+        scores = X @ self.coef.T + self.intercept
+        if self.link == 'binary_sigmoid':
+            p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1 - p, p])
+        if self.link == 'binary_softmax':
+            p = 1.0 / (1.0 + np.exp(-2 * scores[:, 0]))
+            return np.column_stack([1 - p, p])
+        if self.link == 'ovr':
+            p = 1.0 / (1.0 + np.exp(-scores))
+            return p / p.sum(axis=1, keepdims=True)
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class CompiledForest:
+    """All trees of a random forest flattened into shared node arrays.
+
+    Every tree is walked at once: one vectorized step moves each tree's
+    current node to its left or right child, so the number of numpy calls
+    is bounded by the deepest tree rather than the number of trees.
+    """
+
+    def __init__(self, roots, left, right, feature, threshold, value):
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+
+    @classmethod
+    def from_sklearn(cls, model):
+        parts = {name: [] for name in ('left', 'right', 'feature', 'threshold', 'value')}
+        roots = []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                raise UnsupportedModel("Multi-output forests cannot be compiled")
+            is_leaf = tree.children_left == -1
+            # Leaves point at themselves so finished trees stay put
+            nodes = np.arange(tree.node_count) + offset
+            parts['left'].append(np.where(is_leaf, nodes, tree.children_left + offset))
+            parts['right'].append(np.where(is_leaf, nodes, tree.children_right + offset))
+            parts['feature'].append(np.where(is_leaf, 0, tree.feature))
+            parts['threshold'].append(np.where(is_leaf, np.inf, tree.threshold))
+            value = tree.value[:, 0, :]
+            parts['value'].append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            roots=np.asarray(roots, dtype=np.int64),
+            left=np.concatenate(parts['left']).astype(np.int64),
+            right=np.concatenate(parts['right']).astype(np.int64),
+            feature=np.concatenate(parts['feature']).astype(np.int64),
+            threshold=np.concatenate(parts['threshold']).astype(np.float64),
+            value=np.concatenate(parts['value']).astype(np.float64)
+        )
+
+    def predict_proba(self, X):
+        # Trees compare float32 features, like scikit-learn does
+        X = np.asarray(X, dtype=np.float32)
+        probs = np.empty((X.shape[0], self.value.shape[1]))
+        for row, x in enumerate(X):
+            node = self.roots
+            while True:
+                child = np.where(x[self.feature[node]] <= self.threshold[node], self.left[node], self.right[node])
+                if np.array_equal(child, node):
+                    break
+                node = child
+            probs[row] = self.value[node].mean(axis=0)
+        return probs
+
+
+class CompiledSVC:
+    """Binary RBF or linear SVM with Platt-scaled probabilities"""
+
+    def __init__(self, support_vectors, dual_coef, intercept, kernel, gamma, prob_a, prob_b):
+        self.support_vectors = support_vectors
+        self.dual_coef = dual_coef
+        self.intercept = intercept
+        self.kernel = kernel
+        self.gamma = gamma
+        self.prob_a = prob_a
+        self.prob_b = prob_b
+        self._sv_norms = (support_vectors ** 2).sum(axis=1)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        if len(model.classes_) != 2 or model.kernel not in ('rbf', 'linear') or not model.probability:
+            raise UnsupportedModel("Only binary RBF or linear SVMs with probability=True can be compiled")
+        return cls(
+            support_vectors=np.asarray(_dense(model.support_vectors_), dtype=np.float64),
+            dual_coef=np.asarray(_dense(model.dual_coef_)[0], dtype=np.float64),
+            intercept=float(model.intercept_[0]),
+            kernel=model.kernel,
+            gamma=float(model._gamma),
+            prob_a=float(model.probA_[0]),
+            prob_b=float(model.probB_[0])
+        )
+
+    def predict_proba(self, X):
+        dot = X @ self.support_vectors.T
+        if self.kernel == 'rbf':
+            sq_dist = (X ** 2).sum(axis=1)[:, None] + self._sv_norms[None, :] - 2 * dot
+            dot = np.exp(-self.gamma * np.maximum(sq_dist, 0))
+        decision = dot @ self.dual_coef + self.intercept
+        f = -decision * self.prob_a + self.prob_b
+        r = np.where(f >= 0, np.exp(-f) / (1 + np.exp(-f)), 1 / (1 + np.exp(f)))
+        r = np.clip(r, 1e-7, 1 - 1e-7)
+        return np.array([_couple_pairwise(r01) for r01 in r])
+
+
+def _couple_pairwise(r01, max_iter=100, eps=0.0025):
+    """libsvm's iterative pairwise coupling for two classes.
+
+    libsvm does not return the Platt probability directly but refines it
+    with the same fixed-point iteration it uses for k classes, stopping at a
+    tolerance, so matching scikit-learn needs the same steps.
+    """
+    r10 = 1 - r01
+    Q = np.array([[r10 * r10, -r10 * r01], [-r10 * r01, r01 * r01]])
+    p = np.array([0.5, 0.5])
+    for _ in range(max_iter):
+        Qp = Q @ p
+        pQp = p @ Qp
+        if np.max(np.abs(Qp - pQp)) < eps:
+            break
+        for t in range(2):
+            diff = (-Qp[t] + pQp) / Q[t, t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t, t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            Qp = (Qp + diff * Q[t]) / (1 + diff)
+            p /= 1 + diff
+    return p
+
+
+def compile_model(model):
+    """Compile a fitted scikit-learn classifier, or raise UnsupportedModel"""
+    if model is None:
+        return None
+    name = type(model).__name__
+    if name == 'LogisticRegression':
+        return CompiledLinear.from_sklearn(model)
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        return CompiledForest.from_sklearn(model)
+    if name == 'SVC':
+        return CompiledSVC.from_sklearn(model)
+    raise UnsupportedModel(f"No compiled kernel for {name}")
+
+
+class CompiledPipeline:
+    """Everything the API needs to score an email, as plain numpy arrays"""
+
+    def __init__(self, vectorizer, mean, scale, models, classes, metadata=None):
+        self.vectorizer = vectorizer
+        self.mean = mean
+        self.scale = scale
+        self.models = models
+        self.classes = classes
+        self.metadata = metadata or {}
+        self.n_text = vectorizer.n_features
+
+    def featurize(self, text, numerical):
+        """Dense (1, n_features) row of TF-IDF values followed by scaled numericals"""
+        indices, values = self.vectorizer.transform(text)
+        return self.assemble(indices, values, numerical)
+
+    def assemble(self, indices, values, numerical):
+        """Dense row from an already computed TF-IDF vector"""
+        X = np.zeros((1, self.n_text + len(self.mean)))
+        X[0, indices] = values
+        X[0, self.n_text:] = (np.asarray(numerical, dtype=np.float64) - self.mean) / self.scale
+        return X
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+
+def compile_pipeline(model_data):
+    """Compile a trained model artifact into a CompiledPipeline"""
+    scaler = model_data['scaler']
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones_like(scaler.mean_)
+    models = {
+        'importance': compile_model(model_data['importance_model']),
+        'category': compile_model(model_data['category_model']),
+        'fast_importance': compile_model(model_data.get('fast_importance_model')),
+        'fast_category': compile_model(model_data.get('fast_category_model'))
+    }
+    return CompiledPipeline(
+        vectorizer=CompiledVectorizer.from_sklearn(model_data['vectorizer']),
+        mean=np.asarray(scaler.mean_, dtype=np.float64),
+        scale=np.asarray(scale, dtype=np.float64),
+        models=models,
+        classes=list(model_data['label_encoder'].classes_),
+        metadata={'cascade_report': model_data.get('cascade_report'), 'n_documents': model_data.get('n_documents')}
+    )
+
+
+def kernel_path(model_dir=None):
+    return os.path.join(model_dir or Config.MODEL_PATH, Config.KERNEL_NAME)
+
+
+def load_kernel(model_dir=None):
+    """Load the compiled pipeline if it was exported, otherwise return None"""
+    path = kernel_path(model_dir)
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path)
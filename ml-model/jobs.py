@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from config import Config
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+class JobQueue:
+    """Bounded in-process queue of classification jobs.
+
+    Jobs are handed to a fixed set of background worker threads. When
+    `max_pending` jobs are already waiting, `submit` rejects new work instead
+    of letting the backlog grow. Finished jobs are kept for `result_ttl`
+    seconds so clients can collect them.
+    """
+
+    def __init__(self, handler, max_pending=None, workers=None, result_ttl=None):
+        self.handler = handler
+        self.max_pending = max_pending or Config.JOB_QUEUE_SIZE
+        self.result_ttl = result_ttl if result_ttl is not None else Config.JOB_RESULT_TTL
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._workers = []
+
+        for i in range(workers or Config.JOB_WORKERS):
+            worker = threading.Thread(target=self._run_worker, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, payload):
+        """Queue a job and return its ID, or raise JobQueueFull"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'submitted_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+
+        with self._condition:
+            self._evict_expired()
+            try:
+                self._queue.put_nowait((job_id, payload))
+            except queue.Full:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._jobs[job_id] = job
+
+        return job_id
+
+    def get(self, job_id, wait=0):
+        """Return a snapshot of a job, long-polling up to `wait` seconds for it to finish"""
+        deadline = time.monotonic() + max(0, wait)
+        with self._condition:
+            self._evict_expired()
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if job['status'] in ('completed', 'failed') or remaining <= 0:
+                    return {key: value for key, value in job.items() if not key.startswith('_')}
+                self._condition.wait(remaining)
+
+    def retry_after(self):
+        """Rough number of seconds until the queue has room again"""
+        return max(1, self._queue.qsize() // max(len(self._workers), 1))
+
+    def _run_worker(self):
+        while True:
+            job_id, payload = self._queue.get()
+            self._update(job_id, status='running', started_at=datetime.now().isoformat())
+            try:
+                result = self.handler(payload)
+                self._update(job_id, status='completed', result=result)
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job_id, **changes):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(changes)
+            if job['status'] in ('completed', 'failed'):
+                job['finished_at'] = datetime.now().isoformat()
+                job['_finished'] = time.monotonic()
+            self._condition.notify_all()
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get('_finished') is not None and job['_finished'] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get_stats(self):
+        with self._condition:
+            statuses = [job['status'] for job in self._jobs.values()]
+        return {
+            'pending': self._queue.qsize(),
+            'max_pending': self.max_pending,
+            'workers': len(self._workers),
+            'running': statuses.count('running'),
+            'completed': statuses.count('completed'),
+            'failed': statuses.count('failed')
+        }
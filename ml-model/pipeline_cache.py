@@ -0,0 +1,100 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import joblib
+from config import Config
+from resources import peak_rss_bytes
+
+# Bump when stage implementations change so old cache entries are ignored
+CACHE_VERSION = 4
+
+
+def _encode(part):
+    if isinstance(part, bytes):
+        return part
+    return json.dumps(part, sort_keys=True, default=str).encode('utf-8')
+
+
+def hash_records(records):
+    """Content hash of a list of email dicts, computed one record at a time"""
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(_encode(record))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class StageCache:
+    """On-disk cache for training pipeline stages.
+
+    Each stage output is stored under a key derived from its inputs (usually
+    the key of the previous stage) and the Config values it depends on, so a
+    rerun only recomputes stale stages. Outputs are written to a temporary
+    file and renamed into place, so an interrupted run never leaves a partial
+    entry and the next run resumes after the last completed stage.
+    """
+
+    def __init__(self, cache_dir=None, enabled=None, keep=None):
+        self.cache_dir = cache_dir or Config.PIPELINE_CACHE_DIR
+        self.enabled = Config.PIPELINE_CACHE_ENABLED if enabled is None else enabled
+        self.keep = keep or Config.PIPELINE_CACHE_KEEP
+        self.timings = {}
+        self.status = {}
+        # Process high-water mark once each stage finished; it never goes down
+        self.peak_rss_so_far = {}
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, stage, *parts):
+        """Hash a stage name, the cache version and the stage inputs"""
+        digest = hashlib.sha256(f"{stage}:{CACHE_VERSION}".encode('utf-8'))
+        for part in parts:
+            digest.update(_encode(part))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, stage, key, suffix='.joblib'):
+        """File path for a stage output (or an extra file it produces)"""
+        return os.path.join(self.cache_dir, f"{stage}-{key[:16]}{suffix}")
+
+    def run(self, stage, key, compute, outputs=(), dump=joblib.dump, load=joblib.load, suffix='.joblib'):
+        """Return the cached output of a stage, computing and storing it if stale.
+
+        `outputs` lists extra files the stage writes itself; the cache entry
+        only counts as complete if they all exist. `dump`/`load`/`suffix`
+        choose another on-disk format for the stage output.
+        """
+        start = time.perf_counter()
+        path = self.path(stage, key, suffix)
+
+        if self.enabled and os.path.exists(path) and all(os.path.exists(p) for p in outputs):
+            result = load(path)
+            self.status[stage] = 'cached'
+            print(f"✓ Stage '{stage}' loaded from cache ({key[:8]})")
+        else:
+            result = compute()
+            self.status[stage] = 'computed'
+            if self.enabled:
+                tmp_path = f"{path}.tmp"
+                dump(result, tmp_path)
+                os.replace(tmp_path, path)
+                self._prune(stage, suffix)
+
+        self.timings[stage] = time.perf_counter() - start
+        self.peak_rss_so_far[stage] = peak_rss_bytes()
+        return result
+
+    def _prune(self, stage, suffix='.joblib'):
+        """Keep only the most recent entries of a stage"""
+        entries = sorted(
+            (path for path in glob.glob(os.path.join(self.cache_dir, f"{stage}-*{suffix}"))
+             if len(os.path.basename(path)) == len(stage) + len(f"-{suffix}") + 16),
+            key=os.path.getmtime,
+            reverse=True
+        )
+        for stale in entries[self.keep:]:
+            prefix = stale[:-len(suffix)]
+            for path in glob.glob(f"{prefix}*"):
+                os.remove(path)
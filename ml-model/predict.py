@@ -1,12 +1,30 @@
 from flask import Flask, request, jsonify
+from werkzeug.exceptions import BadRequest
 from flask_cors import CORS
 import joblib
 import numpy as np
+from scipy import sparse
 import os
+import atexit
 import logging
+import functools
+import time
 from datetime import datetime
 from config import Config
-from data_processor import EmailDataProcessor
+from data_processor import NUMERICAL_FEATURES
+from admission import AdmissionController, Overloaded, INTERACTIVE, BULK
+from cascade import CascadeStats, cascade_predict_proba
+from dedup import NearDuplicateIndex
+from domain_index import domain_index_path, load_domain_index
+from drift import VocabularyMonitor, load_idf_refresh, save_idf_refresh
+from explain import build_explainer, top_contributions
+from inference_kernel import load_kernel
+from jobs import JobQueue, JobQueueFull
+from shadow import ShadowEvaluator
+from similar import load_similarity_index, vocabulary_fingerprint
+from user_heads import load_user_heads
+from worker_pool import PreprocessingPool
+from serialization import get_request_data, include_features, explain_requested, encode_response
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,32 +34,126 @@ app = Flask(__name__)
 CORS(app)
 
 class EmailPredictor:
-    def __init__(self):
-        self.processor = EmailDataProcessor()
+    """Serve predictions safely from a threaded Flask app.
+
+    Preprocessing (HTML cleaning, tokenizing, stemming) runs in a process pool
+    where every worker owns its own EmailDataProcessor, or inline on a
+    thread-local processor when the pool is disabled. No preprocessing state
+    is shared between concurrent requests. Model calls happen in this process
+    and only read the fitted estimators; the mutable caches (dedup index,
+    user heads) guard themselves with locks.
+    """
+    
+    def __init__(self, preprocessing=None):
+        self.preprocessing = preprocessing or PreprocessingPool()
         self.models = None
         self.vectorizer = None
         self.label_encoder = None
         self.scaler = None
+        self.kernel = None
+        self.categories = None
+        self.explainers = {}
+        self.feature_names = None
+        self.user_heads = None
+        self.domain_index = None
+        self.shadow = None
+        self.similar_index = None
+        self.vocabulary_monitor = None
+        self.n_documents = None
+        self.sparse_input = False
+        self.dedup_index = NearDuplicateIndex() if Config.DEDUP_ENABLED else None
+        self.cascade_stats = CascadeStats()
+        self.cascade_report = None
         self.is_loaded = False
         
-    def load_models(self):
-        """Load trained models and preprocessors"""
+    def load_models(self, model_dir=None):
+        """Load trained models and preprocessors.
+        
+        Passing `model_dir` loads only the shared models from another
+        directory, which is how shadow candidates are loaded.
+        """
         try:
-            model_path = os.path.join(Config.MODEL_PATH, Config.MODEL_NAME)
+            primary = model_dir is None
+            model_dir = model_dir or Config.MODEL_PATH
+            model_path = os.path.join(model_dir, Config.MODEL_NAME)
             
             if not os.path.exists(model_path):
                 raise FileNotFoundError(f"Model file not found: {model_path}")
             
-            model_data = joblib.load(model_path)
+            # The compiled kernel needs only numpy; fall back to the scikit-learn artifact
+            self.kernel = load_kernel(model_dir) if Config.INFERENCE_KERNEL_ENABLED else None
+            if self.kernel is not None:
+                self.models = dict(self.kernel.models)
+                self.categories = self.kernel.classes
+                cascade_report = self.kernel.metadata.get('cascade_report')
+                self.n_documents = self.kernel.metadata.get('n_documents')
+                self.sparse_input = False
+                logger.info("Serving from compiled inference kernel")
+            else:
+                model_data = joblib.load(model_path)
+                
+                self.models = {
+                    'importance': model_data['importance_model'],
+                    'category': model_data['category_model'],
+                    'fast_importance': model_data.get('fast_importance_model'),
+                    'fast_category': model_data.get('fast_category_model')
+                }
+                
+                self.vectorizer = model_data['vectorizer']
+                self.label_encoder = model_data['label_encoder']
+                self.scaler = model_data['scaler']
+                self.categories = list(self.label_encoder.classes_)
+                self.n_text = len(self.vectorizer.vocabulary_)
+                cascade_report = model_data.get('cascade_report')
+                self.n_documents = model_data.get('n_documents')
+                # Models trained under a tight memory budget take the sparse row as is
+                self.sparse_input = model_data.get('sparse_input', False)
             
-            self.models = {
-                'importance': model_data['importance_model'],
-                'category': model_data['category_model']
-            }
+            # Optional linear first stage for cascade inference
+            if Config.CASCADE_ENABLED:
+                self.cascade_report = cascade_report
+            else:
+                self.models['fast_importance'] = None
+                self.models['fast_category'] = None
+            
+            # Per-model contribution tables for optional explanations
+            if Config.EXPLAIN_ENABLED:
+                self.explainers = {name: build_explainer(model) for name, model in self.models.items()}
+                if self.kernel is not None:
+                    terms = sorted(self.kernel.vectorizer.vocabulary, key=self.kernel.vectorizer.vocabulary.get)
+                else:
+                    terms = list(self.vectorizer.get_feature_names_out())
+                self.feature_names = terms + NUMERICAL_FEATURES
             
-            self.vectorizer = model_data['vectorizer']
-            self.label_encoder = model_data['label_encoder']
-            self.scaler = model_data['scaler']
+            if primary:
+                # Optional per-domain shortcut statistics, kept up to date from predictions
+                self.domain_index = load_domain_index() if Config.DOMAIN_SHORTCUT_ENABLED else None
+                
+                # Optional per-user importance heads (loaded lazily per user)
+                self.user_heads = load_user_heads()
+                if self.user_heads is not None:
+                    logger.info(f"Loaded user head index for {len(self.user_heads.heads)} users")
+                
+                # Streaming document frequencies of served text, and any IDF refreshed from them
+                if Config.VOCAB_DRIFT_ENABLED:
+                    self.vocabulary_monitor = self._load_vocabulary_monitor()
+                
+                # Similar-email search index, one per vectorizer vocabulary, weighted by the IDF in use
+                if Config.SIMILAR_ENABLED:
+                    if self.kernel is not None:
+                        vocabulary, idf = self.kernel.vectorizer.vocabulary, self.kernel.vectorizer.idf
+                    else:
+                        vocabulary = self.vectorizer.vocabulary_
+                        idf = self.vectorizer.idf_ if self.vectorizer.use_idf else None
+                    self.similar_index = load_similarity_index(vocabulary, idf)
+                    logger.info(f"Loaded similar-email index with {self.similar_index.get_stats()['documents']} emails")
+                
+                # Optional candidate model scored on sampled traffic in the background
+                if Config.SHADOW_MODEL_PATH:
+                    candidate = EmailPredictor(preprocessing=PreprocessingPool(max_workers=0))
+                    candidate.load_models(Config.SHADOW_MODEL_PATH)
+                    self.shadow = ShadowEvaluator(candidate._predict_from_features)
+                    logger.info(f"Shadow-scoring {Config.SHADOW_SAMPLE_RATE:.0%} of traffic with {Config.SHADOW_MODEL_PATH}")
             
             self.is_loaded = True
             logger.info("Models loaded successfully")
@@ -50,82 +162,376 @@ class EmailPredictor:
             logger.error(f"Error loading models: {str(e)}")
             raise e
     
-    def predict_email(self, email_data):
+    def _load_vocabulary_monitor(self):
+        """Vocabulary monitor for the loaded vectorizer, applying a previously adopted IDF"""
+        if self.kernel is not None:
+            vectorizer = self.kernel.vectorizer
+            vocabulary, idf, analyzer = vectorizer.vocabulary, vectorizer.idf, vectorizer.terms
+        else:
+            vocabulary, analyzer = self.vectorizer.vocabulary_, self.vectorizer.build_analyzer()
+            idf = self.vectorizer.idf_ if self.vectorizer.use_idf else None
+        if idf is None:
+            return None
+        
+        n_documents = self.n_documents
+        refresh = load_idf_refresh(vocabulary_fingerprint(vocabulary))
+        if refresh is not None:
+            idf, n_documents = refresh['idf'], refresh['n_documents']
+            self._set_idf(idf)
+            logger.info(f"Serving IDF refreshed over {n_documents} documents")
+        return VocabularyMonitor(vocabulary, idf, n_documents, analyzer)
+    
+    def _set_idf(self, idf):
+        """Swap the IDF weights the vectorizer applies; the models are unchanged"""
+        if self.kernel is not None:
+            self.kernel.vectorizer.idf = np.asarray(idf, dtype=np.float64)
+        else:
+            self.vectorizer.idf_ = idf
+    
+    def refresh_idf(self, min_documents=None):
+        """Adopt IDF weights updated with the documents served since the last refresh.
+        
+        Cached predictions and indexed similar-email vectors were weighted by
+        the previous IDF: the dedup cache is emptied and the stored vectors
+        are re-weighted before the vectorizer switches to the new weights.
+        """
+        monitor = self.vocabulary_monitor
+        if monitor is None:
+            raise ValueError("Vocabulary drift tracking is disabled")
+        min_documents = Config.IDF_REFRESH_MIN_DOCUMENTS if min_documents is None else min_documents
+        if monitor.observed < min_documents:
+            raise ValueError(f"Only {monitor.observed} documents observed since the last refresh, "
+                             f"{min_documents} needed")
+        
+        previous = monitor.idf
+        idf = monitor.refresh()
+        idf_shift = float(np.abs(idf - previous).mean())
+        if self.similar_index is not None:
+            self.similar_index.reweight(idf)
+        self._set_idf(idf)
+        save_idf_refresh(vocabulary_fingerprint(monitor.vocabulary), idf, monitor.n_documents)
+        if self.dedup_index is not None:
+            self.dedup_index.clear()
+        logger.info(f"Adopted refreshed IDF over {monitor.n_documents} documents (mean shift {idf_shift:.4f})")
+        return {'documents': monitor.n_documents, 'idf_shift': idf_shift, 'refreshes': monitor.refreshes}
+    
+    def predict_email(self, email_data, include_features=True, explain=False):
         """Predict importance and category for an email"""
         if not self.is_loaded:
             raise RuntimeError("Models not loaded. Call load_models() first.")
         
         try:
             # Extract features
-            features = self.processor.extract_features(email_data)
+            features = self.preprocessing.extract_features(email_data)
+            return self._predict_with_features(email_data, features, include_features, explain)
             
-            # Prepare text features
-            text_vector = self.vectorizer.transform([features['processed_text']])
-            
-            # Prepare numerical features
-            numerical_features = np.array([[
-                features['subject_length'],
-                features['body_length'],
-                features['word_count'],
-                features['exclamation_count'],
-                features['question_count'],
-                features['caps_ratio'],
-                features['has_deadline'],
-                features['has_urgent'],
-                features['has_apply'],
-                features['has_opportunity']
-            ]])
-            
-            # Scale numerical features
+        except Exception as e:
+            logger.error(f"Error predicting email: {str(e)}")
+            raise e
+    
+    def predict_batch(self, emails, include_features=True, explain=False):
+        """Predict many emails, returning (prediction, error) pairs in order.
+        
+        Feature extraction for the whole batch is spread over the worker pool;
+        the models then run over the extracted features in this process.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Models not loaded. Call load_models() first.")
+        
+        results = []
+        for email_data, (features, error) in zip(emails, self.preprocessing.extract_batch(emails)):
+            if error is None:
+                try:
+                    results.append((self._predict_with_features(email_data, features, include_features, explain), None))
+                    continue
+                except Exception as e:
+                    error = str(e)
+            results.append((None, error))
+        
+        return results
+    
+    def _predict_with_features(self, email_data, features, include_features, explain=False):
+        """Build the prediction response for already extracted features.
+        
+        Explained predictions always come from the models, never from the
+        domain shortcut or the dedup cache, so the explanation matches the answer.
+        Requests for an explanation are ignored when EXPLAIN_ENABLED is off.
+        """
+        user_id = email_data.get('user_id')
+        explain = explain and self.feature_names is not None
+        
+        # A sample of served text feeds the vocabulary drift statistics
+        if self.vocabulary_monitor is not None:
+            self.vocabulary_monitor.observe(features['processed_text'])
+        
+        # Emails with an id and an owner are added to the similar-email index as they are classified
+        text = None
+        email_id = email_data.get('id')
+        if self.similar_index is not None and email_id and user_id:
+            text = self.vectorize_text(features['processed_text'])
+            self.similar_index.add(email_id, *text, owner=user_id)
+        
+        personalized = self.user_heads is not None and self.user_heads.has_head(user_id)
+        cacheable = not personalized and not explain
+        
+        # Predictable sender domains are answered from the domain index; a
+        # sample of those answers is checked against the models
+        domain = features['sender_domain']
+        shortcut = None
+        if self.domain_index is not None and cacheable:
+            shortcut = self.domain_index.lookup(domain)
+            if shortcut is not None and not self.domain_index.should_audit():
+                shortcut['shortcut'] = True
+                return self._finish_prediction(shortcut, features, include_features)
+        
+        # Reuse the prediction of a recent near-duplicate if there is one;
+        # cached predictions come from the shared model only
+        signature = None
+        prediction = None
+        if self.dedup_index is not None and cacheable:
+            cached, signature = self.dedup_index.lookup(features['processed_text'])
+            if cached is not None:
+                prediction = self._copy_prediction(cached)
+        scored = prediction is None
+        
+        if scored:
+            start = time.perf_counter()
+            prediction = self._predict_from_features(features, user_id if personalized else None, text, explain)
+            primary_seconds = time.perf_counter() - start
+            if self.dedup_index is not None and cacheable:
+                self.dedup_index.add(signature, self._copy_prediction(prediction))
+            # The shadow thread only reads fields that are not modified after this point
+            if self.shadow is not None and not personalized:
+                self.shadow.submit(features, prediction, primary_seconds)
+        
+        # Only emails the models scored feed the domain index, never its own
+        # shortcuts or resent near-duplicates; an audit stands for all the
+        # shortcut answers it samples
+        if self.domain_index is not None and not personalized and scored:
+            weight = 1.0
+            if shortcut is not None:
+                self.domain_index.record_audit(shortcut, prediction)
+                weight = 1.0 / Config.DOMAIN_SHORTCUT_AUDIT_RATE
+            self.domain_index.update(
+                domain, self.categories.index(prediction['primaryCategory']), prediction['isImportant'], weight
+            )
+            self.domain_index.save_if_due(domain_index_path())
+        prediction['shortcut'] = False
+        
+        return self._finish_prediction(prediction, features, include_features)
+    
+    @staticmethod
+    def _finish_prediction(prediction, features, include_features):
+        """Attach the per-email parts of a response"""
+        # Dates depend on the email's own date, so they are never taken from the dedup cache
+        if 'dates' in features:
+            prediction['deadline'] = features['deadline']
+            prediction['dates'] = features['dates']
+        
+        # The features block is optional to keep large batch payloads small
+        if include_features:
+            prediction['features'] = {
+                'textLength': features['total_length'],
+                'hasDeadline': features['has_deadline'],
+                'hasUrgent': features['has_urgent'],
+                'senderDomain': features['sender_domain']
+            }
+        
+        return prediction
+    
+    def vectorize_text(self, processed_text):
+        """(column indices, values) of the TF-IDF vector of preprocessed text"""
+        if self.kernel is not None:
+            return self.kernel.vectorizer.transform(processed_text)
+        text_vector = self.vectorizer.transform([processed_text])
+        return text_vector.indices, text_vector.data
+    
+    def _predict_from_features(self, features, user_id=None, text=None, explain=False):
+        """Run the models on extracted features; `text` is an already computed TF-IDF vector"""
+        # Prepare numerical features
+        numerical_features = np.array([[features[name] for name in NUMERICAL_FEATURES]], dtype=np.float64)
+        
+        text_indices, text_values = text or self.vectorize_text(features['processed_text'])
+        
+        if self.kernel is not None:
+            # One dense row serves every compiled model
+            X = self.kernel.assemble(text_indices, text_values, numerical_features[0])
+            X_sparse, dense_input = X, lambda: X
+            full_input = dense_input
+            n_text = self.kernel.n_text
+            numerical_scaled = X[:, n_text:]
+        else:
+            n_text = self.n_text
+            text_vector = sparse.csr_matrix(
+                (text_values, text_indices, [0, len(text_indices)]), shape=(1, n_text)
+            )
             numerical_scaled = self.scaler.transform(numerical_features)
             
-            # Combine features
-            X = np.hstack([text_vector.toarray(), numerical_scaled])
+            # The fast stage reads the sparse row; the dense row is only built if it defers
+            X_sparse = sparse.hstack([text_vector, sparse.csr_matrix(numerical_scaled)], format='csr')
+            dense_row = []
             
-            # Predict importance
-            importance_prob = self.models['importance'].predict_proba(X)[0]
-            is_important = bool(importance_prob[1] > Config.MIN_CONFIDENCE)
-            importance_confidence = float(importance_prob[1])
+            def dense_input():
+                if not dense_row:
+                    dense_row.append(np.hstack([text_vector.toarray(), numerical_scaled]))
+                return dense_row[0]
             
-            # Predict category
-            category_probs = self.models['category'].predict_proba(X)[0]
-            category_idx = np.argmax(category_probs)
-            category = self.label_encoder.classes_[category_idx]
-            category_confidence = float(category_probs[category_idx])
-            
-            # Get top 3 categories with confidence scores
-            top_categories = []
-            for i, prob in enumerate(category_probs):
-                if prob > 0.1:  # Only include categories with >10% confidence
-                    top_categories.append({
-                        'name': self.label_encoder.classes_[i],
-                        'confidence': float(prob)
-                    })
-            
-            # Sort by confidence
-            top_categories.sort(key=lambda x: x['confidence'], reverse=True)
-            
-            return {
-                'isImportant': is_important,
-                'confidence': importance_confidence,
-                'primaryCategory': category,
-                'categoryConfidence': category_confidence,
-                'categories': top_categories[:3],
-                'features': {
-                    'textLength': features['total_length'],
-                    'hasDeadline': features['has_deadline'],
-                    'hasUrgent': features['has_urgent'],
-                    'senderDomain': features['sender_domain']
-                }
+            full_input = (lambda: X_sparse) if self.sparse_input else dense_input
+        
+        # Non-zero entries of the feature row, for the sparse personal heads and explanations
+        indices = np.concatenate([text_indices, np.arange(n_text, n_text + numerical_scaled.shape[1])])
+        values = np.concatenate([text_values, numerical_scaled[0]])
+        
+        # Predict importance, using the user's personal head when available
+        if user_id is not None:
+            importance_confidence = float(self.user_heads.predict_proba(user_id, indices, values))
+            importance_stage = 'personal'
+        else:
+            importance_prob, importance_stage = cascade_predict_proba(
+                self.models.get('fast_importance'), self.models['importance'], X_sparse, full_input
+            )
+            self.cascade_stats.record('importance', importance_stage)
+            importance_confidence = float(importance_prob[1])
+        is_important = bool(importance_confidence > Config.MIN_CONFIDENCE)
+        
+        # Predict category
+        category_probs, category_stage = cascade_predict_proba(
+            self.models.get('fast_category'), self.models['category'], X_sparse, full_input
+        )
+        self.cascade_stats.record('category', category_stage)
+        category_idx = np.argmax(category_probs)
+        category = self.categories[category_idx]
+        category_confidence = float(category_probs[category_idx])
+        
+        # Get top 3 categories with confidence scores
+        top_categories = []
+        for i, prob in enumerate(category_probs):
+            if prob > 0.1:  # Only include categories with >10% confidence
+                top_categories.append({
+                    'name': self.categories[i],
+                    'confidence': float(prob)
+                })
+        
+        # Sort by confidence
+        top_categories.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        prediction = {
+            'isImportant': is_important,
+            'confidence': importance_confidence,
+            'primaryCategory': category,
+            'categoryConfidence': category_confidence,
+            'categories': top_categories[:3],
+            'personalized': user_id is not None
+        }
+        
+        if explain:
+            prediction['explanation'] = {
+                'importance': self._explain('importance', importance_stage, int(is_important),
+                                            indices, values, dense_input, n_text, user_id),
+                'category': self._explain('category', category_stage, int(category_idx),
+                                          indices, values, dense_input, n_text)
             }
-            
-        except Exception as e:
-            logger.error(f"Error predicting email: {str(e)}")
-            raise e
+        
+        return prediction
+    
+    def _explain(self, head, stage, class_index, indices, values, dense_input, n_text, user_id=None):
+        """Top contributions towards the predicted class of one head, from the model that answered"""
+        if stage == 'personal':
+            unit = 'logit'
+            features, contributions, bias = self.user_heads.contributions(user_id, indices, values)
+            # The head scores "important"; "not important" is its mirror image
+            sign = 1 if class_index == 1 else -1
+            contributions, bias = contributions * sign, bias * sign
+        else:
+            explainer = self.explainers.get(f'fast_{head}' if stage == 'fast' else head)
+            if explainer is None:
+                return None
+            unit = explainer.unit
+            features, contributions, bias = explainer.explain(indices, values, dense_input, class_index)
+        
+        return {
+            'model': stage,
+            'unit': unit,
+            'bias': bias,
+            'contributions': top_contributions(self.feature_names, n_text, features, contributions)
+        }
+    
+    @staticmethod
+    def _copy_prediction(prediction):
+        """Copy a prediction so cached entries are never mutated by callers"""
+        copied = dict(prediction)
+        copied['categories'] = [dict(category) for category in prediction['categories']]
+        return copied
 
 # Initialize predictor
 predictor = EmailPredictor()
 
+@atexit.register
+def save_domain_index():
+    """Keep the domain statistics updated while serving across restarts"""
+    if predictor.domain_index is not None and predictor.domain_index.unsaved:
+        predictor.domain_index.save(domain_index_path())
+
+def run_batch(emails, with_features=True, explain=False):
+    """Predict a batch of emails and build the batch response body"""
+    # Preprocessing runs in parallel across workers
+    predictions = []
+    errors = []
+    results = predictor.predict_batch(emails, include_features=with_features, explain=explain)
+    
+    for i, (prediction, error) in enumerate(results):
+        if error is None:
+            prediction['index'] = i
+            predictions.append(prediction)
+        else:
+            errors.append({
+                'index': i,
+                'error': error
+            })
+    
+    return {
+        'predictions': predictions,
+        'errors': errors,
+        'total_processed': len(predictions),
+        'total_errors': len(errors),
+        'timestamp': datetime.now().isoformat()
+    }
+
+# Execution slots shared by all routes, split into interactive and bulk lanes
+admission = AdmissionController() if Config.ADMISSION_ENABLED else None
+
+def admitted(default_lane):
+    """Run a route in an execution slot of its lane, shedding load with 429/503"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if admission is None:
+                return view(*args, **kwargs)
+            lane = admission.lane_for(request.headers.get('X-Request-Lane'), default_lane)
+            try:
+                with admission.admit(lane):
+                    return view(*args, **kwargs)
+            except Overloaded as e:
+                response = jsonify({
+                    'error': 'Server busy',
+                    'lane': e.lane,
+                    'message': str(e)
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, e.status_code
+        return wrapper
+    return decorator
+
+def run_job(payload):
+    """Run a queued job; job workers take bulk slots but are never shed"""
+    if admission is None:
+        return run_batch(payload['emails'], payload['include_features'], payload['explain'])
+    with admission.admit(BULK, blocking=True):
+        return run_batch(payload['emails'], payload['include_features'], payload['explain'])
+
+# Background queue for asynchronous batch jobs
+job_queue = JobQueue(run_job)
+
 @app.before_first_request
 def load_models():
     """Load models when the app starts"""
@@ -147,6 +553,7 @@ def health_check():
     })
 
 @app.route('/predict', methods=['POST'])
+@admitted(INTERACTIVE)
 def predict():
     """Predict email importance and category"""
     try:
@@ -156,8 +563,8 @@ def predict():
                 'message': 'ML models are not available. Please check server logs.'
             }), 503
         
-        # Get request data
-        data = request.get_json()
+        # Get request data (JSON or MessagePack)
+        data = get_request_data()
         
         if not data:
             return jsonify({
@@ -176,13 +583,21 @@ def predict():
             }), 400
         
         # Make prediction
-        prediction = predictor.predict_email(data)
+        prediction = predictor.predict_email(
+            data, include_features=include_features(data), explain=explain_requested(data)
+        )
         
         # Add metadata
         prediction['timestamp'] = datetime.now().isoformat()
         prediction['model_version'] = '1.0.0'
         
-        return jsonify(prediction)
+        return encode_response(prediction)
+        
+    except BadRequest as e:
+        return jsonify({
+            'error': 'Invalid request body',
+            'message': e.description
+        }), 400
         
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
@@ -192,6 +607,7 @@ def predict():
         }), 500
 
 @app.route('/batch_predict', methods=['POST'])
+@admitted(BULK)
 def batch_predict():
     """Predict multiple emails at once"""
     try:
@@ -200,7 +616,7 @@ def batch_predict():
                 'error': 'Models not loaded'
             }), 503
         
-        data = request.get_json()
+        data = get_request_data()
         
         if not data or 'emails' not in data:
             return jsonify({
@@ -222,33 +638,239 @@ def batch_predict():
                 'message': 'Maximum 100 emails per batch request'
             }), 400
         
-        # Process each email
-        predictions = []
-        errors = []
+        return encode_response(run_batch(emails, include_features(data), explain_requested(data)))
         
-        for i, email in enumerate(emails):
-            try:
-                prediction = predictor.predict_email(email)
-                prediction['index'] = i
-                predictions.append(prediction)
-            except Exception as e:
-                errors.append({
-                    'index': i,
-                    'error': str(e)
-                })
+    except BadRequest as e:
+        return jsonify({
+            'error': 'Invalid request body',
+            'message': e.description
+        }), 400
+        
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        return jsonify({
+            'error': 'Batch prediction failed',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Submit a large batch for asynchronous classification"""
+    try:
+        if not predictor.is_loaded:
+            return jsonify({
+                'error': 'Models not loaded'
+            }), 503
+        
+        data = get_request_data()
+        
+        if not data or 'emails' not in data:
+            return jsonify({
+                'error': 'No emails provided',
+                'message': 'Request body must contain "emails" array'
+            }), 400
+        
+        emails = data['emails']
+        
+        if not isinstance(emails, list):
+            return jsonify({
+                'error': 'Invalid format',
+                'message': 'emails must be an array'
+            }), 400
+        
+        if len(emails) > Config.JOB_MAX_EMAILS:
+            return jsonify({
+                'error': 'Too many emails',
+                'message': f'Maximum {Config.JOB_MAX_EMAILS} emails per job'
+            }), 400
+        
+        try:
+            job_id = job_queue.submit({
+                'emails': emails,
+                'include_features': include_features(data),
+                'explain': explain_requested(data)
+            })
+        except JobQueueFull as e:
+            response = jsonify({
+                'error': 'Job queue full',
+                'message': str(e)
+            })
+            response.headers['Retry-After'] = str(job_queue.retry_after())
+            return response, 429
+        
+        return encode_response({
+            'job_id': job_id,
+            'status': 'queued',
+            'total_emails': len(emails),
+            'status_url': f'/jobs/{job_id}'
+        }, 202)
+        
+    except BadRequest as e:
+        return jsonify({
+            'error': 'Invalid request body',
+            'message': e.description
+        }), 400
+        
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}")
+        return jsonify({
+            'error': 'Job submission failed',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job; pass ?wait=<seconds> to long-poll until it finishes"""
+    try:
+        try:
+            wait = float(request.args.get('wait', 0))
+            if not wait >= 0:
+                raise ValueError(wait)
+        except ValueError:
+            return jsonify({
+                'error': 'Invalid wait',
+                'message': 'wait must be a non-negative number of seconds'
+            }), 400
+        
+        job = job_queue.get(job_id, wait=min(wait, Config.JOB_MAX_WAIT))
+        
+        if job is None:
+            return jsonify({
+                'error': 'Job not found',
+                'message': f'No job with id {job_id} (it may have expired)'
+            }), 404
+        
+        return encode_response(job)
+        
+    except Exception as e:
+        logger.error(f"Job status error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to get job status',
+            'message': str(e)
+        }), 500
+
+@app.route('/similar', methods=['GET', 'POST'])
+@admitted(INTERACTIVE)
+def similar():
+    """Find indexed emails similar to an indexed email (GET ?email_id=) or to posted email content"""
+    try:
+        if not predictor.is_loaded:
+            return jsonify({
+                'error': 'Models not loaded'
+            }), 503
+        
+        if predictor.similar_index is None:
+            return jsonify({
+                'error': 'Similar-email search disabled',
+                'message': 'Set SIMILAR_ENABLED=True to index classified emails'
+            }), 503
+        
+        data = request.args.to_dict() if request.method == 'GET' else get_request_data()
+        if not data:
+            return jsonify({
+                'error': 'No query provided',
+                'message': 'Pass email_id, or post an email with subject and body'
+            }), 400
+        
+        # Every query is scoped to one user's mail; there is no shared partition
+        user_id = data.get('user_id')
+        if not user_id:
+            return jsonify({
+                'error': 'Missing user_id',
+                'message': 'Pass the user_id whose mail to search'
+            }), 400
+        
+        try:
+            k = min(int(data.get('k', Config.SIMILAR_DEFAULT_K)), Config.SIMILAR_MAX_K)
+        except (TypeError, ValueError):
+            return jsonify({
+                'error': 'Invalid k',
+                'message': 'k must be an integer'
+            }), 400
+        
+        start = time.perf_counter()
+        email_id = data.get('email_id') or data.get('id')
+        if 'subject' in data or 'body' in data:
+            features = predictor.preprocessing.extract_features(data)
+            vector = predictor.vectorize_text(features['processed_text'])
+        elif email_id:
+            vector = predictor.similar_index.vector(email_id, user_id)
+            if vector is None:
+                return jsonify({
+                    'error': 'Email not indexed',
+                    'message': f'No indexed email with id {email_id}'
+                }), 404
+        else:
+            return jsonify({
+                'error': 'No query provided',
+                'message': 'Pass email_id, or post an email with subject and body'
+            }), 400
+        
+        results = predictor.similar_index.query(*vector, owner=user_id, k=k, exclude=email_id)
+        
+        return encode_response({
+            'results': [{'email_id': doc_id, 'score': score} for doc_id, score in results],
+            'total_results': len(results),
+            'query_time_ms': (time.perf_counter() - start) * 1000,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except BadRequest as e:
+        return jsonify({
+            'error': 'Invalid request body',
+            'message': e.description
+        }), 400
         
+    except Exception as e:
+        logger.error(f"Similar-email search error: {str(e)}")
         return jsonify({
-            'predictions': predictions,
-            'errors': errors,
-            'total_processed': len(predictions),
-            'total_errors': len(errors),
+            'error': 'Similar-email search failed',
+            'message': str(e)
+        }), 500
+
+@app.route('/vocabulary', methods=['GET'])
+def vocabulary():
+    """Out-of-vocabulary rate, emerging terms and pending IDF shift of served text"""
+    if not predictor.is_loaded:
+        return jsonify({
+            'error': 'Models not loaded'
+        }), 503
+    if predictor.vocabulary_monitor is None:
+        return jsonify({
+            'error': 'Vocabulary drift tracking disabled',
+            'message': 'Set VOCAB_DRIFT_ENABLED=True (requires a TF-IDF vectorizer with IDF weights)'
+        }), 503
+    return jsonify({
+        **predictor.vocabulary_monitor.get_stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/vocabulary/refresh', methods=['POST'])
+def refresh_vocabulary_idf():
+    """Adopt IDF weights updated with the documents served since the last refresh"""
+    try:
+        if not predictor.is_loaded:
+            return jsonify({
+                'error': 'Models not loaded'
+            }), 503
+        
+        try:
+            result = predictor.refresh_idf()
+        except ValueError as e:
+            return jsonify({
+                'error': 'IDF refresh not possible',
+                'message': str(e)
+            }), 409
+        
+        return jsonify({
+            **result,
             'timestamp': datetime.now().isoformat()
         })
         
     except Exception as e:
-        logger.error(f"Batch prediction error: {str(e)}")
+        logger.error(f"IDF refresh error: {str(e)}")
         return jsonify({
-            'error': 'Batch prediction failed',
+            'error': 'IDF refresh failed',
             'message': str(e)
         }), 500
 
@@ -263,11 +885,26 @@ def model_info():
         
         return jsonify({
             'models_loaded': True,
-            'categories': list(predictor.label_encoder.classes_),
+            'categories': list(predictor.categories),
             'features': {
                 'max_features': Config.MAX_FEATURES,
                 'min_confidence': Config.MIN_CONFIDENCE
             },
+            'dedup': predictor.dedup_index.get_stats() if predictor.dedup_index else None,
+            'user_heads': predictor.user_heads.get_stats() if predictor.user_heads else None,
+            'domain_shortcut': predictor.domain_index.get_stats() if predictor.domain_index else None,
+            'shadow': predictor.shadow.get_stats() if predictor.shadow else None,
+            'similar': predictor.similar_index.get_stats() if predictor.similar_index else None,
+            'vocabulary': predictor.vocabulary_monitor.get_stats() if predictor.vocabulary_monitor else None,
+            'inference_kernel': predictor.kernel is not None,
+            'cascade': {
+                'enabled': Config.CASCADE_ENABLED,
+                'threshold': Config.CASCADE_THRESHOLD,
+                'served': predictor.cascade_stats.get_stats(),
+                'training_report': predictor.cascade_report
+            },
+            'jobs': job_queue.get_stats(),
+            'admission': admission.get_stats() if admission else None,
             'version': '1.0.0',
             'timestamp': datetime.now().isoformat()
         })
@@ -294,28 +931,9 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
-    print("🤖 MailSift ML API Server")
-    print("="*30)
-    
-    # Check if models exist
-    model_path = os.path.join(Config.MODEL_PATH, Config.MODEL_NAME)
-    if not os.path.exists(model_path):
-        print("⚠️  WARNING: No trained models found!")
-        print(f"Expected model file: {model_path}")
-        print("Please run 'python train_model.py' first to train the models.")
-        print()
-        print("The server will start but predictions will fail until models are trained.")
-        print()
-    
-    print(f"🚀 Starting server on {Config.HOST}:{Config.PORT}")
-    print(f"📊 Model path: {Config.MODEL_PATH}")
-    print(f"🔗 Health check: http://{Config.HOST}:{Config.PORT}/health")
-    print(f"🎯 Prediction endpoint: http://{Config.HOST}:{Config.PORT}/predict")
-    print()
-    
-    # Start Flask app
-    app.run(
-        host=Config.HOST,
-        port=Config.PORT,
-        debug=Config.DEBUG
-    )
\ No newline at end of file
+    # Spawned preprocessing workers re-import the main module, which would
+    # rebuild the app and job threads in each of them; restart under the
+    # side-effect-free launcher instead
+    import sys
+    import serve
+    os.execv(sys.executable, [sys.executable, serve.__file__] + sys.argv[1:])
@@ -0,0 +1,124 @@
+import os
+import sys
+import numpy as np
+from config import Config
+
+# getrusage is Unix-only; elsewhere memory is read through psutil when it is installed
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Rough transient memory of an exact TF-IDF fit with bigrams, per character of
+# training text (term dictionary plus index arrays; measured at 15-21 bytes)
+EXACT_VOCAB_BYTES_PER_CHAR = 20
+
+# Analyzing text into unigrams and bigrams costs about as much per chunk
+ANALYZED_BYTES_PER_CHAR = 20
+
+
+def peak_rss_bytes(children=False):
+    """Peak resident set size of this process (or the largest of its finished children).
+
+    None when the platform offers no way to read it.
+    """
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+        # Linux reports kilobytes, macOS bytes
+        return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    if psutil is not None and not children:
+        memory = psutil.Process().memory_info()
+        # Windows keeps the peak working set; elsewhere only the current RSS is known
+        return getattr(memory, 'peak_wset', memory.rss)
+    return None
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def physical_memory_bytes():
+    """Installed memory, or None when the platform offers no way to read it"""
+    if hasattr(os, 'sysconf') and 'SC_PHYS_PAGES' in os.sysconf_names:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    return None
+
+
+def format_mb(n_bytes):
+    """Bytes as a rounded MB figure, or 'unknown' when they could not be measured"""
+    return 'unknown' if n_bytes is None else f"{n_bytes / 2 ** 20:.0f} MB"
+
+
+def matrix_bytes(X, dense=False):
+    """Bytes of a matrix as stored, or of its dense float64 equivalent"""
+    if dense:
+        return X.shape[0] * X.shape[1] * 8
+    if isinstance(X, np.ndarray):
+        return X.nbytes
+    return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+
+
+class TrainingBudget:
+    """Memory and core budget for a training run.
+
+    The trainer asks the budget for its choices instead of assuming the
+    whole machine: whether the feature matrix may be densified, how many
+    cross-validation fits may run at once, and how many rows to process per
+    chunk when building the dataset, vocabulary and feature matrix. Each
+    choice keeps its own working set to a fixed share of the memory limit,
+    leaving the rest for the resident dataset, models and interpreter.
+    """
+
+    # Share of the limit for the dense feature matrix and the copies a split makes of it
+    DENSE_SHARE = 0.25
+    # Share of the limit for the fold copies of concurrent cross-validation fits
+    PARALLEL_SHARE = 0.5
+    # Share of the limit for one chunk of rows in flight
+    CHUNK_SHARE = 0.02
+    # Share of the limit an exact vocabulary fit may take before the sketch builder is used
+    VOCAB_SHARE = 0.25
+
+    def __init__(self, memory_bytes, cores):
+        if memory_bytes <= 0 or cores <= 0:
+            raise ValueError("A training budget needs a positive memory limit and core count")
+        self.memory_bytes = int(memory_bytes)
+        self.cores = int(cores)
+
+    @classmethod
+    def from_config(cls):
+        """Budget from TRAINING_MEMORY_LIMIT_MB / TRAINING_CORES, or None when neither is set"""
+        if Config.TRAINING_MEMORY_LIMIT_MB <= 0 and Config.TRAINING_CORES <= 0:
+            return None
+        memory = Config.TRAINING_MEMORY_LIMIT_MB * 2 ** 20 if Config.TRAINING_MEMORY_LIMIT_MB > 0 \
+            else physical_memory_bytes()
+        if memory is None:
+            raise ValueError("Installed memory is unknown on this platform; set TRAINING_MEMORY_LIMIT_MB")
+        cores = Config.TRAINING_CORES if Config.TRAINING_CORES > 0 else available_cores()
+        return cls(memory, min(cores, available_cores()))
+
+    def use_dense(self, X, copies=3):
+        """Whether models may train on a dense copy of X (the matrix, its train split and one fold)"""
+        return matrix_bytes(X, dense=True) * copies <= self.memory_bytes * self.DENSE_SHARE
+
+    def n_jobs(self, job_bytes, n_tasks):
+        """Concurrent fits allowed by the cores and by the memory each fit copies"""
+        by_memory = int(self.memory_bytes * self.PARALLEL_SHARE // max(job_bytes, 1))
+        return max(1, min(self.cores, n_tasks, by_memory))
+
+    def chunk_rows(self, row_bytes, minimum=100):
+        """Rows per chunk so one chunk stays within its share of the limit"""
+        return max(minimum, int(self.memory_bytes * self.CHUNK_SHARE // max(row_bytes, 1)))
+
+    def exact_vocabulary_fits(self, text_chars):
+        return text_chars * EXACT_VOCAB_BYTES_PER_CHAR <= self.memory_bytes * self.VOCAB_SHARE
+
+    def to_dict(self):
+        return {'memory_limit_bytes': self.memory_bytes, 'cores': self.cores}
@@ -0,0 +1,75 @@
+import msgpack
+from flask import request, jsonify, Response
+from werkzeug.exceptions import BadRequest
+from config import Config
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+MSGPACK_MIMETYPES = [MSGPACK_MIMETYPE, 'application/msgpack', 'application/vnd.msgpack']
+JSON_MIMETYPE = 'application/json'
+
+
+def is_msgpack_request():
+    """Check whether the request body is MessagePack encoded"""
+    return request.mimetype in MSGPACK_MIMETYPES
+
+
+def wants_msgpack():
+    """Check whether the client prefers a MessagePack response"""
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE] + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES
+
+
+def get_request_data():
+    """Decode the request body as MessagePack or JSON depending on Content-Type.
+    
+    A body that does not decode raises BadRequest, as Flask does for malformed JSON.
+    """
+    if is_msgpack_request():
+        body = request.get_data()
+        if not body:
+            return None
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except ValueError as e:
+            raise BadRequest(f"Malformed MessagePack body: {e}")
+    return request.get_json()
+
+
+def include_features(data=None):
+    """Resolve whether the verbose `features` block should be returned.
+
+    Clients can opt out with `?features=false` or `"include_features": false`
+    in the body; otherwise Config.INCLUDE_FEATURES applies.
+    """
+    value = request.args.get('features')
+    if value is None and isinstance(data, dict):
+        value = data.get('include_features')
+    if value is None:
+        return Config.INCLUDE_FEATURES
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ('false', '0', 'no')
+
+
+def explain_requested(data=None):
+    """Resolve whether the client asked for an explanation.
+
+    Explanations are opt-in with `?explain=true` or `"explain": true` in the body.
+    """
+    value = request.args.get('explain')
+    if value is None and isinstance(data, dict):
+        value = data.get('explain')
+    if isinstance(value, bool):
+        return value
+    return value is not None and str(value).lower() in ('true', '1', 'yes')
+
+
+def encode_response(payload, status=200):
+    """Encode a response payload using the format negotiated via Accept"""
+    if wants_msgpack():
+        return Response(
+            msgpack.packb(payload, use_bin_type=True),
+            status=status,
+            mimetype=MSGPACK_MIMETYPE
+        )
+    return jsonify(payload), status
@@ -0,0 +1,49 @@
+"""Start the MailSift ML API server.
+
+Preprocessing workers are spawned processes, and a spawned process
+re-imports the parent's main module. Importing this launcher has no side
+effects, so the workers do not build the Flask app, a predictor or the job
+queue threads the way they would if predict.py were the main module.
+"""
+import os
+import signal
+import sys
+from config import Config
+
+
+def main():
+    from predict import app
+
+    print("🤖 MailSift ML API Server")
+    print("="*30)
+    
+    # Check if models exist
+    model_path = os.path.join(Config.MODEL_PATH, Config.MODEL_NAME)
+    if not os.path.exists(model_path):
+        print("⚠️  WARNING: No trained models found!")
+        print(f"Expected model file: {model_path}")
+        print("Please run 'python train_model.py' first to train the models.")
+        print()
+        print("The server will start but predictions will fail until models are trained.")
+        print()
+    
+    print(f"🚀 Starting server on {Config.HOST}:{Config.PORT}")
+    print(f"📊 Model path: {Config.MODEL_PATH}")
+    print(f"🔗 Health check: http://{Config.HOST}:{Config.PORT}/health")
+    print(f"🎯 Prediction endpoint: http://{Config.HOST}:{Config.PORT}/predict")
+    print()
+    
+    # Exit normally on SIGTERM so shutdown hooks (saving the domain index) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Start Flask app
+    app.run(
+        host=Config.HOST,
+        port=Config.PORT,
+        debug=Config.DEBUG,
+        threaded=True
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,7 @@ def setup_ml_environment():
     print("\n3. Checking Python dependencies...")
     required_packages = [
         'numpy', 'pandas', 'scikit-learn', 'flask', 
-        'nltk', 'beautifulsoup4', 'joblib'
+        'nltk', 'beautifulsoup4', 'joblib', 'threadpoolctl'
     ]
     
     missing_packages = []
@@ -75,7 +75,7 @@ def setup_ml_environment():
     print("1. Edit .env file with your configuration")
     print("2. Prepare training data in data_processor.py")
     print("3. Run 'python train_model.py' to train models")
-    print("4. Run 'python predict.py' to start the API server")
+    print("4. Run 'python serve.py' to start the API server")
     
     return True
 
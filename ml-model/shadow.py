@@ -0,0 +1,108 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import Config
+
+
+class ShadowEvaluator:
+    """Score a sample of live traffic with a candidate model off the request path.
+
+    `submit` only draws a random number and does a non-blocking put on a
+    bounded queue; when the queue is full the sample is dropped and counted,
+    so shadow work never slows down or grows the serving path. A single
+    background thread runs `score` (the candidate's feature-to-prediction
+    function) and compares its answers with the primary ones.
+    """
+
+    def __init__(self, score, sample_rate=None, max_queue=None, latency_window=1000):
+        self.score = score
+        self.sample_rate = Config.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_queue = max_queue or Config.SHADOW_QUEUE_SIZE
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._primary_latency = deque(maxlen=latency_window)
+        self._shadow_latency = deque(maxlen=latency_window)
+        self.sampled = 0
+        self.dropped = 0
+        self.scored = 0
+        self.failed = 0
+        self.importance_agreements = 0
+        self.category_agreements = 0
+        self.confidence_delta = 0.0
+
+        self._worker = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+        self._worker.start()
+
+    def submit(self, features, prediction, primary_seconds=None):
+        """Offer one served prediction for shadow scoring; never blocks"""
+        if random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((features, prediction, primary_seconds))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.sampled += 1
+        return True
+
+    def _run(self):
+        while True:
+            features, primary, primary_seconds = self._queue.get()
+            try:
+                start = time.perf_counter()
+                candidate = self.score(features)
+                elapsed = time.perf_counter() - start
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                continue
+            finally:
+                self._queue.task_done()
+
+            with self._lock:
+                self.scored += 1
+                self.importance_agreements += int(candidate['isImportant'] == primary['isImportant'])
+                self.category_agreements += int(candidate['primaryCategory'] == primary['primaryCategory'])
+                self.confidence_delta += abs(candidate['confidence'] - primary['confidence'])
+                self._shadow_latency.append(elapsed)
+                if primary_seconds is not None:
+                    self._primary_latency.append(primary_seconds)
+
+    def drain(self, timeout=None):
+        """Wait until every queued sample has been scored (for tests and benchmarks)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    @staticmethod
+    def _latency_ms(samples):
+        if not samples:
+            return None
+        values = np.array(samples) * 1000
+        return {'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95))}
+
+    def get_stats(self):
+        with self._lock:
+            scored = self.scored
+            return {
+                'sample_rate': self.sample_rate,
+                'sampled': self.sampled,
+                'dropped': self.dropped,
+                'pending': self._queue.qsize(),
+                'scored': scored,
+                'failed': self.failed,
+                'importance_agreement': self.importance_agreements / scored if scored else None,
+                'category_agreement': self.category_agreements / scored if scored else None,
+                'mean_confidence_delta': self.confidence_delta / scored if scored else None,
+                'primary_latency_ms': self._latency_ms(list(self._primary_latency)),
+                'shadow_latency_ms': self._latency_ms(list(self._shadow_latency))
+            }
@@ -0,0 +1,415 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import numpy as np
+from config import Config
+
+# Unmerged documents are kept in arrays that start small and double when full
+_INITIAL_TAIL_ROWS = 1024
+
+
+def record_dtype(terms_per_doc):
+    """Fixed-width on-disk record of one email's truncated vector"""
+    return np.dtype([
+        ('terms', np.int32, (terms_per_doc,)),
+        ('weights', np.float16, (terms_per_doc,)),
+        ('owner', np.int32)
+    ])
+
+
+def vocabulary_fingerprint(vocabulary):
+    """Short hash of a term -> column mapping; term ids are only comparable within one"""
+    digest = hashlib.sha256()
+    for term, column in sorted(vocabulary.items()):
+        digest.update(f"{term}\t{column}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def truncate_vector(indices, values, n_terms):
+    """Keep the `n_terms` heaviest terms of a sparse vector and re-normalize to unit length"""
+    indices = np.asarray(indices)
+    values = np.asarray(values, dtype=np.float32)
+    if len(values) > n_terms:
+        top = np.argpartition(-values, n_terms - 1)[:n_terms]
+        indices, values = indices[top], values[top]
+    norm = np.sqrt(np.dot(values, values))
+    return indices, (values / norm if norm > 0 else values)
+
+
+class _Segment:
+    """Read-only postings of the merged documents, grouped by term and then owner.
+
+    Group g holds the documents `docs[group_ptr[g]:group_ptr[g + 1]]` of owner
+    `group_owner[g]` in insertion order; the groups of term t are
+    `term_ptr[t]:term_ptr[t + 1]`, sorted by owner. Everything lives in a few
+    flat arrays, so memory does not grow with the number of owner and term
+    pairs beyond one owner id and one offset per pair.
+    """
+
+    def __init__(self, terms, weights, owners):
+        n_docs, width = terms.shape
+        terms, weights = terms.ravel(), weights.ravel()
+        docs = np.repeat(np.arange(n_docs, dtype=np.int32), width)
+        owners = np.repeat(np.asarray(owners, dtype=np.int64), width)
+        valid = terms >= 0
+
+        # One stable sort by (term, owner) keeps every group in insertion order
+        keys = (terms[valid].astype(np.int64) << 32) | owners[valid]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        self.docs = docs[valid][order]
+        self.weights = weights[valid][order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        group_terms = keys[starts] >> 32
+        self.group_owner = (keys[starts] & 0xFFFFFFFF).astype(np.int32)
+        self.group_ptr = np.r_[starts, len(keys)].astype(np.int64)
+        n_terms = int(group_terms[-1]) + 1 if len(starts) else 0
+        self.term_ptr = np.searchsorted(group_terms, np.arange(n_terms + 1)).astype(np.int64)
+        self.n_docs = n_docs
+
+    def span(self, term, owner_id):
+        """(start, end) of the postings of `owner_id` for `term`, or None"""
+        if term >= len(self.term_ptr) - 1:
+            return None
+        lo, hi = self.term_ptr[term], self.term_ptr[term + 1]
+        group = lo + np.searchsorted(self.group_owner[lo:hi], owner_id)
+        if group == hi or self.group_owner[group] != owner_id:
+            return None
+        return self.group_ptr[group], self.group_ptr[group + 1]
+
+    @property
+    def nbytes(self):
+        return int(self.docs.nbytes + self.weights.nbytes + self.group_owner.nbytes
+                   + self.group_ptr.nbytes + self.term_ptr.nbytes)
+
+
+class SimilarityIndex:
+    """Incremental inverted index for cosine search over TF-IDF vectors.
+
+    Each email is reduced to its `terms_per_doc` heaviest TF-IDF terms
+    (re-normalized). Postings are partitioned by owner, so a user's query
+    never sees other users' mail; every entry needs an owner, and stored
+    vectors are only returned to it. A query walks its own heaviest terms'
+    postings for its owner, newest entries first and at most `max_postings`
+    per term, so its cost is bounded no matter how many emails are indexed.
+
+    Postings live in a read-only `_Segment`. Emails added since it was built
+    are scored directly from their truncated vectors, found through a
+    per-owner list, and are merged into a new segment (off the lock) once
+    they reach `merge_docs` or a quarter of the segment, whichever is larger.
+
+    Documents are also appended to a fixed-width record file plus an id
+    file in `index_dir`; the segment is rebuilt from them on start. The
+    record width is kept in `meta.json`, and records written with another
+    `terms_per_doc` are converted on open. Term ids only make sense for one
+    vocabulary, so the directory is keyed by the vocabulary fingerprint. The
+    IDF the stored weights were computed with is kept in `idf.npy`; opening
+    with (or `reweight` to) other IDF weights re-weights the stored vectors.
+    """
+
+    def __init__(self, index_dir, terms_per_doc=None, query_terms=None, max_postings=None, merge_docs=None,
+                 meta=None, idf=None):
+        self.index_dir = index_dir
+        self.terms_per_doc = terms_per_doc or Config.SIMILAR_TERMS_PER_DOC
+        self.query_terms = query_terms or Config.SIMILAR_QUERY_TERMS
+        self.max_postings = max_postings or Config.SIMILAR_MAX_POSTINGS
+        self.merge_docs = merge_docs or Config.SIMILAR_MERGE_DOCS
+        self.record_dtype = record_dtype(self.terms_per_doc)
+        self._doc_ids = []
+        self._doc_owners = []
+        self._doc_index = {}
+        self._owners = {}
+        self._n_postings = 0
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._records_path = os.path.join(index_dir, 'records.bin')
+        self._ids_path = os.path.join(index_dir, 'ids.txt')
+        self._meta_path = os.path.join(index_dir, 'meta.json')
+        self._idf_path = os.path.join(index_dir, 'idf.npy')
+        self._check_layout(meta or {})
+        self._records = open(self._records_path, 'ab')
+        self._ids = open(self._ids_path, 'a', encoding='utf-8')
+        self._load()
+        self._idf = np.load(self._idf_path) if os.path.exists(self._idf_path) else None
+        if idf is not None:
+            self.reweight(idf)
+
+    def _owner_id(self, owner):
+        if owner not in self._owners:
+            self._owners[owner] = len(self._owners)
+        return self._owners[owner]
+
+    @staticmethod
+    def _owner_key(owner):
+        """Owners are matched as strings; there is no shared, ownerless partition"""
+        if owner is None or str(owner) == '':
+            raise ValueError("Similar-email index entries and queries need an owner")
+        return str(owner).replace('\t', ' ').replace('\n', ' ')
+
+    def _check_layout(self, meta):
+        """Convert records written with another width, then record this one in meta.json"""
+        stored = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                stored = json.load(f)
+        width = stored.get('terms_per_doc', self.terms_per_doc)
+        if width != self.terms_per_doc and os.path.exists(self._records_path):
+            old = np.fromfile(self._records_path, dtype=record_dtype(width))
+            records = np.zeros(len(old), dtype=self.record_dtype)
+            records['owner'] = old['owner']
+            records['terms'], records['weights'] = _truncate_records(old['terms'], old['weights'], self.terms_per_doc)
+            tmp_path = f"{self._records_path}.tmp"
+            records.tofile(tmp_path)
+            os.replace(tmp_path, self._records_path)
+        with open(self._meta_path, 'w') as f:
+            json.dump({**stored, **meta, 'terms_per_doc': self.terms_per_doc}, f)
+
+    def _load(self):
+        """Rebuild the segment from the record and id files"""
+        with open(self._ids_path, encoding='utf-8') as f:
+            lines = f.read().split('\n')[:-1]
+        records = np.fromfile(self._records_path, dtype=self.record_dtype)
+        # A crash can leave one file a record ahead of the other
+        n_docs = min(len(records), len(lines))
+        records = records[:n_docs]
+        # Drop any partial trailing record so appends stay aligned
+        with open(self._records_path, 'r+b') as f:
+            f.truncate(n_docs * self.record_dtype.itemsize)
+        with open(self._ids_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines[:n_docs]))
+
+        for line in lines[:n_docs]:
+            doc_id, owner = line.split('\t', 1)
+            self._doc_index[doc_id] = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._doc_owners.append(self._owner_id(owner))
+        # The id file is the source of truth for owners
+        self._segment = _Segment(records['terms'], records['weights'], self._doc_owners)
+        self._n_postings = len(self._segment.docs)
+        self._reset_tail()
+
+    def _reset_tail(self):
+        self._tail_terms = np.empty((_INITIAL_TAIL_ROWS, self.terms_per_doc), dtype=np.int32)
+        self._tail_weights = np.empty((_INITIAL_TAIL_ROWS, self.terms_per_doc), dtype=np.float16)
+        self._tail_size = 0
+        self._tail_rows = {}  # owner id -> tail rows, oldest first
+
+    def _append_tail(self, record, owner_id):
+        if self._tail_size == len(self._tail_terms):
+            self._tail_terms = np.resize(self._tail_terms, (2 * len(self._tail_terms), self.terms_per_doc))
+            self._tail_weights = np.resize(self._tail_weights, (2 * len(self._tail_weights), self.terms_per_doc))
+        self._tail_terms[self._tail_size] = record['terms']
+        self._tail_weights[self._tail_size] = record['weights']
+        self._tail_rows.setdefault(owner_id, []).append(self._tail_size)
+        self._tail_size += 1
+
+    def add(self, doc_id, indices, values, owner):
+        """Index one email's TF-IDF vector for its owner; already indexed ids are skipped"""
+        owner = self._owner_key(owner)
+        doc_id = str(doc_id).replace('\t', ' ').replace('\n', ' ')
+        indices, values = truncate_vector(indices, values, self.terms_per_doc)
+        if not len(indices):
+            return False
+
+        record = np.zeros(1, dtype=self.record_dtype)
+        record['terms'][0] = -1
+        record['terms'][0, :len(indices)] = indices
+        record['weights'][0, :len(values)] = values
+
+        with self._lock:
+            if doc_id in self._doc_index or self._records.closed:
+                return False
+            owner_id = self._owner_id(owner)
+            record['owner'] = owner_id
+
+            self._records.write(record.tobytes())
+            self._records.flush()
+            self._ids.write(f"{doc_id}\t{owner}\n")
+            self._ids.flush()
+
+            self._doc_index[doc_id] = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._doc_owners.append(owner_id)
+            self._append_tail(record[0], owner_id)
+            self._n_postings += len(indices)
+            merge = self._tail_size >= max(self.merge_docs, self._segment.n_docs // 4)
+        if merge:
+            self.merge()
+        return True
+
+    def merge(self):
+        """Fold the unmerged documents into a new segment; adds and queries go on meanwhile"""
+        if not self._merge_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                n_docs = len(self._doc_ids)
+                owners = np.array(self._doc_owners, dtype=np.int32)
+            records = np.fromfile(self._records_path, dtype=self.record_dtype, count=n_docs)
+            segment = _Segment(records['terms'], records['weights'], owners)
+            with self._lock:
+                merged = n_docs - self._segment.n_docs
+                self._segment = segment
+                rows = self._tail_size - merged
+                terms = self._tail_terms[merged:self._tail_size]
+                weights = self._tail_weights[merged:self._tail_size]
+                self._tail_terms = np.empty((max(_INITIAL_TAIL_ROWS, 2 * rows), self.terms_per_doc), dtype=np.int32)
+                self._tail_weights = np.empty(self._tail_terms.shape, dtype=np.float16)
+                self._tail_terms[:rows], self._tail_weights[:rows] = terms, weights
+                self._tail_size = rows
+                self._tail_rows = {}
+                for row, owner_id in enumerate(self._doc_owners[n_docs:]):
+                    self._tail_rows.setdefault(owner_id, []).append(row)
+        finally:
+            self._merge_lock.release()
+
+    def reweight(self, idf):
+        """Re-weight the stored vectors for new IDF weights.
+
+        A TF-IDF weight is term frequency times IDF, so each stored weight is
+        scaled by new / old IDF of its term and every vector re-normalized.
+        Vectors keep the terms they were truncated to under the old weights.
+        Adds and queries wait until the records are rewritten.
+        """
+        idf = np.asarray(idf, dtype=np.float64)
+        with self._merge_lock, self._lock:
+            if self._idf is not None and np.array_equal(idf, self._idf):
+                return
+            if self._idf is not None and self._doc_ids:
+                records = np.fromfile(self._records_path, dtype=self.record_dtype, count=len(self._doc_ids))
+                records['weights'] = _scale_records(records['terms'], records['weights'], idf / self._idf)
+                self._records.close()
+                tmp_path = f"{self._records_path}.tmp"
+                records.tofile(tmp_path)
+                os.replace(tmp_path, self._records_path)
+                self._records = open(self._records_path, 'ab')
+                self._segment = _Segment(records['terms'], records['weights'], self._doc_owners)
+                self._reset_tail()
+            tmp_path = f"{self._idf_path}.tmp.npy"
+            np.save(tmp_path, idf)
+            os.replace(tmp_path, self._idf_path)
+            self._idf = idf
+
+    def vector(self, doc_id, owner):
+        """Stored (indices, values) of an email indexed for `owner`, or None"""
+        owner = self._owner_key(owner)
+        with self._lock:
+            doc = self._doc_index.get(str(doc_id))
+            if doc is None or self._doc_owners[doc] != self._owners.get(owner):
+                return None
+        with open(self._records_path, 'rb') as f:
+            f.seek(doc * self.record_dtype.itemsize)
+            record = np.frombuffer(f.read(self.record_dtype.itemsize), dtype=self.record_dtype)[0]
+        keep = record['terms'] >= 0
+        return record['terms'][keep], record['weights'][keep].astype(np.float32)
+
+    def query(self, indices, values, owner, k=None, exclude=None):
+        """Top-k (email id, cosine score) pairs among the emails indexed for `owner`"""
+        owner = self._owner_key(owner)
+        k = k or Config.SIMILAR_DEFAULT_K
+        indices, values = truncate_vector(indices, values, self.query_terms)
+
+        with self._lock:
+            owner_id = self._owners.get(owner)
+            if owner_id is None:
+                return []
+            segment = self._segment
+            rows = self._tail_rows.get(owner_id)
+            if rows:
+                # Fancy indexing copies, so a merge cannot move these rows underneath us
+                rows = np.asarray(rows)
+                tail_terms, tail_weights = self._tail_terms[rows], self._tail_weights[rows]
+            doc_ids = self._doc_ids
+
+        # Segment arrays are never modified; newest postings are at the end of each group
+        docs, scores = [], []
+        for term, weight in zip(indices.tolist(), values.tolist()):
+            span = segment.span(term, owner_id)
+            if span is None:
+                continue
+            start, end = max(span[0], span[1] - self.max_postings), span[1]
+            docs.append(segment.docs[start:end])
+            scores.append(segment.weights[start:end].astype(np.float32) * np.float32(weight))
+
+        # Unmerged documents are scored against the query's terms directly
+        if rows is not None and len(rows) and len(indices):
+            order = np.argsort(indices)
+            query_terms, query_weights = indices[order], values[order]
+            position = np.minimum(np.searchsorted(query_terms, tail_terms), len(query_terms) - 1)
+            matched = query_terms[position] == tail_terms
+            tail_scores = (tail_weights.astype(np.float32) * query_weights[position] * matched).sum(axis=1)
+            hits = tail_scores > 0
+            docs.append((segment.n_docs + rows[hits]).astype(np.int32))
+            scores.append(tail_scores[hits].astype(np.float32))
+        if not docs:
+            return []
+
+        # Sum the partial dot products per document
+        docs, scores = np.concatenate(docs), np.concatenate(scores)
+        if not len(docs):
+            return []
+        order = np.argsort(docs, kind='stable')
+        docs, scores = docs[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        docs, totals = docs[starts], np.add.reduceat(scores, starts)
+        excluded = self._doc_index.get(str(exclude)) if exclude is not None else None
+        if excluded is not None:
+            totals[docs == excluded] = -1
+
+        n = min(k, len(totals))
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top], kind='stable')]
+        return [(doc_ids[docs[i]], float(totals[i])) for i in top if totals[i] > 0]
+
+    def get_stats(self):
+        """Running counters only, so this never walks the postings"""
+        with self._lock:
+            return {
+                'documents': len(self._doc_ids),
+                'owners': len(self._owners),
+                'postings': self._n_postings,
+                'unmerged_documents': self._tail_size,
+                'memory_bytes': self._segment.nbytes + int(self._tail_terms.nbytes + self._tail_weights.nbytes)
+            }
+
+    def close(self):
+        with self._lock:
+            self._records.close()
+            self._ids.close()
+
+
+def _scale_records(terms, weights, scale):
+    """Stored weights multiplied by a per-term factor, each record re-normalized"""
+    weights = np.where(terms >= 0, weights.astype(np.float32) * scale[np.maximum(terms, 0)], 0).astype(np.float32)
+    norms = np.sqrt((weights ** 2).sum(axis=1, keepdims=True))
+    return np.divide(weights, norms, out=weights, where=norms > 0).astype(np.float16)
+
+
+def _truncate_records(terms, weights, n_terms):
+    """Records cut (or padded) to `n_terms` of their heaviest terms, re-normalized"""
+    width = terms.shape[1]
+    if n_terms >= width:
+        padded_terms = np.full((len(terms), n_terms), -1, dtype=np.int32)
+        padded_weights = np.zeros((len(terms), n_terms), dtype=np.float16)
+        padded_terms[:, :width], padded_weights[:, :width] = terms, weights
+        return padded_terms, padded_weights
+    weights = np.where(terms >= 0, weights.astype(np.float32), 0)
+    top = np.argsort(-weights, axis=1, kind='stable')[:, :n_terms]
+    terms, weights = np.take_along_axis(terms, top, axis=1), np.take_along_axis(weights, top, axis=1)
+    norms = np.sqrt((weights ** 2).sum(axis=1, keepdims=True))
+    return terms, np.divide(weights, norms, out=weights, where=norms > 0).astype(np.float16)
+
+
+def load_similarity_index(vocabulary, idf=None):
+    """Open (or create) the index for the given vectorizer vocabulary, weighted by `idf`"""
+    fingerprint = vocabulary_fingerprint(vocabulary)
+    # Earlier versions started a separate index per refreshed IDF
+    for superseded in glob.glob(os.path.join(Config.SIMILAR_INDEX_DIR, f"{fingerprint}-idf-*")):
+        shutil.rmtree(superseded, ignore_errors=True)
+    index_dir = os.path.join(Config.SIMILAR_INDEX_DIR, fingerprint)
+    return SimilarityIndex(index_dir, meta={'vocabulary': fingerprint}, idf=idf)
@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+from admission import AdmissionController, Lane, LaneFull, LaneTimeout, INTERACTIVE, BULK
+
+
+def make_controller(slots=2, bulk_active=1, queue_size=4, max_wait=5.0):
+    return AdmissionController(slots=slots, lanes=[
+        Lane(INTERACTIVE, 4, queue_size, max_wait, slots),
+        Lane(BULK, 1, queue_size, max_wait, bulk_active)
+    ])
+
+
+def hold_slots(controller, lane, n):
+    """Occupy `n` slots of a lane until the returned event is set"""
+    release = threading.Event()
+    entered = threading.Semaphore(0)
+
+    def hold():
+        with controller.admit(lane, blocking=True):
+            entered.release()
+            release.wait()
+
+    threads = [threading.Thread(target=hold, daemon=True) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return release, threads, entered
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_bulk_cannot_take_the_last_slot():
+    controller = make_controller(slots=2, bulk_active=1)
+    release, threads, entered = hold_slots(controller, BULK, 3)
+    entered.acquire(timeout=2)
+    wait_for(lambda: len(controller.lanes[BULK].waiting) == 2)
+
+    # Bulk holds one slot and queues the rest; interactive still gets in at once
+    start = time.perf_counter()
+    with controller.admit(INTERACTIVE):
+        assert time.perf_counter() - start < 0.1
+        assert controller.active == 2
+
+    release.set()
+    for thread in threads:
+        thread.join(timeout=2)
+    stats = controller.get_stats()
+    assert stats['active'] == 0
+    assert stats['lanes'][BULK]['admitted'] == 3
+    assert stats['lanes'][INTERACTIVE]['latency']['p99_ms'] < 100
+
+
+def test_full_lane_is_rejected_with_retry_hint():
+    controller = make_controller(slots=1, bulk_active=1, queue_size=1)
+    release, threads, entered = hold_slots(controller, BULK, 2)
+    entered.acquire(timeout=2)
+    wait_for(lambda: len(controller.lanes[BULK].waiting) == 1)
+
+    with pytest.raises(LaneFull) as excinfo:
+        with controller.admit(BULK):
+            pass
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after >= 1
+    assert controller.get_stats()['lanes'][BULK]['rejected'] == 1
+
+    release.set()
+    for thread in threads:
+        thread.join(timeout=2)
+
+
+def test_request_waiting_too_long_is_shed():
+    controller = make_controller(slots=1, max_wait=0.05)
+    release, threads, entered = hold_slots(controller, INTERACTIVE, 1)
+    entered.acquire(timeout=2)
+
+    with pytest.raises(LaneTimeout) as excinfo:
+        with controller.admit(INTERACTIVE):
+            pass
+    assert excinfo.value.status_code == 503
+    assert not controller.lanes[INTERACTIVE].waiting
+    assert controller.get_stats()['lanes'][INTERACTIVE]['timed_out'] == 1
+
+    release.set()
+    threads[0].join(timeout=2)
+
+
+def test_backlogged_lanes_are_served_by_weight():
+    controller = make_controller(slots=1, bulk_active=1, queue_size=20)
+    release, threads, entered = hold_slots(controller, BULK, 1)
+    entered.acquire(timeout=2)
+
+    order = []
+    lock = threading.Lock()
+
+    def request(lane):
+        with controller.admit(lane, blocking=True):
+            with lock:
+                order.append(lane)
+
+    waiters = [threading.Thread(target=request, args=(lane,)) for lane in [INTERACTIVE] * 8 + [BULK] * 8]
+    for thread in waiters:
+        thread.start()
+    wait_for(lambda: sum(len(lane.waiting) for lane in controller.lanes.values()) == 16)
+    release.set()
+    for thread in waiters:
+        thread.join(timeout=2)
+
+    # Weights 4:1 while both lanes have work
+    assert order[:10].count(INTERACTIVE) == 8
+    assert order[10:] == [BULK] * 6
+
+
+def test_clients_can_only_lower_their_lane():
+    controller = make_controller()
+    assert controller.lane_for(BULK, INTERACTIVE) == BULK
+    assert controller.lane_for(INTERACTIVE, BULK) == BULK
+    assert controller.lane_for('urgent', INTERACTIVE) == INTERACTIVE
+    assert controller.lane_for(None, BULK) == BULK
+
+
+def test_overloaded_route_returns_retry_after(monkeypatch):
+    import predict
+
+    controller = make_controller(slots=1, queue_size=0)
+    monkeypatch.setattr(predict, 'admission', controller)
+    release, threads, entered = hold_slots(controller, INTERACTIVE, 1)
+    entered.acquire(timeout=2)
+
+    response = predict.app.test_client().post('/predict', json={'subject': 'a', 'body': 'b'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['lane'] == INTERACTIVE
+
+    release.set()
+    threads[0].join(timeout=2)
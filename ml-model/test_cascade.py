@@ -0,0 +1,79 @@
+import os
+import joblib
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+from conftest import make_email
+from cascade import FAST_STAGE, FULL_STAGE, cascade_predict_proba, evaluate_cascade
+from config import Config
+from data_processor import EmailDataProcessor
+from train_model import EmailClassifierTrainer
+
+
+class FixedModel:
+    def __init__(self, probs):
+        self.probs = np.array([probs])
+
+    def predict_proba(self, X):
+        return self.probs
+
+
+def no_dense_input():
+    raise AssertionError("the full model's input was built although the fast stage answered")
+
+
+@pytest.mark.parametrize('fast_probs', [[0.05, 0.95], [0.9, 0.1]])
+def test_confident_rows_exit_at_the_fast_stage(fast_probs):
+    probs, stage = cascade_predict_proba(FixedModel(fast_probs), FixedModel([0.5, 0.5]), None, no_dense_input,
+                                         threshold=0.9)
+    assert stage == FAST_STAGE and list(probs) == fast_probs
+
+
+def test_uncertain_rows_escalate_to_the_full_model():
+    full = FixedModel([0.2, 0.8])
+    probs, stage = cascade_predict_proba(FixedModel([0.15, 0.85]), full, None, lambda: 'dense row', threshold=0.9)
+    assert stage == FULL_STAGE and list(probs) == [0.2, 0.8]
+    # Without a fast model every row goes to the full model
+    assert cascade_predict_proba(None, full, None, lambda: 'dense row')[1] == FULL_STAGE
+
+
+def test_evaluate_cascade():
+    fast = np.array([[0.95, 0.05], [0.3, 0.7], [0.05, 0.95], [0.6, 0.4]])
+    full = np.array([[0.8, 0.2], [0.1, 0.9], [0.7, 0.3], [0.2, 0.8]])
+    metrics = evaluate_cascade(fast, full, [0, 1, 0, 1], threshold=0.9)
+    # Rows 0 and 2 exit early; row 2's fast answer is wrong and disagrees with the full model
+    assert metrics['fast_share'] == 0.5
+    assert metrics['fast_accuracy'] == 0.5
+    assert metrics['cascade_accuracy'] == 0.75
+    assert metrics['full_accuracy'] == 1.0
+    assert metrics['agreement'] == 0.75
+
+
+def test_reported_agreement_holds_on_the_held_out_split(trained_model_path):
+    model_data = joblib.load(os.path.join(trained_model_path, Config.MODEL_NAME))
+    trainer = EmailClassifierTrainer()
+    trainer.vectorizer, trainer.scaler = model_data['vectorizer'], model_data['scaler']
+    df = EmailDataProcessor().create_training_dataset([make_email(i) for i in range(160)])
+    X = trainer.build_feature_matrix(df)
+
+    heads = {
+        'importance': df['is_important'].astype(int).values,
+        'category': model_data['label_encoder'].transform(df['category'])
+    }
+    for head, y in heads.items():
+        report = model_data['cascade_report'][head]
+        assert report['threshold'] == Config.CASCADE_THRESHOLD
+        # The split the trainer evaluated the cascade on
+        _, test_idx = train_test_split(
+            np.arange(len(y)), test_size=Config.TEST_SIZE, random_state=Config.RANDOM_STATE, stratify=y
+        )
+        fast, full = model_data[f'fast_{head}_model'], model_data[f'{head}_model']
+        served = [
+            cascade_predict_proba(fast, full, X[[i]], lambda i=i: X[[i]].toarray())
+            for i in test_idx
+        ]
+        cascade_pred = np.array([probs.argmax() for probs, _ in served])
+        full_pred = full.predict(X[test_idx].toarray())
+        assert np.mean([stage == FAST_STAGE for _, stage in served]) == pytest.approx(report['fast_share'])
+        assert np.mean(cascade_pred == full.classes_.searchsorted(full_pred)) == pytest.approx(report['agreement'])
+        assert np.mean(cascade_pred == y[test_idx]) == pytest.approx(report['cascade_accuracy'])
@@ -0,0 +1,108 @@
+import os
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from conftest import make_email
+from config import Config
+from data_processor import EmailDataProcessor
+from worker_pool import PreprocessingPool
+
+
+@pytest.fixture(scope='module')
+def emails():
+    return [make_email(i) for i in range(240)]
+
+
+@pytest.fixture(scope='module')
+def expected(emails):
+    # Reference: a brand-new processor per email, so nothing can leak
+    return [EmailDataProcessor().extract_features(email) for email in emails]
+
+
+def assert_isolated(results, emails, expected):
+    for i, features in enumerate(results):
+        assert features == expected[i]
+        own = emails[i]['subject'].split()[-1]
+        assert own in features['processed_text']
+        others = set(features['processed_text'].split()) - {own}
+        assert not any(token.startswith('zq') and token.endswith('xv') for token in others)
+
+
+def test_inline_preprocessing_is_thread_safe(emails, expected):
+    pool = PreprocessingPool(max_workers=0)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(pool.extract_features, emails * 3))
+    assert_isolated(results, emails * 3, expected * 3)
+
+
+def test_process_pool_batch_matches_reference(emails, expected):
+    pool = PreprocessingPool(max_workers=2)
+    try:
+        results = pool.extract_batch(emails)
+        assert all(error is None for _, error in results)
+        assert_isolated([features for features, _ in results], emails, expected)
+
+        # Concurrent single-email submissions from many threads
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(pool.extract_features, emails))
+        assert_isolated(results, emails, expected)
+    finally:
+        pool.shutdown()
+
+
+def test_process_pool_reports_errors_per_email():
+    pool = PreprocessingPool(max_workers=1)
+    try:
+        results = pool.extract_batch([make_email(0), 'not an email', make_email(1)])
+        assert results[0][1] is None and results[2][1] is None
+        assert results[1][0] is None and results[1][1]
+    finally:
+        pool.shutdown()
+
+
+def test_concurrent_predictions_do_not_leak_state(trained_model_path, emails, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', False)
+    predictor = EmailPredictor()
+    predictor.preprocessing.shutdown()
+    predictor.preprocessing = PreprocessingPool(max_workers=2)
+    predictor.load_models()
+
+    try:
+        sequential = [predictor.predict_email(email) for email in emails]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            concurrent = list(executor.map(predictor.predict_email, emails))
+        assert concurrent == sequential
+
+        batch = predictor.predict_batch(emails)
+        assert [prediction for prediction, _ in batch] == sequential
+    finally:
+        predictor.preprocessing.shutdown()
+
+
+def test_pool_recovers_from_a_dead_worker():
+    pool = PreprocessingPool(max_workers=1)
+    try:
+        expected = pool.extract_features(make_email(0))
+        for process in list(pool._executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join(timeout=5)
+
+        assert pool.extract_features(make_email(0)) == expected
+        assert pool.restarts == 1
+        results = pool.extract_batch([make_email(i) for i in range(4)])
+        assert all(error is None for _, error in results)
+    finally:
+        pool.shutdown()
+
+
+def test_launcher_has_no_import_side_effects():
+    # Spawned workers re-import the main module; serve.py must not load the app
+    script = "import sys, serve; assert 'predict' not in sys.modules and 'flask' not in sys.modules"
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import make_email
+from data_processor import (
+    TRAINING_SCHEMA, EmailDataProcessor, training_frame_from_rows,
+    save_training_dataset, load_training_dataset
+)
+from pipeline_cache import StageCache
+from train_model import EmailClassifierTrainer
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return EmailDataProcessor().create_training_dataset([make_email(i) for i in range(40)])
+
+
+def test_dataset_uses_the_compact_schema(dataset):
+    assert dict(dataset.dtypes) == {name: pd.Series(dtype=dtype).dtype for name, dtype in TRAINING_SCHEMA.items()}
+    assert dataset['category'].notna().all()
+    assert dataset['text'].str.len().gt(0).all()
+
+
+def test_chunked_build_matches_a_single_chunk(dataset):
+    rows = dataset.astype(object).to_dict('records')
+    chunked = training_frame_from_rows(rows, chunk_rows=7)
+    pd.testing.assert_frame_equal(chunked, training_frame_from_rows(rows, chunk_rows=len(rows)))
+    pd.testing.assert_frame_equal(chunked, dataset)
+
+
+def test_unknown_category_is_rejected(dataset):
+    rows = dataset.astype(object).to_dict('records')
+    rows[3]['category'] = 'newsletters'
+    with pytest.raises(ValueError, match='newsletters'):
+        training_frame_from_rows(rows)
+
+
+def test_parquet_round_trip_keeps_types(dataset, tmp_path):
+    path = str(tmp_path / 'dataset.parquet')
+    save_training_dataset(dataset, path)
+    pd.testing.assert_frame_equal(load_training_dataset(path), dataset)
+
+
+def test_stage_cache_stores_dataset_as_parquet(dataset, tmp_path):
+    cache = StageCache(cache_dir=str(tmp_path), enabled=True)
+    key = cache.key('dataset', 'records')
+    formats = {'dump': save_training_dataset, 'load': load_training_dataset, 'suffix': '.parquet'}
+
+    cache.run('dataset', key, lambda: dataset, **formats)
+    cached = cache.run('dataset', key, lambda: pytest.fail('recomputed'), **formats)
+    assert cache.status['dataset'] == 'cached'
+    assert cache.path('dataset', key, '.parquet') in [str(p) for p in tmp_path.iterdir()]
+    pd.testing.assert_frame_equal(cached, dataset)
+
+
+def test_prepare_data_matches_the_numeric_columns(dataset):
+    text, numerical = EmailClassifierTrainer().prepare_data(dataset)
+    assert numerical.dtype == np.float64
+    assert numerical[:, 0].tolist() == dataset['subject_length'].tolist()
+    assert numerical[:, 6].tolist() == dataset['has_deadline'].astype(int).tolist()
+    assert list(text) == list(dataset['text'])
@@ -0,0 +1,57 @@
+from datetime import datetime
+import pytest
+from deadlines import DeadlineExtractor, next_deadline, parse_reference_date
+
+# A Wednesday
+REFERENCE = datetime(2024, 3, 6, 9, 30)
+
+
+@pytest.fixture
+def extractor():
+    return DeadlineExtractor(date_order='MDY', cue_window=40, max_dates=5)
+
+
+def dates(extractor, text):
+    return {entry['date']: entry['isDeadline'] for entry in extractor.extract(text, REFERENCE)}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Applications due March 15th, 2024 at 11:59 PM", '2024-03-15T23:59:00'),
+    ("Deadline: 2024-04-01", '2024-04-01'),
+    ("Submit by 04/02/2024", '2024-04-02'),
+    ("Register before 12 April", '2024-04-12'),
+    ("Apply by the 3rd of May", '2024-05-03'),
+    ("RSVP by tomorrow noon", '2024-03-07T12:00:00'),
+    ("Forms are due Friday 5pm", '2024-03-08T17:00:00'),
+    ("Closes next Wednesday", '2024-03-13'),
+    ("Applications close in 2 weeks", '2024-03-20'),
+    ("Submit within three days", '2024-03-09'),
+    ("Due by end of the month", '2024-03-31'),
+    ("Due 3/20", '2024-03-20'),
+])
+def test_extracts_deadlines(extractor, text, expected):
+    assert dates(extractor, text) == {expected: True}
+
+
+def test_dates_without_year_resolve_to_nearest_occurrence(extractor):
+    # Early March: a December date refers to last year, an April date to this year
+    assert dates(extractor, "The fair was on Dec 5. Apply by April 2") == {'2023-12-05': False, '2024-04-02': True}
+
+
+def test_ignores_non_dates(extractor):
+    assert dates(extractor, "Support is open 24/7 and you may 5 times retry; 3/4 of seats left") == {}
+
+
+def test_cue_words_do_not_cross_sentences(extractor):
+    assert dates(extractor, "The deadline passed. The party is on June 1, 2024") == {'2024-06-01': False}
+
+
+def test_next_deadline_skips_past_and_non_deadline_dates(extractor):
+    found = extractor.extract("Due March 1, 2024. Event on March 9, 2024. Submit by March 20, 2024", REFERENCE)
+    assert next_deadline(found, REFERENCE) == '2024-03-20'
+    assert [entry['date'] for entry in found][:2] == ['2024-03-01', '2024-03-20']
+
+
+def test_parse_reference_date():
+    assert parse_reference_date('2024-03-06T09:30:00.000Z') == datetime(2024, 3, 6, 9, 30)
+    assert parse_reference_date('not a date').date() == datetime.now().date()
@@ -0,0 +1,112 @@
+import pytest
+from conftest import make_email
+from config import Config
+from dedup import NearDuplicateIndex
+
+WORDS = ("apply now for the summer software engineering internship program at our company "
+         "the application deadline is friday and interviews start the following week").split()
+TEXT = ' '.join(WORDS)
+
+
+def make_index(**kwargs):
+    return NearDuplicateIndex(**{'threshold': 0.8, 'num_perm': 64, 'bands': 16, 'capacity': 100, **kwargs})
+
+
+def remember(index, text, prediction):
+    _, signature = index.lookup(text)
+    index.add(signature, prediction)
+
+
+def test_near_duplicate_reuses_prediction():
+    index = make_index()
+    remember(index, TEXT, {'primaryCategory': 'Internship'})
+
+    # One word changed out of 24 keeps the shingle Jaccard well above the threshold
+    edited = ' '.join(WORDS[:-1] + ['month'])
+    prediction, _ = index.lookup(edited)
+    assert prediction == {'primaryCategory': 'Internship'}
+    assert index.get_stats()['hits'] == 1
+
+
+def test_dissimilar_text_misses():
+    index = make_index()
+    remember(index, TEXT, {'primaryCategory': 'Internship'})
+
+    # Half of the words replaced puts the similarity far below 0.8
+    half = ' '.join(WORDS[:12] + ['newsletter', 'updates', 'blog', 'stories', 'events', 'weekly',
+                                 'digest', 'team', 'news', 'product', 'launch', 'roundup'])
+    assert index.lookup(half)[0] is None
+    assert index.lookup('weekly newsletter with product updates')[0] is None
+    assert index.lookup('')[0] is None
+    assert index.get_stats()['hits'] == 0
+
+
+def test_capacity_evicts_oldest_entries():
+    index = make_index(capacity=3)
+    texts = [f"{TEXT} {topic} {topic}" for topic in ('alpha', 'bravo', 'charlie', 'delta')]
+    for i, text in enumerate(texts[:3]):
+        remember(index, text, {'index': i})
+    # A hit refreshes an entry, so the next add evicts the least recently used one
+    assert index.lookup(texts[0])[0] == {'index': 0}
+    remember(index, texts[3], {'index': 3})
+
+    assert index.get_stats()['indexed_emails'] == 3
+    stored = {entry[2]['index'] for entry in index._entries.values()}
+    assert stored == {0, 2, 3}
+    # Buckets only reference live entries
+    live = set(index._entries)
+    assert all(bucket <= live for bucket in index._buckets.values())
+
+
+def test_explained_and_personalized_requests_bypass_the_cache(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'DOMAIN_SHORTCUT_ENABLED', False)
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', True)
+    predictor = EmailPredictor()
+    predictor.load_models()
+    dedup = predictor.dedup_index
+
+    email = {key: value for key, value in make_email(0).items() if key != 'user_id'}
+    predictor.predict_email(email, explain=True)
+    assert dedup.get_stats()['lookups'] == 0 and dedup.get_stats()['indexed_emails'] == 0
+
+    plain = predictor.predict_email(email)
+    cached = predictor.predict_email(email)
+    assert dedup.get_stats()['hits'] == 1
+    assert cached['primaryCategory'] == plain['primaryCategory']
+
+    # An explanation is computed by the models even though a cached answer exists
+    explained = predictor.predict_email(email, explain=True)
+    assert 'explanation' in explained
+    assert dedup.get_stats()['lookups'] == 2
+
+    # Users with a personal head get their own answer, never a shared one
+    predictor.predict_email({**email, 'user_id': 'user0'})
+    assert predictor.user_heads.has_head('user0')
+    assert dedup.get_stats()['lookups'] == 2
+
+
+def test_dedup_hits_do_not_count_as_domain_evidence(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', True)
+    predictor = EmailPredictor()
+    predictor.load_models()
+    domains = predictor.domain_index
+    domains.min_emails = 10 ** 6  # never shortcut
+
+    email = {**make_email(0), 'user_id': None}
+    slot = domains._slot(predictor.preprocessing.extract_features(email)['sender_domain'])
+    before = domains.counts[slot, -1]
+    for _ in range(3):
+        predictor.predict_email(email)
+    assert predictor.dedup_index.get_stats()['hits'] == 2
+    # Only the first, model-scored resend is counted
+    assert domains.counts[slot, -1] == before + 1
@@ -0,0 +1,106 @@
+import os
+import shutil
+import joblib
+import numpy as np
+import pytest
+from conftest import make_email
+from config import Config
+from domain_index import DomainIndex, load_domain_index
+
+CATEGORIES = ['events', 'jobs', 'other']
+
+
+@pytest.fixture
+def index():
+    index = DomainIndex(CATEGORIES, capacity=100, min_emails=20, min_share=0.9, decay=0.9)
+    domains = ['jobs.example.com'] * 40 + ['mixed.example.com'] * 40 + ['rare.example.com'] * 5
+    categories = [1] * 40 + [0, 2] * 20 + [0] * 5
+    important = [True] * 40 + [False] * 40 + [False] * 5
+    return index.fit(domains, categories, important)
+
+
+def test_confident_domain_is_answered_from_index(index):
+    prediction = index.lookup('jobs.example.com')
+    assert prediction['primaryCategory'] == 'jobs'
+    assert prediction['isImportant'] is True
+    assert prediction['categoryConfidence'] == pytest.approx(1.0)
+
+
+def test_mixed_rare_and_unknown_domains_fall_back_to_models(index):
+    assert index.lookup('mixed.example.com') is None
+    assert index.lookup('rare.example.com') is None
+    assert index.lookup('unknown.example.com') is None
+    assert index.lookup('') is None
+    stats = index.get_stats()
+    assert stats['lookups'] == 4 and stats['hits'] == 0
+
+
+def test_recent_change_disables_shortcut_until_stable(index):
+    for _ in range(5):
+        index.update('jobs.example.com', 0, False)
+    # Lifetime counts still favour jobs, but the recent window does not
+    assert index.lookup('jobs.example.com') is None
+    for _ in range(60):
+        index.update('jobs.example.com', 0, False)
+    assert index.lookup('jobs.example.com') is None
+    for _ in range(400):
+        index.update('jobs.example.com', 0, False)
+    assert index.lookup('jobs.example.com')['primaryCategory'] == 'events'
+
+
+def test_capacity_bounds_tracked_domains():
+    index = DomainIndex(CATEGORIES, capacity=2, min_emails=1, min_share=0.9, decay=0.9)
+    for domain in ['a.com', 'b.com', 'c.com']:
+        index.update(domain, 1, True)
+    assert index.get_stats()['domains'] == 2
+    assert index.lookup('c.com') is None
+
+
+def test_audits_track_shortcut_accuracy(index):
+    shortcut = index.lookup('jobs.example.com')
+    index.record_audit(shortcut, dict(shortcut))
+    index.record_audit(shortcut, dict(shortcut, primaryCategory='events'))
+    stats = index.get_stats()
+    assert stats['audits'] == 2 and stats['audit_accuracy'] == 0.5
+    assert stats['hit_rate'] == 1.0
+
+
+
+def test_weighted_update_counts_as_that_many_emails(index, tmp_path):
+    index.save(str(tmp_path / 'index.joblib'))
+    repeated = joblib.load(tmp_path / 'index.joblib')
+    for _ in range(20):
+        repeated.update('jobs.example.com', 0, False)
+    index.update('jobs.example.com', 0, False, weight=20)
+
+    slot = index._slots['jobs.example.com']
+    np.testing.assert_allclose(index.counts[slot], repeated.counts[slot], rtol=1e-5)
+    np.testing.assert_allclose(index.recent[slot], repeated.recent[slot], rtol=1e-4)
+
+
+def test_served_updates_survive_a_restart(trained_model_path, monkeypatch, tmp_path):
+    import predict
+    from predict import EmailPredictor
+
+    model_path = str(tmp_path / 'models') + '/'
+    shutil.copytree(trained_model_path, model_path)
+    monkeypatch.setattr(Config, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path / 'similar'))
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', False)
+    monkeypatch.setattr(Config, 'DOMAIN_INDEX_SAVE_EVERY', 4)
+    predictor = EmailPredictor()
+    predictor.load_models()
+    trained = load_domain_index().counts[:, -1].sum()
+
+    # Every fourth model-scored email writes the index back next to the models
+    for i in range(6):
+        predictor.predict_email({**make_email(i), 'user_id': None})
+    assert load_domain_index().counts[:, -1].sum() == trained + 4
+    assert predictor.domain_index.unsaved == 2
+
+    # The rest are written at shutdown
+    monkeypatch.setattr(predict, 'predictor', predictor)
+    predict.save_domain_index()
+    assert load_domain_index().counts[:, -1].sum() == trained + 6
+    assert predictor.domain_index.unsaved == 0
@@ -0,0 +1,170 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from conftest import make_email
+from config import Config
+from drift import VocabularyMonitor, document_frequencies
+
+TRAINING = [
+    "summer internship program apply now",
+    "software engineering internship deadline friday",
+    "scholarship application open students",
+    "weekly newsletter product updates",
+    "hackathon registration open prizes",
+    "internship interview schedule confirmed"
+] * 3
+SERVED = [
+    "devpost hackathon registration closes friday",
+    "devpost hackathon prizes announced",
+    "internship application deadline extended",
+    "devpost weekly newsletter"
+]
+
+
+@pytest.fixture
+def vectorizer():
+    return TfidfVectorizer(stop_words='english', ngram_range=(1, 2)).fit(TRAINING)
+
+
+def make_monitor(vectorizer, **kwargs):
+    return VocabularyMonitor(vectorizer.vocabulary_, vectorizer.idf_, len(TRAINING),
+                             vectorizer.build_analyzer(), sample_rate=1.0, **kwargs)
+
+
+def test_training_document_frequencies_are_recovered(vectorizer):
+    counts = (vectorizer.transform(TRAINING) > 0).sum(axis=0).A1
+    assert document_frequencies(vectorizer.idf_, len(TRAINING)) == pytest.approx(counts)
+
+
+def test_refreshed_idf_matches_refitting_on_all_documents(vectorizer):
+    monitor = make_monitor(vectorizer)
+    for text in SERVED:
+        monitor.observe(text)
+
+    refit = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), vocabulary=vectorizer.vocabulary_)
+    refit.fit(TRAINING + SERVED)
+    assert monitor.refreshed_idf() == pytest.approx(refit.idf_)
+
+    # Adopting folds the observed documents into the baseline
+    assert monitor.refresh() == pytest.approx(refit.idf_)
+    assert (monitor.observed, monitor.n_documents, monitor.refreshes) == (0, len(TRAINING) + len(SERVED), 1)
+    assert monitor.refreshed_idf() == pytest.approx(refit.idf_)
+
+
+def test_oov_rate_and_emerging_terms(vectorizer):
+    monitor = make_monitor(vectorizer, emerging_terms=2)
+    for text in SERVED:
+        monitor.observe(text)
+
+    stats = monitor.get_stats()
+    assert stats['observed_documents'] == len(SERVED)
+    assert stats['emerging_terms'][0] == {'term': 'devpost', 'documents': 3}
+    assert 0 < stats['oov_rate'] < 1
+    assert stats['oov_document_rate'] == 1.0
+    assert stats['idf_shift'] > 0
+
+
+def test_models_without_corpus_size_only_report_drift(vectorizer):
+    monitor = VocabularyMonitor(vectorizer.vocabulary_, vectorizer.idf_, None, vectorizer.build_analyzer(),
+                                sample_rate=1.0)
+    monitor.observe(SERVED[0])
+    assert monitor.get_stats()['can_refresh'] is False
+    with pytest.raises(ValueError):
+        monitor.refresh()
+
+
+@pytest.mark.parametrize('kernel', [True, False])
+def test_predictor_adopts_and_restores_refreshed_idf(trained_model_path, monkeypatch, tmp_path, kernel):
+    from predict import EmailPredictor
+
+    # Adopted weights are saved next to the models, so work on a copy of the shared ones
+    model_path = str(tmp_path / 'models') + '/'
+    shutil.copytree(trained_model_path, model_path)
+    monkeypatch.setattr(Config, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path / 'similar'))
+    monkeypatch.setattr(Config, 'INFERENCE_KERNEL_ENABLED', kernel)
+    monkeypatch.setattr(Config, 'VOCAB_DRIFT_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', False)
+
+    def load():
+        predictor = EmailPredictor()
+        predictor.load_models()
+        return predictor
+
+    predictor = load()
+    monitor = predictor.vocabulary_monitor
+    assert monitor.n_documents == 160
+    with pytest.raises(ValueError):
+        predictor.refresh_idf(min_documents=1)
+
+    email = make_email(7)
+    before = predictor.vectorize_text(predictor.preprocessing.extract_features(email)['processed_text'])
+    predictor.predict_batch([make_email(i) for i in range(1000, 1040)])
+    result = predictor.refresh_idf(min_documents=40)
+    assert result['documents'] == 200 and result['idf_shift'] > 0
+
+    # The vectorizer now applies the new weights and the models still answer
+    after = predictor.vectorize_text(predictor.preprocessing.extract_features(email)['processed_text'])
+    assert not np.allclose(np.sort(before[1]), np.sort(after[1]))
+    assert predictor.predict_email(email)['primaryCategory'] in predictor.categories
+
+    # A restarted server keeps serving the adopted weights
+    restarted = load()
+    assert restarted.vocabulary_monitor.n_documents == 200
+    assert restarted.vectorize_text(predictor.preprocessing.extract_features(email)['processed_text'])[1] == \
+        pytest.approx(after[1])
+
+
+def test_idf_refresh_resets_and_reweights_caches_of_the_old_idf(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    model_path = str(tmp_path / 'models') + '/'
+    shutil.copytree(trained_model_path, model_path)
+    monkeypatch.setattr(Config, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path / 'similar'))
+    monkeypatch.setattr(Config, 'VOCAB_DRIFT_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', True)
+
+    def load():
+        predictor = EmailPredictor()
+        predictor.load_models()
+        return predictor
+
+    predictor = load()
+    anonymous = {**make_email(5), 'user_id': None}
+    indexed = {**make_email(7), 'id': 'gmail-7'}
+    predictor.predict_email(anonymous)
+    predictor.predict_email(indexed)
+    assert predictor.dedup_index.get_stats()['indexed_emails'] == 1
+    assert predictor.similar_index.vector('gmail-7', indexed['user_id']) is not None
+
+    predictor.predict_batch([make_email(i) for i in range(1000, 1040)])
+    index = predictor.similar_index
+    predictor.refresh_idf(min_documents=40)
+
+    # Cached predictions weighted by the old IDF are not served any more
+    assert predictor.dedup_index.get_stats()['indexed_emails'] == 0
+    hits = predictor.dedup_index.get_stats()['hits']
+    predictor.predict_email(anonymous)
+    assert predictor.dedup_index.get_stats()['hits'] == hits
+
+    # Indexed emails stay searchable, re-weighted as the new IDF weighs their terms
+    assert predictor.similar_index is index
+    indices, values = index.vector('gmail-7', indexed['user_id'])
+    fresh = predictor.vectorize_text(predictor.preprocessing.extract_features(indexed)['processed_text'])
+    fresh = dict(zip(*[part.tolist() for part in fresh]))
+    expected = np.array([fresh[term] for term in indices.tolist()])
+    assert values == pytest.approx(expected / np.linalg.norm(expected), abs=2e-3)
+    assert index.query(indices, values, owner=indexed['user_id'], k=1)[0][0] == 'gmail-7'
+
+    # A restart keeps the re-weighted vectors and drops indexes of the old per-IDF layout
+    superseded = tmp_path / 'similar' / f"{os.path.basename(index.index_dir)}-idf-0123456789abcdef"
+    superseded.mkdir()
+    index.close()
+    restarted = load()
+    assert not superseded.exists()
+    assert restarted.similar_index.vector('gmail-7', indexed['user_id'])[1] == pytest.approx(values)
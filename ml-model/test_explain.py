@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from conftest import make_email
+from config import Config
+from explain import LinearExplainer, ForestExplainer, build_explainer, top_contributions
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(120, 12))
+    X[X < 0.5] = 0  # mostly sparse rows, like TF-IDF
+    y_multi = (X[:, 0] > 0) + 2 * (X[:, 1] > 0)
+    y_binary = (X[:, 2] + X[:, 3] > 0.5).astype(int)
+    return X, y_binary, y_multi
+
+
+def explain_row(explainer, x, class_index):
+    indices = np.flatnonzero(x)
+    return explainer.explain(indices, x[indices], lambda: x[None, :], class_index)
+
+
+@pytest.mark.parametrize('multi_class, target', [
+    ('auto', 'binary'), ('multinomial', 'binary'), ('auto', 'multi'), ('ovr', 'multi')
+])
+def test_linear_contributions_add_up_to_the_score(dataset, multi_class, target):
+    X, y_binary, y_multi = dataset
+    y = y_binary if target == 'binary' else y_multi
+    model = LogisticRegression(multi_class=multi_class, max_iter=1000).fit(X, y)
+    explainer = build_explainer(model)
+    assert isinstance(explainer, LinearExplainer)
+
+    for x in X[:10]:
+        scores = x @ explainer.model.coef.T + explainer.model.intercept
+        for class_index in range(len(model.classes_)):
+            _, contributions, bias = explain_row(explainer, x, class_index)
+            if target == 'binary':
+                # Log-odds of the explained class against the other one
+                proba = model.predict_proba(x[None, :])[0]
+                expected = np.log(proba[class_index] / proba[1 - class_index])
+            else:
+                expected = scores[class_index]
+            assert contributions.sum() + bias == pytest.approx(expected, abs=1e-6)
+
+
+def test_forest_contributions_add_up_to_the_probability(dataset):
+    X, _, y_multi = dataset
+    model = RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(X, y_multi)
+    explainer = build_explainer(model)
+    assert isinstance(explainer, ForestExplainer)
+
+    probs = model.predict_proba(X[:10].astype(np.float32))
+    for x, expected in zip(X[:10], probs):
+        for class_index, probability in enumerate(expected):
+            features, contributions, bias = explain_row(explainer, x, class_index)
+            assert contributions.sum() + bias == pytest.approx(probability, abs=1e-6)
+            assert len(np.unique(features)) == len(features)
+
+
+def test_top_contributions_are_supporting_features_in_order():
+    names = ['apply', 'internship', 'newsletter', 'word_count']
+    result = top_contributions(names, 3, np.array([0, 1, 2, 3]), np.array([0.2, 0.9, -0.5, 0.4]), top_k=2)
+    assert [(item['feature'], item['type']) for item in result] == [('internship', 'term'), ('word_count', 'feature')]
+    assert top_contributions(names, 3, np.array([2]), np.array([-1.0])) == []
+
+
+def test_predictions_explain_the_answering_model(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    predictor = EmailPredictor()
+    predictor.load_models()
+
+    email = make_email(3)
+    plain = predictor.predict_email(email)
+    assert 'explanation' not in plain
+
+    # Duplicates are still scored by the models when an explanation is asked for
+    for _ in range(2):
+        prediction = predictor.predict_email(email, explain=True)
+        assert prediction['shortcut'] is False
+        for head in ('importance', 'category'):
+            explanation = prediction['explanation'][head]
+            assert explanation['model'] in ('fast', 'full', 'personal')
+            assert len(explanation['contributions']) <= Config.EXPLAIN_TOP_K
+            contributions = [item['contribution'] for item in explanation['contributions']]
+            assert contributions == sorted(contributions, reverse=True)
+        assert prediction['primaryCategory'] == plain['primaryCategory']
+
+
+def test_explain_is_ignored_when_disabled(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'EXPLAIN_ENABLED', False)
+    predictor = EmailPredictor()
+    predictor.load_models()
+
+    # Personalized and global predictions both answer without an explanation
+    for email in (make_email(3), {**make_email(4), 'user_id': None}):
+        prediction = predictor.predict_email(email, explain=True)
+        assert 'explanation' not in prediction
+        assert prediction == predictor.predict_email(email)
@@ -0,0 +1,130 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import SVC
+from conftest import make_email
+from config import Config
+from inference_kernel import CompiledVectorizer, UnsupportedModel, compile_model
+
+TOLERANCE = 1e-6
+
+DOCUMENTS = [
+    "summer internship apply now software engineering internship",
+    "hackathon registration open coding competition prizes",
+    "scholarship grant funding financial aid tuition deadline",
+    "weekly newsletter top stories updates blog",
+    "apply for the data science internship before the deadline",
+    "the hackathon team registration closes friday apply today",
+    "newsletter updates from the career center and events",
+    "merit scholarship applications and financial aid office hours",
+] * 4
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    rng = np.random.RandomState(0)
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), min_df=2)
+    text = vectorizer.fit_transform(DOCUMENTS).toarray()
+    X = np.hstack([text, rng.normal(size=(len(DOCUMENTS), 4))])
+    y_binary = np.array([i % 2 for i in range(len(DOCUMENTS))])
+    y_multi = np.array([i % 4 for i in range(len(DOCUMENTS))])
+    return vectorizer, X, y_binary, y_multi
+
+
+def test_vectorizer_matches_sklearn(dataset):
+    vectorizer = dataset[0]
+    compiled = CompiledVectorizer.from_sklearn(vectorizer)
+    queries = DOCUMENTS[:8] + ["Apply NOW: internship, internship & hackathon!", "", "unknown words only"]
+    expected = vectorizer.transform(queries).toarray()
+    for row, text in zip(expected, queries):
+        indices, values = compiled.transform(text)
+        actual = np.zeros_like(row)
+        actual[indices] = values
+        np.testing.assert_allclose(actual, row, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('model, target', [
+    (LogisticRegression(max_iter=1000), 'binary'),
+    (LogisticRegression(max_iter=1000), 'multi'),
+    (LogisticRegression(solver='liblinear'), 'multi'),
+    (RandomForestClassifier(n_estimators=25, max_depth=6, random_state=0), 'binary'),
+    (RandomForestClassifier(n_estimators=25, random_state=0), 'multi'),
+    (SVC(probability=True, random_state=0), 'binary'),
+    (SVC(kernel='linear', probability=True, random_state=0), 'binary'),
+])
+def test_compiled_models_match_sklearn(dataset, model, target):
+    _, X, y_binary, y_multi = dataset
+    y = y_binary if target == 'binary' else y_multi
+    model.fit(X, y)
+    compiled = compile_model(model)
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), atol=TOLERANCE)
+    np.testing.assert_allclose(compiled.predict_proba(X[:1]), model.predict_proba(X[:1]), atol=TOLERANCE)
+
+
+def test_unsupported_models_are_rejected(dataset):
+    _, X, _, y_multi = dataset
+    with pytest.raises(UnsupportedModel):
+        compile_model(SVC(probability=True).fit(X, y_multi))
+
+
+def test_kernel_predictions_match_sklearn_pipeline(trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', False)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+
+    predictions = {}
+    for enabled in (False, True):
+        monkeypatch.setattr(Config, 'INFERENCE_KERNEL_ENABLED', enabled)
+        predictor = EmailPredictor()
+        predictor.load_models()
+        assert (predictor.kernel is not None) == enabled
+        predictions[enabled] = [predictor.predict_email(make_email(i)) for i in range(40)]
+
+    for sklearn_pred, kernel_pred in zip(predictions[False], predictions[True]):
+        assert kernel_pred['primaryCategory'] == sklearn_pred['primaryCategory']
+        assert kernel_pred['isImportant'] == sklearn_pred['isImportant']
+        assert kernel_pred['confidence'] == pytest.approx(sklearn_pred['confidence'], abs=TOLERANCE)
+        assert kernel_pred['categoryConfidence'] == pytest.approx(sklearn_pred['categoryConfidence'], abs=TOLERANCE)
+
+
+def test_kernel_scores_without_sklearn(trained_model_path):
+    script = f"""
+import sys
+sys.modules['sklearn'] = None  # any scikit-learn import now fails
+from config import Config
+Config.MODEL_PATH = {trained_model_path!r}
+from inference_kernel import load_kernel
+kernel = load_kernel()
+X = kernel.featurize('apply internship deadline', [10, 200, 30, 1, 0, 0.1, 1, 0, 1, 1])
+for name, model in kernel.models.items():
+    if model is not None:
+        assert abs(model.predict_proba(X).sum() - 1) < 1e-9, name
+"""
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_kernel_serving_does_not_import_sklearn(trained_model_path, tmp_path):
+    script = f"""
+import sys
+from config import Config
+Config.MODEL_PATH = {trained_model_path!r}
+Config.SIMILAR_INDEX_DIR = {str(tmp_path)!r}
+Config.PREPROCESS_WORKERS = 0
+Config.INFERENCE_KERNEL_ENABLED = True
+import predict
+from conftest import make_email
+predict.predictor.load_models()
+assert predict.predictor.kernel is not None
+predict.predictor.predict_email({{**make_email(5), 'id': 'gmail-5'}}, explain=True)
+assert 'sklearn' not in sys.modules, sorted(name for name in sys.modules if name.startswith('sklearn'))[:5]
+"""
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,88 @@
+import threading
+import time
+import pytest
+from conftest import make_email
+from jobs import JobQueue, JobQueueFull
+
+
+def blocking_queue(**kwargs):
+    """Queue whose handler waits for `release`, so jobs pile up on demand"""
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def handler(payload):
+        started.release()
+        release.wait(timeout=10)
+        return {'echo': payload}
+
+    return JobQueue(handler, **{'workers': 1, **kwargs}), release, started
+
+
+def test_full_queue_rejects_new_jobs():
+    jobs, release, started = blocking_queue(max_pending=1)
+    running = jobs.submit(1)
+    assert started.acquire(timeout=5)
+    queued = jobs.submit(2)
+    with pytest.raises(JobQueueFull):
+        jobs.submit(3)
+
+    release.set()
+    assert jobs.get(running, wait=5)['status'] == 'completed'
+    assert jobs.get(queued, wait=5)['result'] == {'echo': 2}
+    jobs.submit(4)
+
+
+def test_long_poll_returns_when_the_job_finishes():
+    jobs, release, started = blocking_queue()
+    job_id = jobs.submit('payload')
+    assert started.acquire(timeout=5)
+    assert jobs.get(job_id)['status'] == 'running'
+
+    threading.Timer(0.2, release.set).start()
+    start = time.monotonic()
+    job = jobs.get(job_id, wait=5)
+    assert job['status'] == 'completed' and job['result'] == {'echo': 'payload'}
+    assert time.monotonic() - start < 2
+    assert job['finished_at'] is not None
+
+
+def test_finished_jobs_expire_after_their_ttl():
+    jobs, release, _ = blocking_queue(result_ttl=0.2)
+    release.set()
+    job_id = jobs.submit('payload')
+    assert jobs.get(job_id, wait=5)['status'] == 'completed'
+
+    time.sleep(0.3)
+    assert jobs.get(job_id) is None
+    assert jobs.get_stats()['completed'] == 0
+
+
+def test_job_routes(api_client, monkeypatch):
+    import predict
+
+    response = api_client.post('/jobs', json={'emails': [make_email(i) for i in range(3)]})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    job = api_client.get(f'/jobs/{job_id}?wait=10').get_json()
+    assert job['status'] == 'completed'
+    assert job['result']['total_processed'] == 3
+
+    for wait in ('abc', '-1', 'nan'):
+        response = api_client.get(f'/jobs/{job_id}?wait={wait}')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid wait'
+    assert api_client.get('/jobs/unknown').status_code == 404
+
+    # A full queue sheds new jobs with 429 and a retry hint
+    jobs, release, started = blocking_queue(max_pending=1)
+    monkeypatch.setattr(predict, 'job_queue', jobs)
+    try:
+        jobs.submit('running')
+        assert started.acquire(timeout=5)
+        jobs.submit('queued')
+        response = api_client.post('/jobs', json={'emails': [make_email(0)]})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+    finally:
+        release.set()
@@ -0,0 +1,88 @@
+import json
+import os
+import pytest
+from conftest import make_email
+from config import Config
+from pipeline_cache import StageCache
+from train_model import EmailClassifierTrainer
+
+STAGES = ['dataset', 'features', 'matrices', 'importance_model', 'category_model', 'cascade_models', 'user_heads']
+EMAILS = [make_email(i) for i in range(120)]
+
+
+@pytest.fixture
+def train(tmp_path, monkeypatch):
+    """Train into one model and cache directory; returns each stage's cache status"""
+    monkeypatch.setattr(Config, 'MODEL_PATH', str(tmp_path / 'models') + '/')
+    monkeypatch.setattr(Config, 'PIPELINE_CACHE_DIR', str(tmp_path / 'cache'))
+    os.makedirs(Config.MODEL_PATH)
+
+    def run(trainer=None):
+        (trainer or EmailClassifierTrainer()).train_full_pipeline(EMAILS)
+        with open(os.path.join(Config.MODEL_PATH, Config.TRAINING_REPORT_NAME)) as f:
+            stages = json.load(f)['stages']
+        return [stages[stage]['status'] for stage in STAGES]
+
+    return run
+
+
+def test_changed_inputs_recompute_only_dependent_stages(train, monkeypatch):
+    assert train() == ['computed'] * 7
+    assert train() == ['cached'] * 7
+
+    # The cascade depends on the category model but nothing depends on it
+    monkeypatch.setattr(Config, 'CASCADE_C', Config.CASCADE_C * 2)
+    assert train() == ['cached'] * 5 + ['computed', 'cached']
+
+    # A new vocabulary size invalidates the features and every stage built on them
+    monkeypatch.setattr(Config, 'MAX_FEATURES', Config.MAX_FEATURES // 2)
+    assert train() == ['cached'] + ['computed'] * 6
+
+
+def test_interrupted_run_resumes_from_cached_stages(train):
+    class Interrupted(Exception):
+        pass
+
+    class CrashingTrainer(EmailClassifierTrainer):
+        def _run_category_stage(self, df, tune, X):
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        train(CrashingTrainer())
+    assert train() == ['cached'] * 4 + ['computed'] * 3
+
+
+def test_failed_writes_leave_no_entry(tmp_path):
+    cache = StageCache(str(tmp_path), enabled=True, keep=3)
+    key = cache.key('stage', 'inputs')
+
+    def failing_dump(result, path):
+        with open(path, 'w') as f:
+            f.write('partial')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        cache.run('stage', key, lambda: 1, dump=failing_dump)
+    assert not os.path.exists(cache.path('stage', key))
+
+    assert cache.run('stage', key, lambda: 2) == 2
+    assert cache.run('stage', key, lambda: 3) == 2
+    assert cache.status['stage'] == 'cached'
+
+
+def test_only_the_most_recent_entries_are_kept(tmp_path):
+    cache = StageCache(str(tmp_path), enabled=True, keep=2)
+    keys = [cache.key('stage', i) for i in range(4)]
+    for i, key in enumerate(keys):
+        # A stage's extra output files are pruned with its entry
+        extra = cache.path('stage', key, '.bin')
+        cache.run('stage', key, lambda: open(extra, 'w').close() or i, outputs=[extra])
+        os.utime(cache.path('stage', key), (i, i))
+    cache.run('other', cache.key('other'), lambda: 'kept')
+
+    remaining = sorted(os.listdir(tmp_path))
+    expected = sorted(os.path.basename(cache.path('stage', key, suffix))
+                      for key in keys[2:] for suffix in ('.joblib', '.bin'))
+    assert [name for name in remaining if name.startswith('stage-')] == expected
+    assert any(name.startswith('other-') for name in remaining)
+    assert cache.run('stage', keys[3], lambda: 'recomputed') == 3
@@ -0,0 +1,114 @@
+import json
+import os
+import joblib
+import pytest
+from scipy import sparse
+from conftest import make_email, train_pipeline
+from config import Config
+import resources
+from resources import TrainingBudget, format_mb, matrix_bytes, peak_rss_bytes
+
+MB = 2 ** 20
+
+
+def test_budget_choices_scale_with_the_limit():
+    X = sparse.random(1000, 2000, density=0.01, format='csr')
+    dense_bytes = matrix_bytes(X, dense=True)
+
+    assert TrainingBudget(64 * dense_bytes, 4).use_dense(X)
+    assert not TrainingBudget(dense_bytes, 4).use_dense(X)
+
+    # Parallelism is capped by cores, tasks and the memory each fit copies
+    assert TrainingBudget(1024 * MB, 4).n_jobs(10 * MB, n_tasks=5) == 4
+    assert TrainingBudget(1024 * MB, 16).n_jobs(10 * MB, n_tasks=5) == 5
+    assert TrainingBudget(64 * MB, 16).n_jobs(10 * MB, n_tasks=5) == 3
+    assert TrainingBudget(8 * MB, 16).n_jobs(10 * MB, n_tasks=5) == 1
+
+    assert TrainingBudget(1024 * MB, 1).chunk_rows(1000) > TrainingBudget(128 * MB, 1).chunk_rows(1000)
+    assert TrainingBudget(MB, 1).chunk_rows(10 ** 6) == 100
+
+
+def test_budget_from_config(monkeypatch):
+    monkeypatch.setattr(Config, 'TRAINING_MEMORY_LIMIT_MB', 0)
+    monkeypatch.setattr(Config, 'TRAINING_CORES', 0)
+    assert TrainingBudget.from_config() is None
+
+    monkeypatch.setattr(Config, 'TRAINING_MEMORY_LIMIT_MB', 512)
+    budget = TrainingBudget.from_config()
+    assert budget.memory_bytes == 512 * MB and budget.cores >= 1
+
+    with pytest.raises(ValueError):
+        TrainingBudget(0, 2)
+
+
+def test_peak_rss_is_reported_in_bytes():
+    assert peak_rss_bytes() > 10 * MB
+
+
+def test_memory_is_unknown_without_getrusage_or_psutil(monkeypatch):
+    monkeypatch.setattr(resources, 'resource', None)
+    monkeypatch.setattr(resources, 'psutil', None)
+    monkeypatch.delattr(os, 'sysconf', raising=False)
+    assert peak_rss_bytes() is None and resources.physical_memory_bytes() is None
+    assert format_mb(None) == 'unknown' and format_mb(3 * MB) == '3 MB'
+
+    # A core budget alone still works once the memory limit is given explicitly
+    monkeypatch.setattr(Config, 'TRAINING_CORES', 1)
+    monkeypatch.setattr(Config, 'TRAINING_MEMORY_LIMIT_MB', 0)
+    with pytest.raises(ValueError):
+        TrainingBudget.from_config()
+    monkeypatch.setattr(Config, 'TRAINING_MEMORY_LIMIT_MB', 256)
+    assert TrainingBudget.from_config().memory_bytes == 256 * MB
+
+
+@pytest.fixture(scope='module')
+def budgeted_model_path(tmp_path_factory):
+    from train_model import EmailClassifierTrainer
+
+    # Small enough that the dense matrix does not fit and chunks are at their minimum
+    trainer = EmailClassifierTrainer(budget=TrainingBudget(MB // 4, 2))
+    return train_pipeline(tmp_path_factory, trainer)
+
+
+def test_budgeted_training_reports_its_choices(budgeted_model_path):
+    model_path, results = budgeted_model_path
+    with open(os.path.join(model_path, Config.TRAINING_REPORT_NAME)) as f:
+        report = json.load(f)
+
+    assert report['budget'] == {'memory_limit_bytes': MB // 4, 'cores': 2}
+    decisions = report['decisions']
+    assert decisions['sparse_input'] is True
+    assert decisions['matrix_chunk_rows'] == decisions['dataset_chunk_rows'] == 100
+    assert 1 <= decisions['cv_jobs'] <= 2
+    assert set(report['stages']) >= {'dataset', 'features', 'matrices', 'importance_model', 'category_model'}
+    # Per-stage figures are the cumulative process peak, so they never go down
+    stage_peaks = [stage['peak_rss_so_far_bytes'] for stage in report['stages'].values()]
+    assert stage_peaks == sorted(stage_peaks) and stage_peaks[-1] <= report['peak_rss_bytes']
+    assert results['peak_rss_bytes'] == report['peak_rss_bytes']
+
+    model_data = joblib.load(os.path.join(model_path, Config.MODEL_NAME))
+    assert model_data['sparse_input'] is True
+    # Final models do not keep the training parallelism for serving
+    for name in ('importance_model', 'category_model'):
+        assert model_data[name].get_params().get('n_jobs') in (None, 1)
+
+
+@pytest.mark.parametrize('kernel', [True, False])
+def test_sparse_trained_models_serve(budgeted_model_path, monkeypatch, tmp_path, kernel):
+    from predict import EmailPredictor
+
+    model_path, _ = budgeted_model_path
+    monkeypatch.setattr(Config, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'INFERENCE_KERNEL_ENABLED', kernel)
+    monkeypatch.setattr(Config, 'CASCADE_ENABLED', False)
+    predictor = EmailPredictor()
+    predictor.load_models()
+    assert (predictor.kernel is not None) == kernel
+    assert predictor.sparse_input is not kernel
+
+    for i in range(5):
+        prediction = predictor.predict_email(make_email(i), explain=True)
+        assert prediction['primaryCategory'] in predictor.categories
+        assert 0.0 <= prediction['confidence'] <= 1.0
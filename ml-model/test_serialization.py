@@ -0,0 +1,53 @@
+import msgpack
+import pytest
+from conftest import make_email
+from serialization import MSGPACK_MIMETYPE
+
+
+def unpack(response):
+    assert response.mimetype == MSGPACK_MIMETYPE
+    return msgpack.unpackb(response.data, raw=False)
+
+
+def test_msgpack_request_and_response_round_trip(api_client):
+    email = make_email(0)
+    response = api_client.post('/predict', data=msgpack.packb(email), content_type=MSGPACK_MIMETYPE,
+                               headers={'Accept': MSGPACK_MIMETYPE})
+    assert response.status_code == 200
+    prediction = unpack(response)
+
+    # Same answer as the JSON API
+    expected = api_client.post('/predict', json=email).get_json()
+    for key in ('isImportant', 'primaryCategory', 'features'):
+        assert prediction[key] == expected[key]
+    assert prediction['confidence'] == pytest.approx(expected['confidence'])
+
+    batch = api_client.post('/batch_predict', data=msgpack.packb({'emails': [email, make_email(1)]}),
+                            content_type=MSGPACK_MIMETYPE, headers={'Accept': MSGPACK_MIMETYPE})
+    assert unpack(batch)['total_processed'] == 2
+
+
+@pytest.mark.parametrize('accept', [None, 'application/json', 'text/html', f'application/json, {MSGPACK_MIMETYPE};q=0.5'])
+def test_responses_fall_back_to_json(api_client, accept):
+    headers = {'Accept': accept} if accept else {}
+    response = api_client.post('/predict', data=msgpack.packb(make_email(0)), content_type=MSGPACK_MIMETYPE,
+                               headers=headers)
+    assert response.status_code == 200
+    assert response.is_json and 'primaryCategory' in response.get_json()
+
+
+def test_features_block_can_be_dropped(api_client):
+    email = make_email(0)
+    assert 'features' in api_client.post('/predict', json=email).get_json()
+    assert 'features' not in api_client.post('/predict?features=false', json=email).get_json()
+    assert 'features' not in api_client.post('/predict', json={**email, 'include_features': False}).get_json()
+
+    batch = api_client.post('/batch_predict?features=0', json={'emails': [email]}).get_json()
+    assert 'features' not in batch['predictions'][0]
+
+
+@pytest.mark.parametrize('route', ['/predict', '/batch_predict', '/jobs'])
+def test_malformed_msgpack_is_a_bad_request(api_client, route):
+    response = api_client.post(route, data=b'\xc1\x92', content_type=MSGPACK_MIMETYPE)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid request body'
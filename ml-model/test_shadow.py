@@ -0,0 +1,52 @@
+import threading
+from shadow import ShadowEvaluator
+
+
+def prediction(important, category, confidence=0.9):
+    return {'isImportant': important, 'primaryCategory': category, 'confidence': confidence}
+
+
+def test_records_agreement_and_latency():
+    shadow = ShadowEvaluator(lambda features: prediction(True, features['category'], 0.8), sample_rate=1.0)
+    for category in ['jobs', 'jobs', 'events', 'other']:
+        assert shadow.submit({'category': category}, prediction(True, 'jobs'), primary_seconds=0.002)
+    assert shadow.drain(timeout=5)
+
+    stats = shadow.get_stats()
+    assert stats['scored'] == 4 and stats['dropped'] == 0
+    assert stats['importance_agreement'] == 1.0
+    assert stats['category_agreement'] == 0.5
+    assert abs(stats['mean_confidence_delta'] - 0.1) < 1e-9
+    assert stats['primary_latency_ms']['mean'] == 2.0
+    assert stats['shadow_latency_ms']['p95'] >= 0
+
+
+def test_full_queue_drops_samples_without_blocking():
+    release = threading.Event()
+
+    def slow_score(features):
+        release.wait(5)
+        return prediction(True, 'jobs')
+
+    shadow = ShadowEvaluator(slow_score, sample_rate=1.0, max_queue=2)
+    accepted = [shadow.submit({}, prediction(True, 'jobs')) for _ in range(10)]
+    release.set()
+    assert shadow.drain(timeout=5)
+
+    stats = shadow.get_stats()
+    # One sample in the worker, two queued, the rest dropped
+    assert sum(accepted) <= 3
+    assert stats['dropped'] == 10 - sum(accepted)
+    assert stats['scored'] == sum(accepted)
+
+
+def test_sampling_and_failures():
+    shadow = ShadowEvaluator(lambda features: features['missing'], sample_rate=0.0)
+    assert not shadow.submit({}, prediction(True, 'jobs'))
+
+    shadow.sample_rate = 1.0
+    shadow.submit({}, prediction(True, 'jobs'))
+    assert shadow.drain(timeout=5)
+    stats = shadow.get_stats()
+    assert stats['failed'] == 1 and stats['scored'] == 0
+    assert stats['category_agreement'] is None
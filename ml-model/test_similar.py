@@ -0,0 +1,201 @@
+import json
+import numpy as np
+import pytest
+from conftest import make_email
+from similar import SimilarityIndex, truncate_vector, vocabulary_fingerprint
+
+N_TERMS = 200
+
+
+def random_vector(rng, n_nonzero=30):
+    indices = rng.choice(N_TERMS, size=n_nonzero, replace=False)
+    values = rng.random(n_nonzero)
+    return indices, values / np.linalg.norm(values)
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return [random_vector(rng) for _ in range(300)]
+
+
+def open_index(path, **kwargs):
+    return SimilarityIndex(str(path), terms_per_doc=16, query_terms=8, max_postings=10000, **kwargs)
+
+
+def brute_force(vectors, query, k, terms_per_doc=16, query_terms=8):
+    """Cosine of the truncated vectors, computed densely"""
+    def dense(vector, n_terms):
+        indices, values = truncate_vector(*vector, n_terms)
+        row = np.zeros(N_TERMS)
+        row[indices] = values
+        return row
+
+    scores = np.array([dense(vector, terms_per_doc) for vector in vectors]) @ dense(query, query_terms)
+    return list(np.argsort(-scores, kind='stable')[:k]), scores
+
+
+@pytest.mark.parametrize('merge_docs', [None, 7])
+def test_query_matches_brute_force_cosine(tmp_path, vectors, merge_docs):
+    # A small merge_docs scores most emails from merged segments and the rest from the tail
+    index = open_index(tmp_path, merge_docs=merge_docs)
+    for i, vector in enumerate(vectors):
+        index.add(f"email-{i}", *vector, owner='alice')
+
+    for query in vectors[:20]:
+        expected, scores = brute_force(vectors, query, k=5)
+        results = index.query(*query, owner='alice', k=5)
+        assert [doc_id for doc_id, _ in results] == [f"email-{i}" for i in expected]
+        # Stored weights are float16
+        np.testing.assert_allclose([score for _, score in results], scores[expected], atol=1e-3)
+
+
+def test_results_are_limited_to_owner_and_exclude_query(tmp_path, vectors):
+    index = open_index(tmp_path)
+    for i, vector in enumerate(vectors):
+        index.add(f"email-{i}", *vector, owner='alice' if i % 2 else 'bob')
+
+    results = index.query(*vectors[1], k=300, owner='alice', exclude='email-1')
+    ids = [doc_id for doc_id, _ in results]
+    assert ids and 'email-1' not in ids
+    assert all(int(doc_id.split('-')[1]) % 2 for doc_id in ids)
+    assert index.query(*vectors[1], owner='carol') == []
+    # There is no shared partition for entries or queries without an owner
+    for owner in (None, ''):
+        with pytest.raises(ValueError):
+            index.query(*vectors[1], owner=owner)
+        with pytest.raises(ValueError):
+            index.add('email-x', *vectors[1], owner=owner)
+
+
+def test_owners_cannot_read_each_others_mail(tmp_path, vectors):
+    index = open_index(tmp_path)
+    index.add('alices-email', *vectors[0], owner='alice')
+    index.add('bobs-email', *vectors[0], owner='bob')
+
+    assert [doc_id for doc_id, _ in index.query(*vectors[0], owner='bob')] == ['bobs-email']
+    assert index.vector('alices-email', 'bob') is None
+    assert index.vector('alices-email', 'alice') is not None
+    index.close()
+
+    # Ownership survives a reload
+    reopened = open_index(tmp_path)
+    assert reopened.vector('bobs-email', 'alice') is None
+    assert [doc_id for doc_id, _ in reopened.query(*vectors[0], owner='alice')] == ['alices-email']
+
+
+def test_index_is_rebuilt_from_disk(tmp_path, vectors):
+    index = open_index(tmp_path)
+    for i, vector in enumerate(vectors):
+        index.add(f"email-{i}", *vector, owner=f"user-{i % 3}")
+    assert not index.add('email-0', *vectors[0], owner='user-0')
+    expected = [index.query(*vector, k=10, owner=f"user-{i % 3}") for i, vector in enumerate(vectors[:10])]
+    index.close()
+
+    reopened = open_index(tmp_path)
+    assert reopened.get_stats()['documents'] == len(vectors)
+    # Reloaded emails are scored from the merged postings, summed in another order
+    for i, vector in enumerate(vectors[:10]):
+        results = reopened.query(*vector, k=10, owner=f"user-{i % 3}")
+        assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected[i]]
+        np.testing.assert_allclose([score for _, score in results], [score for _, score in expected[i]], rtol=1e-5)
+    indices, values = reopened.vector('email-5', 'user-2')
+    stored = dict(zip(indices.tolist(), values.tolist()))
+    original = dict(zip(*[part.tolist() for part in truncate_vector(*vectors[5], 16)]))
+    assert stored.keys() == original.keys()
+    assert reopened.vector('missing', 'user-2') is None
+
+
+def test_stats_are_running_counters(tmp_path, vectors):
+    index = open_index(tmp_path, merge_docs=50)
+    for i, vector in enumerate(vectors):
+        index.add(f"email-{i}", *vector, owner=f"user-{i % 7}")
+    stats = index.get_stats()
+    assert stats['documents'] == len(vectors) and stats['owners'] == 7
+    assert stats['postings'] == 16 * len(vectors)
+    assert 0 < stats['unmerged_documents'] < len(vectors)
+
+    index.merge()
+    assert index.get_stats()['unmerged_documents'] == 0
+    assert index.get_stats()['postings'] == stats['postings']
+
+
+def test_records_of_another_width_are_converted(tmp_path, vectors):
+    index = open_index(tmp_path)
+    for i, vector in enumerate(vectors):
+        index.add(f"email-{i}", *vector, owner='alice')
+    index.close()
+
+    # Reading 16-term records as 8-term ones would scramble every posting
+    narrow = SimilarityIndex(str(tmp_path), terms_per_doc=8, query_terms=8, max_postings=10000)
+    with open(tmp_path / 'meta.json') as f:
+        assert json.load(f)['terms_per_doc'] == 8
+    indices, values = narrow.vector('email-3', 'alice')
+    expected = truncate_vector(*vectors[3], 8)
+    assert sorted(indices.tolist()) == sorted(expected[0].tolist())
+    assert np.linalg.norm(values) == pytest.approx(1, abs=1e-3)
+
+    for query in vectors[:20]:
+        ranked, scores = brute_force(vectors, query, k=5, terms_per_doc=8)
+        results = narrow.query(*query, owner='alice', k=5)
+        np.testing.assert_allclose([score for _, score in results], scores[ranked], atol=2e-3)
+
+
+def test_reweighting_scales_stored_vectors_by_the_idf_ratio(tmp_path, vectors):
+    index = open_index(tmp_path, idf=np.ones(N_TERMS))
+    for i, vector in enumerate(vectors[:20]):
+        index.add(f"email-{i}", *vector, owner='alice')
+    index.close()
+
+    # Reopening under other IDF weights re-weights once; the same weights leave it alone
+    idf = np.linspace(1, 3, N_TERMS)
+    for _ in range(2):
+        reopened = open_index(tmp_path, idf=idf)
+        indices, values = reopened.vector('email-4', 'alice')
+        original = dict(zip(*[part.tolist() for part in truncate_vector(*vectors[4], 16)]))
+        expected = np.array([original[term] for term in indices.tolist()]) * idf[indices]
+        assert values == pytest.approx(expected / np.linalg.norm(expected), abs=2e-3)
+        assert reopened.query(indices, values, owner='alice', k=1)[0][0] == 'email-4'
+        reopened.close()
+
+
+def test_torn_write_is_dropped_on_load(tmp_path, vectors):
+    index = open_index(tmp_path)
+    for i, vector in enumerate(vectors[:10]):
+        index.add(f"email-{i}", *vector, owner='alice')
+    index.close()
+    # Simulate a crash between writing a record and its id line
+    with open(tmp_path / 'records.bin', 'ab') as f:
+        f.write(b'\x01' * (index.record_dtype.itemsize + 3))
+
+    reopened = open_index(tmp_path)
+    assert reopened.get_stats()['documents'] == 10
+    reopened.add('email-10', *vectors[10], owner='alice')
+    reopened.close()
+    assert open_index(tmp_path).query(*vectors[10], owner='alice', k=1)[0][0] == 'email-10'
+
+
+def test_vocabulary_fingerprint_tracks_term_columns():
+    assert vocabulary_fingerprint({'a': 0, 'b': 1}) == vocabulary_fingerprint({'b': 1, 'a': 0})
+    assert vocabulary_fingerprint({'a': 0, 'b': 1}) != vocabulary_fingerprint({'a': 1, 'b': 0})
+    assert vocabulary_fingerprint({'a': 0}) != vocabulary_fingerprint({'a': 0, 'b': 1})
+
+
+def test_similar_route_is_scoped_to_the_user(api_client):
+    for i in range(8):
+        owner = 'alice' if i % 2 else 'bob'
+        api_client.post('/predict', json={**make_email(i), 'id': f"gmail-{i}", 'user_id': owner})
+    # Emails without an owner are classified but never indexed
+    api_client.post('/predict', json={**make_email(8), 'id': 'gmail-8', 'user_id': None})
+
+    results = api_client.get('/similar?email_id=gmail-1&user_id=alice&k=10').get_json()['results']
+    assert results and all(int(item['email_id'].split('-')[1]) % 2 for item in results)
+
+    posted = api_client.post('/similar', json={**make_email(2), 'user_id': 'bob', 'k': 10}).get_json()
+    assert posted['results'] and all(int(item['email_id'].split('-')[1]) % 2 == 0 for item in posted['results'])
+
+    # Another user's email id reads as not indexed, and a missing user_id is rejected
+    assert api_client.get('/similar?email_id=gmail-1&user_id=bob').status_code == 404
+    assert api_client.get('/similar?email_id=gmail-8&user_id=bob').status_code == 404
+    response = api_client.get('/similar?email_id=gmail-1')
+    assert response.status_code == 400 and response.get_json()['error'] == 'Missing user_id'
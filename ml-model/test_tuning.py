@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from conftest import make_email
+from config import Config
+from data_processor import EmailDataProcessor
+import train_model
+from tuning import SuccessiveHalvingSearch
+
+WORDS = ['internship', 'hackathon', 'scholarship', 'newsletter', 'deadline', 'apply', 'prizes', 'grant',
+         'updates', 'blog', 'team', 'coding', 'students', 'funding', 'weekly', 'interview']
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    rng = np.random.RandomState(0)
+    documents = [' '.join(rng.choice(WORDS, size=12)) for _ in range(120)]
+    y = np.array(['internship' in document for document in documents], dtype=int)
+    vectorizer = TfidfVectorizer()
+    X = sparse.hstack([vectorizer.fit_transform(documents), rng.normal(size=(len(documents), 3))], format='csr')
+    return documents, vectorizer, X, y
+
+
+def make_search(**kwargs):
+    return SuccessiveHalvingSearch({'logistic_regression': {'C': [0.1, 1.0, 10.0]}},
+                                   **{'n_candidates': 9, 'factor': 3, 'cv': 3, 'n_jobs': 1, **kwargs})
+
+
+def test_search_stops_at_the_budget_and_keeps_the_best_round(dataset):
+    _, _, X, y = dataset
+    search = make_search(budget_seconds=0, text_columns=len(WORDS), max_features_options=[4, 8])
+    name, params, score = search.fit(X, y)
+
+    # Two rounds were planned; the budget only lets the first one finish
+    assert len(search._sample_candidates()) == 9
+    assert len(search.history) == 1
+    assert score == search.history[0]['best_score']
+    assert name == 'logistic_regression' and set(params) == {'C', 'max_features'}
+
+    unlimited = make_search(budget_seconds=60, text_columns=len(WORDS), max_features_options=[4, 8])
+    unlimited.fit(X, y)
+    assert len(unlimited.history) == 2
+
+
+def test_rounds_estimated_to_overrun_the_budget_are_skipped(dataset, monkeypatch):
+    import tuning
+
+    # Every fold fit takes one second on a fake clock
+    clock = [0.0]
+    evaluate = tuning._evaluate
+
+    def timed_evaluate(*args):
+        clock[0] += 1
+        return evaluate(*args)
+
+    monkeypatch.setattr(tuning, '_evaluate', timed_evaluate)
+    monkeypatch.setattr(tuning, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    _, _, X, y = dataset
+
+    # Round 0 fits 9 candidates x 3 folds (27s); round 1 has a third of the
+    # candidates on three times the samples, so it is estimated at 27s as well
+    search = make_search(budget_seconds=40, text_columns=len(WORDS), max_features_options=[4, 8])
+    search.fit(X, y)
+    assert len(search.history) == 1 and clock[0] == 27
+
+    clock[0] = 0
+    search = make_search(budget_seconds=60, text_columns=len(WORDS), max_features_options=[4, 8])
+    search.fit(X, y)
+    assert len(search.history) == 2 and clock[0] == 36
+
+
+def test_smaller_vocabularies_are_evaluated_as_deployed(dataset):
+    documents, vectorizer, X, y = dataset
+    search = make_search(text_columns=len(WORDS), max_features_options=[5])
+    search.fit(X, y)
+
+    terms = vectorizer.get_feature_names_out()[search.selected_text_columns(5)]
+    deployed = TfidfVectorizer(vocabulary=terms).fit(documents).transform(documents)
+    evaluated = search._restricted_input(X, 5)
+    assert evaluated.shape == (len(documents), 5 + 3)
+    np.testing.assert_allclose(evaluated[:, :5].toarray(), deployed.toarray(), atol=1e-12)
+    np.testing.assert_allclose(evaluated[:, 5:].toarray(), X[:, len(WORDS):].toarray())
+    assert search._restricted_input(X, len(WORDS)) is X
+
+
+def test_tuned_trainer_records_and_deploys_the_winner(monkeypatch):
+    searches = []
+
+    class SmallVocabularySearch(SuccessiveHalvingSearch):
+        def _sample_candidates(self):
+            searches.append(self)
+            return [('logistic_regression', {'C': C, 'max_features': 20}) for C in (0.1, 1.0, 10.0)]
+
+    monkeypatch.setattr(train_model, 'SuccessiveHalvingSearch', SmallVocabularySearch)
+    monkeypatch.setattr(Config, 'TUNING_MAX_FEATURES', [20])
+    monkeypatch.setattr(Config, 'TUNING_CV_FOLDS', 3)
+    df = EmailDataProcessor().create_training_dataset([make_email(i) for i in range(120)])
+    trainer = train_model.EmailClassifierTrainer()
+    trainer.fit_featurizers(df)
+    full_terms = trainer.vectorizer.get_feature_names_out()
+    trainer.train_importance_classifier(df, tune=True)
+
+    recorded = trainer.hyperparameters['importance']
+    assert recorded['tuned'] is True and recorded['model'] == 'logistic_regression'
+    assert recorded['max_features'] == 20 and recorded['params']['C'] in (0.1, 1.0, 10.0)
+    assert recorded['search_rounds'] and recorded['cv_accuracy'] == recorded['search_rounds'][-1]['best_score']
+
+    # The deployed vectorizer holds exactly the terms the search evaluated
+    expected = full_terms[searches[0].selected_text_columns(20)]
+    assert sorted(trainer.vectorizer.vocabulary_) == sorted(expected)
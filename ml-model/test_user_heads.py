@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from conftest import make_email
+from config import Config
+from user_heads import UserHeadStore, UserHeadWriter
+
+N_FEATURES = 50
+
+
+@pytest.fixture
+def heads(tmp_path):
+    """Three users' logistic regressions and the store they were exported to"""
+    rng = np.random.RandomState(0)
+    data_path = str(tmp_path / 'user_heads.bin')
+    writer = UserHeadWriter(data_path, N_FEATURES)
+    models = {}
+    for user in range(3):
+        X = sparse.random(80, N_FEATURES, density=0.2, format='csr', random_state=user)
+        y = (X[:, :5].sum(axis=1).A1 + rng.normal(scale=0.1, size=80) > 0.2).astype(int)
+        model = LogisticRegression(penalty='l1', solver='liblinear', C=10.0).fit(X, y)
+        writer.add(f"user{user}", model.coef_, model.intercept_[0])
+        models[f"user{user}"] = (model, X)
+    writer.close()
+    return data_path, models
+
+
+def test_memory_mapped_heads_match_sklearn(heads):
+    data_path, models = heads
+    store = UserHeadStore(data_path)
+    for user_id, (model, X) in models.items():
+        expected = model.predict_proba(X)[:, 1]
+        actual = [store.predict_proba(user_id, row.indices, row.data) for row in X]
+        np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+    # Only the non-zero weights are stored
+    assert store._records.size == sum(np.count_nonzero(model.coef_) for model, _ in models.values())
+
+
+def test_head_cache_evicts_least_recently_used(heads, monkeypatch):
+    data_path, _ = heads
+    monkeypatch.setattr(Config, 'USER_HEAD_CACHE_SIZE', 2)
+    store = UserHeadStore(data_path)
+
+    for user_id in ('user0', 'user1', 'user0', 'user2'):
+        store.get_head(user_id)
+    assert store.get_stats() == {'users': 3, 'cached_heads': 2, 'cache_hits': 1, 'cache_misses': 3}
+    assert list(store._cache) == ['user0', 'user2']
+
+    # user1 was evicted and is read from the memory map again
+    store.get_head('user1')
+    assert store.get_stats()['cache_misses'] == 4
+    assert list(store._cache) == ['user2', 'user1']
+
+
+def test_unknown_users_use_the_global_model(heads, trained_model_path, monkeypatch, tmp_path):
+    from predict import EmailPredictor
+
+    data_path, _ = heads
+    store = UserHeadStore(data_path)
+    assert not store.has_head('stranger') and not store.has_head(None)
+    assert store.predict_proba('stranger', np.array([0]), np.array([1.0])) is None
+
+    monkeypatch.setattr(Config, 'MODEL_PATH', trained_model_path)
+    monkeypatch.setattr(Config, 'PREPROCESS_WORKERS', 0)
+    monkeypatch.setattr(Config, 'SIMILAR_INDEX_DIR', str(tmp_path / 'similar'))
+    monkeypatch.setattr(Config, 'DEDUP_ENABLED', False)
+    monkeypatch.setattr(Config, 'DOMAIN_SHORTCUT_ENABLED', False)
+    predictor = EmailPredictor()
+    predictor.load_models()
+
+    email = make_email(4)
+    shared = predictor.predict_email({**email, 'user_id': None})
+    stranger = predictor.predict_email({**email, 'user_id': 'stranger'})
+    personal = predictor.predict_email({**email, 'user_id': 'user1'})
+    assert shared['personalized'] is False and stranger['personalized'] is False
+    assert stranger['confidence'] == shared['confidence']
+    assert personal['personalized'] is True
+
+
+def test_emails_without_owner_train_no_head(tmp_path):
+    from train_model import EmailClassifierTrainer
+
+    # user0's mail arrives without an owner, which must not become a user called "None"
+    emails = [make_email(i) for i in range(120)]
+    for email in emails[::3]:
+        email['user_id'] = None
+    trainer = EmailClassifierTrainer()
+    df = trainer.processor.create_training_dataset(emails)
+    assert set(df['user_id']) == {'', 'user1', 'user2'}
+
+    trainer.fit_featurizers(df)
+    data_path = str(tmp_path / 'user_heads.bin')
+    trainer.train_user_heads(df, data_path=data_path)
+    store = UserHeadStore(data_path)
+    assert set(store.heads) == {'user1', 'user2'}
+    assert not store.has_head('None') and not store.has_head(None)
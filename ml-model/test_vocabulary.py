@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from config import Config
+from train_model import EmailClassifierTrainer
+from vocabulary import CountMinSketch, stable_hashes
+
+MAX_FEATURES = 300
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    """Documents drawn from a Zipf-distributed vocabulary, like real email text"""
+    rng = np.random.RandomState(0)
+    words = [f"w{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}{chr(97 + i // 676)}" for i in range(2000)]
+    weights = 1.0 / np.arange(1, len(words) + 1)
+    weights /= weights.sum()
+    return [' '.join(rng.choice(words, size=rng.randint(20, 60), p=weights)) for _ in range(600)]
+
+
+def fit_vectorizer(corpus, builder, monkeypatch):
+    monkeypatch.setattr(Config, 'VOCAB_BUILDER', builder)
+    monkeypatch.setattr(Config, 'VOCAB_CHUNK_SIZE', 100)
+    monkeypatch.setattr(Config, 'SKETCH_WIDTH', 2 ** 14)
+    trainer = EmailClassifierTrainer()
+    trainer.create_text_vectorizer(corpus, max_features=MAX_FEATURES)
+    return trainer.vectorizer
+
+
+def test_sketch_vocabulary_matches_exact(corpus, monkeypatch):
+    exact = fit_vectorizer(corpus, 'exact', monkeypatch)
+    sketch = fit_vectorizer(corpus, 'sketch', monkeypatch)
+
+    exact_terms, sketch_terms = set(exact.vocabulary_), set(sketch.vocabulary_)
+    assert len(sketch_terms) == len(exact_terms) == MAX_FEATURES
+    # Only ties at the max_features cut-off may be broken differently
+    assert len(exact_terms & sketch_terms) >= 0.95 * MAX_FEATURES
+
+    # IDF depends only on document frequency, so shared terms weigh the same
+    shared = sorted(exact_terms & sketch_terms)
+    exact_idf = exact.idf_[[exact.vocabulary_[term] for term in shared]]
+    sketch_idf = sketch.idf_[[sketch.vocabulary_[term] for term in shared]]
+    np.testing.assert_allclose(sketch_idf, exact_idf)
+
+
+def test_sketch_hashes_are_stable_across_processes():
+    keys = ['internship', 'apply now', 'hackathon prizes', '']
+    script = ("from vocabulary import stable_hashes; "
+              f"print(','.join(str(h) for h in stable_hashes({keys!r})))")
+    outputs = set()
+    for seed in ('1', '2'):
+        env = {**os.environ, 'PYTHONHASHSEED': seed}
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env)
+        assert result.returncode == 0, result.stderr
+        outputs.add(result.stdout.strip())
+    assert outputs == {','.join(str(h) for h in stable_hashes(keys))}
+
+    sketch = CountMinSketch(width=64, depth=3)
+    sketch.add(keys, [1, 2, 3, 4])
+    assert np.all(sketch.estimate(keys) >= [1, 2, 3, 4])
@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
+from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
@@ -9,68 +9,180 @@ from sklearn.metrics import classification_report, confusion_matrix, accuracy_sc
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
+from scipy import sparse
 import joblib
+import json
 import os
+import shutil
+from contextlib import nullcontext
+from threadpoolctl import threadpool_limits
 from config import Config
-from data_processor import EmailDataProcessor, create_sample_training_data
+from data_processor import (
+    EmailDataProcessor, NUMERICAL_FEATURES, create_sample_training_data,
+    save_training_dataset, load_training_dataset
+)
+from user_heads import UserHeadWriter, head_index_path
+from pipeline_cache import StageCache, hash_records
+from resources import ANALYZED_BYTES_PER_CHAR, TrainingBudget, format_mb, matrix_bytes, peak_rss_bytes
+from cascade import evaluate_cascade
+from domain_index import DomainIndex, domain_index_path
+from drift import idf_refresh_path
+from inference_kernel import UnsupportedModel, compile_pipeline, kernel_path
+from vocabulary import SketchVocabularyBuilder
+from tuning import (
+    SuccessiveHalvingSearch, build_estimator,
+    IMPORTANCE_SEARCH_SPACE, CATEGORY_SEARCH_SPACE
+)
 
 class EmailClassifierTrainer:
-    def __init__(self):
+    def __init__(self, budget=None):
         self.processor = EmailDataProcessor()
         self.models = {}
         self.vectorizer = None
         self.label_encoder = None
         self.scaler = StandardScaler()
+        self.hyperparameters = {}
+        self.cascade_report = {}
+        self.domain_index = None
+        self.n_documents = None
+        
+        # Optional memory/core budget; without one the trainer keeps its
+        # default choices (dense models, serial cross-validation)
+        self.budget = TrainingBudget.from_config() if budget is None else budget
+        self.sparse_input = False
+        self.decisions = {}
         
     def prepare_data(self, df):
-        """Prepare data for training"""
-        # Separate features
-        text_features = df['text'].fillna('')
+        """Prepare data for training.
+
+        The dataset columns are already typed and free of missing values, so
+        the numerical inputs are written straight into one float64 array
+        instead of going through a copied sub-frame.
+        """
+        feature_matrix = np.empty((len(df), len(NUMERICAL_FEATURES)), dtype=np.float64)
+        for column, name in enumerate(NUMERICAL_FEATURES):
+            feature_matrix[:, column] = df[name].to_numpy(dtype=np.float64)
+        
+        return df['text'], feature_matrix
+    
+    def create_text_vectorizer(self, text_data, max_features=None, vocabulary=None):
+        """Create and fit TF-IDF vectorizer, on a fixed `vocabulary` of terms if given"""
+        params = {
+            'stop_words': 'english',
+            'ngram_range': (1, 2)
+        }
+        limits = {
+            'max_features': max_features or Config.MAX_FEATURES,
+            'min_df': 2,
+            'max_df': 0.95
+        }
         
-        # Numerical features
-        numerical_features = [
-            'subject_length', 'body_length', 'word_count', 
-            'exclamation_count', 'question_count', 'caps_ratio'
-        ]
+        if vocabulary is not None:
+            self.vectorizer = TfidfVectorizer(vocabulary=list(vocabulary), **params)
+            return self.vectorizer.fit_transform(text_data)
         
-        # Boolean features
-        boolean_features = [
-            'has_deadline', 'has_urgent', 'has_apply', 'has_opportunity'
-        ]
+        builder, chunk_size = self._vocabulary_plan(text_data)
         
-        # Combine numerical and boolean features
-        feature_matrix = df[numerical_features + boolean_features].fillna(0)
-        
-        return text_features, feature_matrix
-    
-    def create_text_vectorizer(self, text_data):
-        """Create and fit TF-IDF vectorizer"""
-        self.vectorizer = TfidfVectorizer(
-            max_features=Config.MAX_FEATURES,
-            stop_words='english',
-            ngram_range=(1, 2),
-            min_df=2,
-            max_df=0.95
-        )
+        if builder == 'sketch':
+            # Pick the vocabulary with bounded memory, then fit IDF on it only
+            vocab_builder = SketchVocabularyBuilder(
+                TfidfVectorizer(**params).build_analyzer(),
+                **limits
+            )
+            vocabulary = vocab_builder.fit(text_data, chunk_size=chunk_size)
+            print(f"Sketch vocabulary: {len(vocabulary)} terms from {vocab_builder.n_documents} documents")
+            self.vectorizer = TfidfVectorizer(vocabulary=vocabulary, **params)
+        else:
+            self.vectorizer = TfidfVectorizer(**params, **limits)
         
         text_vectors = self.vectorizer.fit_transform(text_data)
         return text_vectors
     
-    def train_importance_classifier(self, df):
+    def _vocabulary_plan(self, text_data):
+        """(builder, chunk size) for the vocabulary; a budget switches to the sketch when an exact fit would not fit"""
+        builder = Config.VOCAB_BUILDER
+        chunk_size = None
+        if self.budget is not None:
+            text_chars = int(pd.Series(text_data).str.len().sum())
+            if builder == 'auto' and not self.budget.exact_vocabulary_fits(text_chars):
+                builder = 'sketch'
+            chunk_size = self.budget.chunk_rows(text_chars / max(len(text_data), 1) * ANALYZED_BYTES_PER_CHAR)
+        if builder == 'auto':
+            builder = 'sketch' if len(text_data) >= Config.VOCAB_SKETCH_MIN_DOCS else 'exact'
+        self.decisions['vocabulary_builder'] = builder
+        if builder == 'sketch':
+            self.decisions['vocabulary_chunk_rows'] = chunk_size or Config.VOCAB_CHUNK_SIZE
+        return builder, chunk_size
+    
+    def fit_featurizers(self, df, max_features=None, vocabulary=None):
+        """Fit the shared TF-IDF vectorizer and numerical scaler"""
+        text_features, numerical_features = self.prepare_data(df)
+        self.create_text_vectorizer(text_features, max_features=max_features, vocabulary=vocabulary)
+        self.scaler.fit(numerical_features)
+        return self.vectorizer, self.scaler
+    
+    def build_feature_matrix(self, df):
+        """Featurize a dataset with the fitted vectorizer and scaler (sparse)"""
+        text_features, numerical_features = self.prepare_data(df)
+        if self.budget is None:
+            text_vectors = self.vectorizer.transform(text_features)
+        else:
+            # Transform in chunks so the analyzed terms of only one chunk are held at a time
+            avg_chars = text_features.str.len().mean() if len(text_features) else 0
+            chunk_rows = self.budget.chunk_rows(avg_chars * ANALYZED_BYTES_PER_CHAR)
+            self.decisions['matrix_chunk_rows'] = chunk_rows
+            text_vectors = sparse.vstack([
+                self.vectorizer.transform(text_features[start:start + chunk_rows])
+                for start in range(0, max(len(text_features), 1), chunk_rows)
+            ], format='csr')
+        numerical_scaled = self.scaler.transform(numerical_features)
+        return sparse.hstack([text_vectors, sparse.csr_matrix(numerical_scaled)]).tocsr()
+    
+    def _model_input(self, X):
+        """The feature matrix in the representation the full models train on"""
+        return X if self.sparse_input else X.toarray()
+    
+    def _cv_jobs(self, X_train, n_tasks):
+        """Concurrent cross-validation fits; serial without a budget"""
+        if self.budget is None:
+            return None
+        n_jobs = self.budget.n_jobs(matrix_bytes(X_train), n_tasks)
+        self.decisions['cv_jobs'] = n_jobs
+        return n_jobs
+    
+    def _search_jobs(self, X_train):
+        """Concurrent fits of the hyperparameter search; Config.N_JOBS without a budget"""
+        if self.budget is None:
+            return None
+        n_jobs = self.budget.n_jobs(matrix_bytes(X_train), self.budget.cores)
+        self.decisions['search_jobs'] = n_jobs
+        return n_jobs
+    
+    def _fit(self, model, X, y):
+        """Fit a final model, giving estimators that parallelize internally the budget's cores"""
+        if self.budget is None or 'n_jobs' not in model.get_params():
+            return model.fit(X, y)
+        n_jobs = model.get_params()['n_jobs']
+        model.set_params(n_jobs=self.budget.cores)
+        try:
+            model.fit(X, y)
+        finally:
+            # Serving predicts one email at a time and should not spawn threads for it
+            model.set_params(n_jobs=n_jobs)
+        return model
+    
+    def train_importance_classifier(self, df, tune=False, X=None):
         """Train binary classifier for email importance"""
         print("Training importance classifier...")
         
-        # Prepare data
-        text_features, numerical_features = self.prepare_data(df)
-        
-        # Create text vectors
-        text_vectors = self.create_text_vectorizer(text_features)
-        
-        # Scale numerical features
-        numerical_scaled = self.scaler.fit_transform(numerical_features)
+        # Fit the shared featurizers unless a prepared matrix is passed in
+        if X is None:
+            self.fit_featurizers(df)
+            X = self.build_feature_matrix(df)
+        n_text = len(self.vectorizer.vocabulary_)
         
         # Combine features
-        X = np.hstack([text_vectors.toarray(), numerical_scaled])
+        X = self._model_input(X)
         y = df['is_important'].astype(int)
         
         # Split data
@@ -78,30 +190,71 @@ class EmailClassifierTrainer:
             X, y, test_size=Config.TEST_SIZE, random_state=Config.RANDOM_STATE, stratify=y
         )
         
-        # Train multiple models and select best
-        models_to_try = {
-            'logistic_regression': LogisticRegression(random_state=Config.RANDOM_STATE, max_iter=1000),
-            'random_forest': RandomForestClassifier(n_estimators=100, random_state=Config.RANDOM_STATE),
-            'svm': SVC(probability=True, random_state=Config.RANDOM_STATE)
-        }
-        
-        best_model = None
-        best_score = 0
-        
-        for name, model in models_to_try.items():
-            # Cross-validation
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy')
-            avg_score = cv_scores.mean()
+        if tune:
+            print("Tuning importance classifier (successive halving)...")
+            search = SuccessiveHalvingSearch(
+                IMPORTANCE_SEARCH_SPACE,
+                n_jobs=self._search_jobs(X_train),
+                text_columns=n_text,
+                max_features_options=Config.TUNING_MAX_FEATURES
+            )
+            best_model_name, params, best_score = search.fit(X_train, y_train)
+            params = dict(params)
+            max_features = params.pop('max_features', n_text)
             
-            print(f"{name}: CV Accuracy = {avg_score:.4f} (+/- {cv_scores.std() * 2:.4f})")
+            # A smaller vocabulary won: refit the featurizers on the terms the
+            # search evaluated and rebuild the split
+            if max_features < n_text:
+                terms = self.vectorizer.get_feature_names_out()[search.selected_text_columns(max_features)]
+                self.fit_featurizers(df, vocabulary=terms)
+                X = self._model_input(self.build_feature_matrix(df))
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=Config.TEST_SIZE, random_state=Config.RANDOM_STATE, stratify=y
+                )
             
-            if avg_score > best_score:
-                best_score = avg_score
-                best_model = model
-                best_model_name = name
+            best_model = build_estimator(best_model_name, params)
+            self.hyperparameters['importance'] = {
+                'model': best_model_name,
+                'params': params,
+                'max_features': max_features,
+                'cv_accuracy': best_score,
+                'tuned': True,
+                'search_rounds': search.history
+            }
+        else:
+            # Train multiple models and select best
+            models_to_try = {
+                'logistic_regression': LogisticRegression(random_state=Config.RANDOM_STATE, max_iter=1000),
+                'random_forest': RandomForestClassifier(n_estimators=100, random_state=Config.RANDOM_STATE),
+                'svm': SVC(probability=True, random_state=Config.RANDOM_STATE)
+            }
+            
+            best_model = None
+            best_score = 0
+            
+            for name, model in models_to_try.items():
+                # Cross-validation
+                cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy',
+                                            n_jobs=self._cv_jobs(X_train, 5))
+                avg_score = cv_scores.mean()
+                
+                print(f"{name}: CV Accuracy = {avg_score:.4f} (+/- {cv_scores.std() * 2:.4f})")
+                
+                if avg_score > best_score:
+                    best_score = avg_score
+                    best_model = model
+                    best_model_name = name
+            
+            self.hyperparameters['importance'] = {
+                'model': best_model_name,
+                'params': {},
+                'max_features': n_text,
+                'cv_accuracy': best_score,
+                'tuned': False
+            }
         
         # Train best model on full training set
-        best_model.fit(X_train, y_train)
+        self._fit(best_model, X_train, y_train)
         
         # Evaluate on test set
         y_pred = best_model.predict(X_test)
@@ -115,21 +268,16 @@ class EmailClassifierTrainer:
         self.models['importance'] = best_model
         return best_model, test_accuracy
     
-    def train_category_classifier(self, df):
+    def train_category_classifier(self, df, tune=False, X=None):
         """Train multi-class classifier for email categories"""
         print("\nTraining category classifier...")
         
-        # Prepare data
-        text_features, numerical_features = self.prepare_data(df)
-        
-        # Use the same vectorizer as importance classifier
-        text_vectors = self.vectorizer.transform(text_features)
-        
-        # Scale numerical features
-        numerical_scaled = self.scaler.transform(numerical_features)
+        # Use the same vectorizer and scaler as importance classifier
+        if X is None:
+            X = self.build_feature_matrix(df)
         
         # Combine features
-        X = np.hstack([text_vectors.toarray(), numerical_scaled])
+        X = self._model_input(X)
         
         # Encode labels
         self.label_encoder = LabelEncoder()
@@ -141,19 +289,40 @@ class EmailClassifierTrainer:
         )
         
         # Train Random Forest for multi-class classification
-        model = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            min_samples_split=5,
-            random_state=Config.RANDOM_STATE
-        )
+        params = {
+            'n_estimators': 200,
+            'max_depth': 10,
+            'min_samples_split': 5
+        }
         
-        # Cross-validation
-        cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy')
-        print(f"Category Classifier CV Accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+        if tune:
+            print("Tuning category classifier (successive halving)...")
+            search = SuccessiveHalvingSearch(CATEGORY_SEARCH_SPACE, n_jobs=self._search_jobs(X_train))
+            _, params, cv_accuracy = search.fit(X_train, y_train)
+            history = search.history
+        else:
+            history = None
+        
+        model = build_estimator('random_forest', params)
+        
+        if not tune:
+            # Cross-validation
+            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy',
+                                        n_jobs=self._cv_jobs(X_train, 5))
+            cv_accuracy = cv_scores.mean()
+            print(f"Category Classifier CV Accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+        
+        self.hyperparameters['category'] = {
+            'model': 'random_forest',
+            'params': params,
+            'cv_accuracy': cv_accuracy,
+            'tuned': tune
+        }
+        if history is not None:
+            self.hyperparameters['category']['search_rounds'] = history
         
         # Train on full training set
-        model.fit(X_train, y_train)
+        self._fit(model, X_train, y_train)
         
         # Evaluate on test set
         y_pred = model.predict(X_test)
@@ -166,14 +335,146 @@ class EmailClassifierTrainer:
         self.models['category'] = model
         return model, test_accuracy
     
+    def train_cascade_models(self, df, X=None):
+        """Train cheap linear first-stage models for cascade inference"""
+        print("\nTraining cascade first-stage models...")
+        
+        if X is None:
+            X = self.build_feature_matrix(df)
+        
+        heads = {
+            'importance': (df['is_important'].astype(int).values, self.models['importance']),
+            'category': (self.label_encoder.transform(df['category']), self.models['category'])
+        }
+        
+        for head, (y, full_model) in heads.items():
+            # Same split as the full models, so the comparison is on held-out data
+            train_idx, test_idx = train_test_split(
+                np.arange(len(y)), test_size=Config.TEST_SIZE, random_state=Config.RANDOM_STATE, stratify=y
+            )
+            
+            # Linear models work directly on the sparse matrix
+            model = LogisticRegression(C=Config.CASCADE_C, max_iter=1000, random_state=Config.RANDOM_STATE)
+            model.fit(X[train_idx], y[train_idx])
+            
+            if len(model.classes_) != len(full_model.classes_):
+                print(f"Skipping {head} fast stage: not all classes present in training split")
+                continue
+            
+            metrics = evaluate_cascade(
+                model.predict_proba(X[test_idx]),
+                full_model.predict_proba(self._model_input(X[test_idx])),
+                y[test_idx]
+            )
+            print(f"{head}: fast stage answers {metrics['fast_share']:.1%} of test emails, "
+                  f"cascade accuracy {metrics['cascade_accuracy']:.4f} vs full {metrics['full_accuracy']:.4f}, "
+                  f"agreement {metrics['agreement']:.1%}")
+            
+            self.models[f'fast_{head}'] = model
+            self.cascade_report[head] = metrics
+        
+        return self.cascade_report
+    
+    def _dataset_chunk_rows(self, emails_data):
+        """Rows per chunk when building the dataset; the default without a budget"""
+        if self.budget is None or not emails_data:
+            return None
+        sample = emails_data[:100]
+        avg_chars = sum(len(str(email.get('subject', ''))) + len(str(email.get('body', ''))) for email in sample) / len(sample)
+        # A processed row holds its text plus a few dozen small Python objects
+        chunk_rows = self.budget.chunk_rows(avg_chars * 2 + 1024)
+        self.decisions['dataset_chunk_rows'] = chunk_rows
+        return chunk_rows
+    
+    def build_domain_index(self, df):
+        """Per-sender-domain category and importance statistics"""
+        index = DomainIndex(self.label_encoder.classes_)
+        index.fit(df['sender_domain'], self.label_encoder.transform(df['category']), df['is_important'])
+        
+        print(f"Domain index: {index.get_stats()['domains']} domains, "
+              f"{index.shortcut_domains()} answerable without the models")
+        self.domain_index = index
+        return index
+    
+    def train_user_heads(self, df, X=None, data_path=None):
+        """Train small per-user importance heads on top of the shared featurizer"""
+        print("\nTraining per-user importance heads...")
+        
+        # Featurize once with the shared vectorizer and scaler
+        if X is None:
+            X = self.build_feature_matrix(df)
+        y = df['is_important'].astype(int).values
+        
+        data_path = data_path or os.path.join(Config.MODEL_PATH, Config.USER_HEADS_NAME)
+        writer = UserHeadWriter(data_path, X.shape[1])
+        
+        for user_id, rows in df.groupby('user_id').indices.items():
+            if not user_id or len(rows) < Config.USER_HEAD_MIN_SAMPLES:
+                continue
+            
+            y_user = y[rows]
+            if len(np.unique(y_user)) < 2:
+                continue
+            
+            # L1 keeps each head sparse so it stores compactly
+            head = LogisticRegression(
+                penalty='l1',
+                solver='liblinear',
+                C=Config.USER_HEAD_C,
+                random_state=Config.RANDOM_STATE
+            )
+            head.fit(X[rows], y_user)
+            writer.add(user_id, head.coef_[0], head.intercept_[0])
+        
+        writer.close()
+        print(f"Trained {len(writer.heads)} user heads -> {data_path}")
+        return len(writer.heads)
+    
+    def _run_importance_stage(self, df, tune, X):
+        """Importance model stage; returns everything a cached run must restore"""
+        vectorizer = self.vectorizer
+        model, accuracy = self.train_importance_classifier(df, tune=tune, X=X)
+        changed = self.vectorizer is not vectorizer
+        return {
+            'model': model,
+            'accuracy': accuracy,
+            'hyperparameters': self.hyperparameters['importance'],
+            'vectorizer': self.vectorizer if changed else None,
+            'scaler': self.scaler if changed else None
+        }
+    
+    def _run_category_stage(self, df, tune, X):
+        """Category model stage; returns everything a cached run must restore"""
+        model, accuracy = self.train_category_classifier(df, tune=tune, X=X)
+        return {
+            'model': model,
+            'accuracy': accuracy,
+            'label_encoder': self.label_encoder,
+            'hyperparameters': self.hyperparameters['category']
+        }
+    
+    def _run_cascade_stage(self, df, X):
+        """Cascade first-stage models; returns everything a cached run must restore"""
+        report = self.train_cascade_models(df, X=X)
+        return {
+            'models': {name: model for name, model in self.models.items() if name.startswith('fast_')},
+            'report': report
+        }
+    
     def save_models(self):
         """Save trained models and preprocessors"""
         model_data = {
             'importance_model': self.models.get('importance'),
             'category_model': self.models.get('category'),
+            'fast_importance_model': self.models.get('fast_importance'),
+            'fast_category_model': self.models.get('fast_category'),
+            'cascade_report': self.cascade_report,
             'vectorizer': self.vectorizer,
+            'n_documents': self.n_documents,
+            'sparse_input': self.sparse_input,
             'label_encoder': self.label_encoder,
             'scaler': self.scaler,
+            'hyperparameters': self.hyperparameters,
             'config': {
                 'categories': Config.CATEGORIES,
                 'max_features': Config.MAX_FEATURES,
@@ -184,19 +485,98 @@ class EmailClassifierTrainer:
         model_path = os.path.join(Config.MODEL_PATH, Config.MODEL_NAME)
         joblib.dump(model_data, model_path)
         print(f"\nModels saved to: {model_path}")
+        
+        self.export_inference_kernel(model_data)
+        
+        # IDF weights refreshed on the previous model's vocabulary do not apply to this one
+        if os.path.exists(idf_refresh_path()):
+            os.remove(idf_refresh_path())
+        
+        if self.domain_index is not None:
+            self.domain_index.save(domain_index_path())
+    
+    def save_training_report(self, cache):
+        """Write the budget, the choices made for it, and per-stage time and peak RSS next to the models.
+        
+        A stage's `peak_rss_so_far_bytes` is the process peak once it finished,
+        so it includes every earlier stage; only its increase over the previous
+        stage can be attributed to it.
+        """
+        peak = peak_rss_bytes()
+        report = {
+            'budget': self.budget.to_dict() if self.budget is not None else None,
+            'decisions': self.decisions,
+            'stages': {
+                stage: {
+                    'seconds': seconds,
+                    'status': cache.status[stage],
+                    'peak_rss_so_far_bytes': cache.peak_rss_so_far[stage]
+                }
+                for stage, seconds in cache.timings.items()
+            },
+            'peak_rss_bytes': peak,
+            'children_peak_rss_bytes': peak_rss_bytes(children=True),
+            'within_budget': peak <= self.budget.memory_bytes if self.budget is not None and peak is not None else None
+        }
+        
+        path = os.path.join(Config.MODEL_PATH, Config.TRAINING_REPORT_NAME)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=int)
+        print(f"Training report saved to: {path}")
+        return report
+    
+    def export_inference_kernel(self, model_data):
+        """Compile the saved models into the numpy inference kernel"""
+        path = kernel_path()
+        try:
+            kernel = compile_pipeline(model_data)
+        except UnsupportedModel as e:
+            # Never leave a kernel from an older model next to the new artifact
+            if os.path.exists(path):
+                os.remove(path)
+            print(f"Skipping inference kernel export: {e}")
+            return None
+        
+        kernel.save(path)
+        print(f"Inference kernel saved to: {path}")
+        return kernel
     
-    def train_full_pipeline(self, emails_data=None):
+    def train_full_pipeline(self, emails_data=None, tune=None):
         """Train the complete email classification pipeline"""
+        # Native thread pools (BLAS, OpenMP) stay within the budget's cores too
+        limits = threadpool_limits(limits=self.budget.cores) if self.budget is not None else nullcontext()
+        with limits:
+            return self._train_full_pipeline(emails_data, tune)
+    
+    def _train_full_pipeline(self, emails_data, tune):
+        if tune is None:
+            tune = Config.TUNING_ENABLED
+        
         print("Starting email classification training pipeline...")
+        if self.budget is not None:
+            print(f"Training budget: {self.budget.memory_bytes / 2 ** 20:.0f} MB, {self.budget.cores} cores")
         
         # Get training data
         if emails_data is None:
             print("No training data provided, using sample data...")
             emails_data = create_sample_training_data()
         
-        # Process data
-        df = self.processor.create_training_dataset(emails_data)
+        # Stages are cached on disk by content hash, so reruns only redo stale work
+        cache = StageCache()
+        
+        # Stage 1: dataset (cleaning, preprocessing, labeling)
+        dataset_key = cache.key('dataset', hash_records(emails_data), Config.CATEGORY_KEYWORDS)
+        dataset_format = {}
+        if Config.PIPELINE_CACHE_PARQUET:
+            dataset_format = {'dump': save_training_dataset, 'load': load_training_dataset, 'suffix': '.parquet'}
+        chunk_rows = self._dataset_chunk_rows(emails_data)
+        df = cache.run(
+            'dataset', dataset_key,
+            lambda: self.processor.create_training_dataset(emails_data, chunk_rows=chunk_rows),
+            **dataset_format
+        )
         
+        self.n_documents = len(df)
         print(f"Training dataset created with {len(df)} samples")
         print(f"Categories: {df['category'].value_counts().to_dict()}")
         print(f"Important emails: {df['is_important'].sum()}/{len(df)}")
@@ -205,25 +585,97 @@ class EmailClassifierTrainer:
         if len(df) < 50:
             print("⚠️  WARNING: Training dataset is very small. Consider collecting more data for better performance.")
         
-        # Train models
-        importance_model, importance_accuracy = self.train_importance_classifier(df)
-        category_model, category_accuracy = self.train_category_classifier(df)
+        # Stage 2: features (fitted vectorizer and scaler)
+        features_key = cache.key(
+            'features', dataset_key, Config.MAX_FEATURES, Config.VOCAB_BUILDER,
+            Config.VOCAB_SKETCH_MIN_DOCS, Config.VOCAB_CANDIDATE_FACTOR,
+            Config.SKETCH_WIDTH, Config.SKETCH_DEPTH, self._vocabulary_plan(df['text'])
+        )
+        self.vectorizer, self.scaler = cache.run('features', features_key, lambda: self.fit_featurizers(df))
+        
+        # Stage 3: matrices (sparse feature matrix)
+        matrices_key = cache.key('matrices', features_key)
+        X = cache.run('matrices', matrices_key, lambda: self.build_feature_matrix(df))
+        
+        # Stage 4: models, trained on the dense matrix unless the budget cannot hold it
+        self.sparse_input = self.budget is not None and not self.budget.use_dense(X)
+        self.decisions['sparse_input'] = self.sparse_input
+        if self.sparse_input:
+            print("Training the full models on the sparse feature matrix (dense copy exceeds the budget)")
+        model_config = [Config.TEST_SIZE, Config.RANDOM_STATE, tune, self.sparse_input]
+        if tune:
+            model_config += [
+                Config.TUNING_N_CANDIDATES, Config.TUNING_HALVING_FACTOR, Config.TUNING_CV_FOLDS,
+                Config.TUNING_BUDGET_SECONDS, Config.TUNING_MAX_FEATURES
+            ]
+        
+        importance_key = cache.key('importance_model', matrices_key, model_config)
+        importance = cache.run('importance_model', importance_key, lambda: self._run_importance_stage(df, tune, X))
+        importance_accuracy = importance['accuracy']
+        self.models['importance'] = importance['model']
+        self.hyperparameters['importance'] = importance['hyperparameters']
+        
+        # Tuning may pick a smaller vocabulary, which changes the shared features
+        if importance['vectorizer'] is not None:
+            self.vectorizer, self.scaler = importance['vectorizer'], importance['scaler']
+            X = self.build_feature_matrix(df)
+        
+        category_key = cache.key('category_model', importance_key, model_config)
+        category = cache.run('category_model', category_key, lambda: self._run_category_stage(df, tune, X))
+        category_accuracy = category['accuracy']
+        self.models['category'] = category['model']
+        self.label_encoder = category['label_encoder']
+        self.hyperparameters['category'] = category['hyperparameters']
+        
+        cascade_key = cache.key('cascade_models', category_key, Config.CASCADE_C, Config.CASCADE_THRESHOLD)
+        cascade = cache.run('cascade_models', cascade_key, lambda: self._run_cascade_stage(df, X))
+        self.models.update(cascade['models'])
+        self.cascade_report = cascade['report']
+        
+        self.build_domain_index(df)
+        
+        heads_key = cache.key(
+            'user_heads', importance_key, Config.USER_HEAD_MIN_SAMPLES, Config.USER_HEAD_C, Config.RANDOM_STATE
+        )
+        heads_path = cache.path('user_heads', heads_key, '.bin') if cache.enabled else None
+        heads_outputs = (heads_path, head_index_path(heads_path)) if heads_path else ()
+        user_heads = cache.run(
+            'user_heads', heads_key,
+            lambda: self.train_user_heads(df, X=X, data_path=heads_path),
+            outputs=heads_outputs
+        )
+        if heads_path:
+            data_path = os.path.join(Config.MODEL_PATH, Config.USER_HEADS_NAME)
+            shutil.copyfile(heads_path, data_path)
+            shutil.copyfile(head_index_path(heads_path), head_index_path(data_path))
+        
+        print("\nStage timings: " + ", ".join(
+            f"{stage}={seconds:.2f}s ({cache.status[stage]}, peak RSS so far {format_mb(cache.peak_rss_so_far[stage])})"
+            for stage, seconds in cache.timings.items()
+        ))
         
         # Save models
         self.save_models()
+        report = self.save_training_report(cache)
         
         print("\n" + "="*50)
         print("TRAINING COMPLETED SUCCESSFULLY!")
         print("="*50)
         print(f"Importance Classifier Accuracy: {importance_accuracy:.4f}")
         print(f"Category Classifier Accuracy: {category_accuracy:.4f}")
+        print(f"Peak RSS: {format_mb(report['peak_rss_bytes'])}" + (
+            f" (budget {self.budget.memory_bytes / 2 ** 20:.0f} MB)" if self.budget is not None else ""
+        ))
         print(f"Models saved to: {Config.MODEL_PATH}")
         print("\nYou can now start the Flask API server to use the trained models.")
         
         return {
             'importance_accuracy': importance_accuracy,
             'category_accuracy': category_accuracy,
-            'training_samples': len(df)
+            'user_heads': user_heads,
+            'training_samples': len(df),
+            'peak_rss_bytes': report['peak_rss_bytes'],
+            'stage_timings': dict(cache.timings)
         }
 
 def main():
@@ -263,7 +715,7 @@ def main():
         print("\n🚀 Next Steps:")
         print("1. Replace sample data with real email data")
         print("2. Retrain the model with more data")
-        print("3. Start the Flask API: python predict.py")
+        print("3. Start the Flask API: python serve.py")
         print("4. Test the API with your Node.js backend")
         
     else:
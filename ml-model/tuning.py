@@ -0,0 +1,191 @@
+import math
+import time
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from sklearn.preprocessing import normalize
+from sklearn.svm import SVC
+from config import Config
+
+# Hyperparameter spaces per model family
+IMPORTANCE_SEARCH_SPACE = {
+    'logistic_regression': {
+        'C': [0.01, 0.1, 1.0, 10.0, 100.0]
+    },
+    'random_forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [None, 10, 20, 40],
+        'min_samples_split': [2, 5, 10]
+    },
+    'svm': {
+        'C': [0.1, 1.0, 10.0],
+        'gamma': ['scale', 0.01, 0.1]
+    }
+}
+
+CATEGORY_SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [None, 10, 20, 40],
+        'min_samples_split': [2, 5, 10],
+        'class_weight': [None, 'balanced']
+    }
+}
+
+
+def build_estimator(name, params, probability=True):
+    """Instantiate a model family with the given hyperparameters"""
+    if name == 'logistic_regression':
+        return LogisticRegression(random_state=Config.RANDOM_STATE, max_iter=1000, **params)
+    if name == 'random_forest':
+        return RandomForestClassifier(random_state=Config.RANDOM_STATE, n_jobs=1, **params)
+    if name == 'svm':
+        return SVC(probability=probability, random_state=Config.RANDOM_STATE, **params)
+    raise ValueError(f"Unknown model family: {name}")
+
+
+def _evaluate(estimator, X, y, train_idx, test_idx):
+    """Fit one candidate on one fold and return its accuracy"""
+    if len(np.unique(y[train_idx])) < 2:
+        return 0.0
+    estimator.fit(X[train_idx], y[train_idx])
+    return accuracy_score(y[test_idx], estimator.predict(X[test_idx]))
+
+
+class SuccessiveHalvingSearch:
+    """Budgeted successive-halving search over model families and settings.
+
+    Every round trains the surviving candidates on a larger share of each
+    training fold (and, for forests, more trees) and keeps the best
+    1/`factor`. Folds are split once and the featurized matrix is shared by
+    all candidates and rounds. No round starts that is estimated to end after
+    `budget_seconds` (the previous round's time, scaled by the change in
+    candidates and sample size); the best candidate of the last finished
+    round is returned.
+
+    `text_columns` (the number of leading TF-IDF columns in X) enables
+    searching over the vocabulary size: candidates with a smaller
+    `max_features` only see the highest-weighted text columns, re-normalized
+    the way a vectorizer restricted to those terms produces them. Deploy the
+    winner with the terms of `selected_text_columns`.
+    """
+
+    def __init__(self, search_space, n_candidates=None, factor=None, budget_seconds=None,
+                 n_jobs=None, cv=None, text_columns=None, max_features_options=None):
+        self.search_space = search_space
+        self.n_candidates = n_candidates or Config.TUNING_N_CANDIDATES
+        self.factor = factor or Config.TUNING_HALVING_FACTOR
+        self.budget_seconds = budget_seconds if budget_seconds is not None else Config.TUNING_BUDGET_SECONDS
+        self.n_jobs = n_jobs or Config.N_JOBS
+        self.cv = cv or Config.TUNING_CV_FOLDS
+        self.text_columns = text_columns
+        self.max_features_options = max_features_options or []
+        self.history = []
+        self.text_order = None
+
+    def _sample_candidates(self):
+        families = list(self.search_space)
+        per_family = max(1, self.n_candidates // len(families))
+        candidates = []
+        for offset, name in enumerate(families):
+            space = dict(self.search_space[name])
+            if self.text_columns and self.max_features_options:
+                space['max_features'] = [k for k in self.max_features_options if k < self.text_columns] + [self.text_columns]
+            n_iter = min(per_family, math.prod(len(values) for values in space.values()))
+            sampler = ParameterSampler(space, n_iter=n_iter, random_state=Config.RANDOM_STATE + offset)
+            candidates.extend((name, params) for params in sampler)
+        return candidates
+
+    def selected_text_columns(self, max_features):
+        """Text columns kept for a vocabulary of `max_features` terms (highest total TF-IDF weight first)"""
+        return np.sort(self.text_order[:max_features])
+
+    def _restricted_input(self, X, max_features):
+        """X with only the selected text columns, each row's text part l2-normalized again"""
+        if max_features is None or max_features >= self.text_columns:
+            return X
+        text = normalize(X[:, self.selected_text_columns(max_features)])
+        other = X[:, self.text_columns:]
+        if sparse.issparse(X):
+            return sparse.hstack([text, other], format='csr')
+        return np.hstack([text, other])
+
+    def fit(self, X, y):
+        """Run the search and return (family, params, cv_score) of the winner"""
+        start = time.monotonic()
+        y = np.asarray(y)
+        rng = np.random.RandomState(Config.RANDOM_STATE)
+        folds = list(StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=Config.RANDOM_STATE).split(X, y))
+
+        candidates = self._sample_candidates()
+        n_rounds = max(1, math.ceil(math.log(len(candidates), self.factor)))
+        
+        # Smaller vocabularies keep the text columns with the highest total TF-IDF weight;
+        # each vocabulary size gets one restricted copy of X shared by its candidates
+        if self.text_columns:
+            weights = np.asarray(X[:, :self.text_columns].sum(axis=0)).ravel()
+            self.text_order = np.argsort(-weights, kind='stable')
+        inputs = {}
+        for _, params in candidates:
+            max_features = params.get('max_features')
+            if max_features not in inputs:
+                inputs[max_features] = self._restricted_input(X, max_features)
+        survivors = list(range(len(candidates)))
+        best = None
+
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            for round_index in range(n_rounds):
+                fraction = 1.0 / self.factor ** (n_rounds - 1 - round_index)
+                round_start = time.monotonic()
+                if best is not None:
+                    # Fit time grows with the sample, and for forests with the trees as well
+                    growth = fraction / previous_fraction
+                    if any('n_estimators' in candidates[i][1] for i in survivors):
+                        growth **= 2
+                    estimate = previous_seconds * len(survivors) / previous_candidates * growth
+                    if round_start - start + estimate > self.budget_seconds:
+                        print(f"  Tuning budget of {self.budget_seconds}s reached after {round_index} rounds "
+                              f"(next round estimated at {estimate:.1f}s)")
+                        break
+
+                round_folds = [
+                    (rng.permutation(train_idx)[:max(self.cv * 2, int(len(train_idx) * fraction))], test_idx)
+                    for train_idx, test_idx in folds
+                ]
+
+                jobs = []
+                for i in survivors:
+                    name, params = candidates[i]
+                    model_params = {key: value for key, value in params.items() if key != 'max_features'}
+                    if 'n_estimators' in model_params:
+                        model_params['n_estimators'] = max(10, int(model_params['n_estimators'] * fraction))
+                    estimator = build_estimator(name, model_params, probability=False)
+                    for train_idx, test_idx in round_folds:
+                        jobs.append(delayed(_evaluate)(clone(estimator), inputs[params.get('max_features')],
+                                                       y, train_idx, test_idx))
+
+                scores = np.array(parallel(jobs)).reshape(len(survivors), len(round_folds)).mean(axis=1)
+                ranked = [survivors[i] for i in np.argsort(-scores, kind='stable')]
+                best = (ranked[0], float(scores.max()))
+
+                self.history.append({
+                    'round': round_index,
+                    'sample_fraction': fraction,
+                    'candidates': len(survivors),
+                    'best_score': best[1],
+                    'elapsed_seconds': time.monotonic() - start
+                })
+                print(f"  Round {round_index}: {len(survivors)} candidates on {fraction:.0%} of samples, "
+                      f"best CV accuracy {best[1]:.4f}")
+
+                previous_seconds = time.monotonic() - round_start
+                previous_candidates, previous_fraction = len(survivors), fraction
+                survivors = ranked[:max(1, len(survivors) // self.factor)]
+
+        name, params = candidates[best[0]]
+        return name, params, best[1]
@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+import joblib
+import numpy as np
+from config import Config
+
+# One record per non-zero weight; a user's head is a contiguous run of records
+HEAD_DTYPE = np.dtype([('index', np.int32), ('weight', np.float32)])
+
+
+def head_index_path(data_path):
+    """Path of the index file that sits next to the head data file"""
+    return f"{data_path}.index.joblib"
+
+
+class UserHeadWriter:
+    """Stream per-user sparse linear heads into a single data file"""
+
+    def __init__(self, data_path, n_features):
+        self.data_path = data_path
+        self.n_features = n_features
+        self.heads = {}  # user id -> (offset, length, bias)
+        self._offset = 0
+        self._file = open(data_path, 'wb')
+
+    def add(self, user_id, coef, bias):
+        """Append the non-zero weights of one user's head"""
+        coef = np.asarray(coef, dtype=np.float32).ravel()
+        if coef.size != self.n_features:
+            raise ValueError(f"Head for {user_id} has {coef.size} weights, expected {self.n_features}")
+
+        nonzero = np.flatnonzero(coef)
+        records = np.empty(nonzero.size, dtype=HEAD_DTYPE)
+        records['index'] = nonzero
+        records['weight'] = coef[nonzero]
+        self._file.write(records.tobytes())
+
+        self.heads[str(user_id)] = (self._offset, nonzero.size, float(bias))
+        self._offset += nonzero.size
+
+    def close(self):
+        """Flush the data file and write the index"""
+        self._file.close()
+        joblib.dump({
+            'n_features': self.n_features,
+            'n_records': self._offset,
+            'heads': self.heads
+        }, head_index_path(self.data_path))
+
+
+class UserHeadStore:
+    """Per-user importance heads loaded on demand from a memory-mapped file.
+
+    Only the small index stays resident; individual heads are copied out of
+    the memory map when first used and kept in an LRU cache.
+    """
+
+    def __init__(self, data_path, cache_size=None):
+        index = joblib.load(head_index_path(data_path))
+        self.n_features = index['n_features']
+        self.heads = index['heads']
+        self.cache_size = cache_size or Config.USER_HEAD_CACHE_SIZE
+
+        if index['n_records']:
+            self._records = np.memmap(data_path, dtype=HEAD_DTYPE, mode='r', shape=(index['n_records'],))
+        else:
+            self._records = np.empty(0, dtype=HEAD_DTYPE)
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def has_head(self, user_id):
+        return user_id is not None and str(user_id) in self.heads
+
+    def get_head(self, user_id):
+        """Return (indices, weights, bias) for a user, or None"""
+        if not self.has_head(user_id):
+            return None
+        user_id = str(user_id)
+
+        with self._lock:
+            head = self._cache.get(user_id)
+            if head is not None:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return head
+
+            self.misses += 1
+            offset, length, bias = self.heads[user_id]
+            records = self._records[offset:offset + length]
+            head = (np.array(records['index']), np.array(records['weight']), bias)
+
+            self._cache[user_id] = head
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return head
+
+    def predict_proba(self, user_id, indices, values):
+        """Probability that an email is important for the user.
+
+        `indices`/`values` are the non-zero entries of the shared feature row.
+        """
+        head = self.get_head(user_id)
+        if head is None:
+            return None
+        head_indices, head_weights, bias = head
+        _, x_pos, w_pos = np.intersect1d(indices, head_indices, assume_unique=True, return_indices=True)
+        score = float(np.dot(values[x_pos], head_weights[w_pos])) + bias
+        return 1.0 / (1.0 + np.exp(-score))
+
+    def contributions(self, user_id, indices, values):
+        """(feature indices, log-odds contributions, bias) of the user's head for one email"""
+        head_indices, head_weights, bias = self.get_head(user_id)
+        features, x_pos, w_pos = np.intersect1d(indices, head_indices, assume_unique=True, return_indices=True)
+        return features, values[x_pos] * head_weights[w_pos], float(bias)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'users': len(self.heads),
+                'cached_heads': len(self._cache),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses
+            }
+
+
+def load_user_heads():
+    """Load the user head store configured in Config, if it exists"""
+    data_path = os.path.join(Config.MODEL_PATH, Config.USER_HEADS_NAME)
+    if not os.path.exists(head_index_path(data_path)):
+        return None
+    return UserHeadStore(data_path)
@@ -0,0 +1,126 @@
+from hashlib import blake2b
+import numpy as np
+from config import Config
+
+_MASK_32 = 0xFFFFFFFF
+
+
+def stable_hashes(keys):
+    """64-bit hashes of string keys that, unlike the salted builtin hash(), are the same in every process"""
+    digests = b''.join(blake2b(key.encode('utf-8'), digest_size=8).digest() for key in keys)
+    return np.frombuffer(digests, dtype=np.int64)
+
+
+class CountMinSketch:
+    """Approximate counts for an unbounded set of string keys in fixed memory"""
+
+    def __init__(self, width=None, depth=None):
+        self.width = width or Config.SKETCH_WIDTH
+        self.depth = depth or Config.SKETCH_DEPTH
+        self.table = np.zeros((self.depth, self.width), dtype=np.int32)
+        self._rows = np.arange(self.depth, dtype=np.int64)[:, None]
+
+    def _indices(self, keys):
+        # Double hashing: row i uses h1 + i * h2
+        hashes = stable_hashes(keys)
+        h1 = hashes & _MASK_32
+        h2 = ((hashes >> 32) & _MASK_32) | 1
+        return (h1[None, :] + self._rows * h2[None, :]) % self.width
+
+    def add(self, keys, counts=None):
+        """Increment each key by its count (1 by default)"""
+        if not keys:
+            return
+        indices = self._indices(keys)
+        counts = None if counts is None else np.asarray(counts, dtype=np.float64)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(indices[row], weights=counts, minlength=self.width).astype(np.int32)
+
+    def estimate(self, keys):
+        """Upper-bound estimate of each key's count"""
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        indices = self._indices(keys)
+        return self.table[self._rows, indices].min(axis=0)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+class SketchVocabularyBuilder:
+    """Pick the top unigrams and bigrams of a corpus with bounded memory.
+
+    Term and document frequencies go into count-min sketches while a bounded
+    candidate set tracks the current heavy hitters, so the full n-gram
+    dictionary that TfidfVectorizer builds is never materialized. The result
+    applies the same min_df / max_df / max_features rules as scikit-learn.
+    """
+
+    def __init__(self, analyzer, max_features, min_df=1, max_df=1.0,
+                 width=None, depth=None, candidate_factor=None):
+        self.analyzer = analyzer
+        self.max_features = max_features
+        self.min_df = min_df
+        self.max_df = max_df
+        self.capacity = max_features * (candidate_factor or Config.VOCAB_CANDIDATE_FACTOR)
+        self.term_counts = CountMinSketch(width, depth)
+        self.doc_counts = CountMinSketch(width, depth)
+        self.candidates = set()
+        self.n_documents = 0
+
+    def partial_fit(self, documents):
+        """Update the sketches with a chunk of documents"""
+        term_counts = {}
+        doc_counts = {}
+        for document in documents:
+            terms = self.analyzer(document)
+            for term in terms:
+                term_counts[term] = term_counts.get(term, 0) + 1
+            for term in set(terms):
+                doc_counts[term] = doc_counts.get(term, 0) + 1
+            self.n_documents += 1
+
+        # Exact counts are only held for one chunk at a time
+        terms = list(term_counts)
+        self.term_counts.add(terms, [term_counts[term] for term in terms])
+        self.doc_counts.add(terms, [doc_counts[term] for term in terms])
+        self.candidates.update(terms)
+
+        if len(self.candidates) > 2 * self.capacity:
+            self._prune(self.capacity)
+        return self
+
+    def _prune(self, keep):
+        terms = list(self.candidates)
+        estimates = self.term_counts.estimate(terms)
+        top = np.argsort(-estimates, kind='stable')[:keep]
+        self.candidates = {terms[i] for i in top}
+
+    def build_vocabulary(self):
+        """Apply the document-frequency limits and return {term: column}"""
+        terms = sorted(self.candidates)
+        term_counts = self.term_counts.estimate(terms)
+        doc_counts = self.doc_counts.estimate(terms)
+
+        min_count = self.min_df if isinstance(self.min_df, int) else self.min_df * self.n_documents
+        max_count = self.max_df if isinstance(self.max_df, int) else self.max_df * self.n_documents
+        keep = (doc_counts >= min_count) & (doc_counts <= max_count)
+
+        kept = [(terms[i], term_counts[i]) for i in np.flatnonzero(keep)]
+        kept.sort(key=lambda item: -item[1])
+        selected = sorted(term for term, _ in kept[:self.max_features])
+        return {term: i for i, term in enumerate(selected)}
+
+    def fit(self, documents, chunk_size=None):
+        """Build the vocabulary from an iterable of documents"""
+        chunk_size = chunk_size or Config.VOCAB_CHUNK_SIZE
+        chunk = []
+        for document in documents:
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                self.partial_fit(chunk)
+                chunk = []
+        if chunk:
+            self.partial_fit(chunk)
+        return self.build_vocabulary()
@@ -0,0 +1,131 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from data_processor import EmailDataProcessor
+
+# Each worker process owns exactly one processor and handles one email at a
+# time, so html2text parse state can never be shared between requests.
+_worker_processor = None
+
+# Upper bound on the emails a batch hands to a worker at once
+MAX_CHUNK_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    global _worker_processor
+    _worker_processor = EmailDataProcessor()
+
+
+def _extract_features(email_data):
+    """Extract features in a worker, returning errors instead of raising"""
+    try:
+        return _worker_processor.extract_features(email_data), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _extract_chunk(emails):
+    return [_extract_features(email_data) for email_data in emails]
+
+
+class PreprocessingPool:
+    """Farm CPU-bound feature extraction out of the serving process.
+
+    With `max_workers=0` extraction runs inline on a processor that is local
+    to the calling thread, which is still safe under a threaded server.
+    If a worker dies, the executor is rebuilt and the call retried once.
+    """
+
+    def __init__(self, max_workers=None, start_method=None):
+        self.max_workers = Config.PREPROCESS_WORKERS if max_workers is None else max_workers
+        self._local = threading.local()
+        self._executor = None
+        self._restart_lock = threading.Lock()
+        self.restarts = 0
+
+        if self.max_workers > 0:
+            self._context = multiprocessing.get_context(start_method or Config.PREPROCESS_START_METHOD)
+            self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._context,
+            initializer=_init_worker
+        )
+
+    def _with_restart(self, run):
+        """Call `run(executor)`, rebuilding a broken pool and retrying once"""
+        executor = self._executor
+        try:
+            return run(executor)
+        except BrokenProcessPool:
+            with self._restart_lock:
+                # Concurrent callers see the same broken pool; only the first replaces it
+                if self._executor is executor:
+                    logger.warning("Preprocessing worker died; restarting the process pool")
+                    executor.shutdown(wait=False)
+                    self._executor = self._new_executor()
+                    self.restarts += 1
+            return run(self._executor)
+
+    @property
+    def processor(self):
+        """Processor owned by the current thread (inline mode)"""
+        processor = getattr(self._local, 'processor', None)
+        if processor is None:
+            processor = EmailDataProcessor()
+            self._local.processor = processor
+        return processor
+
+    def extract_features(self, email_data):
+        """Extract features for a single email"""
+        if self._executor is None:
+            return self.processor.extract_features(email_data)
+
+        features, error = self._with_restart(
+            lambda executor: executor.submit(_extract_features, email_data).result()
+        )
+        if error is not None:
+            raise ValueError(error)
+        return features
+
+    def extract_batch(self, emails):
+        """Extract features for many emails, returning (features, error) pairs in order"""
+        if self._executor is None:
+            results = []
+            for email_data in emails:
+                try:
+                    results.append((self.processor.extract_features(email_data), None))
+                except Exception as e:
+                    results.append((None, str(e)))
+            return results
+
+        # Only one chunk per worker is in flight at a time, so a single email
+        # submitted meanwhile waits behind a few chunks instead of the whole batch
+        chunksize = max(1, min(MAX_CHUNK_SIZE, len(emails) // (self.max_workers * 4)))
+        chunks = [emails[i:i + chunksize] for i in range(0, len(emails), chunksize)]
+
+        def run(executor):
+            pending = deque()
+            results = []
+            for chunk in chunks:
+                if len(pending) >= self.max_workers:
+                    results.extend(pending.popleft().result())
+                pending.append(executor.submit(_extract_chunk, chunk))
+            while pending:
+                results.extend(pending.popleft().result())
+            return results
+
+        return self._with_restart(run)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -54,7 +54,7 @@ router.get('/sync', authenticateToken, async (req, res) => {
 
         if (!existingEmail) {
           // Apply filtering to new email
-          const filterResults = await filterService.filterEmail(emailData);
+          const filterResults = await filterService.filterEmail(emailData, userId);
 
           // Create new email record
           const newEmail = new Email({
@@ -1,5 +1,14 @@
 const axios = require('axios');
 
+// A deadline is near from today until this many days ahead, whether it came
+// from the ML service or from the regex fallback
+const NEAR_DEADLINE_DAYS = 14;
+
+const MONTHS = [
+  'january', 'february', 'march', 'april', 'may', 'june',
+  'july', 'august', 'september', 'october', 'november', 'december'
+];
+
 class FilterService {
   constructor() {
     // Keywords for different categories
@@ -49,24 +58,24 @@ class FilterService {
     };
   }
 
-  async filterEmail(emailData) {
+  async filterEmail(emailData, userId) {
     try {
       const { subject, body, sender } = emailData;
       const fullText = `${subject} ${body.text || ''} ${sender.email}`.toLowerCase();
 
-      // Apply keyword-based filtering
-      const keywordResults = this.applyKeywordFiltering(fullText);
-
       // Apply ML prediction if enabled
       let mlResults = null;
       if (process.env.ML_API_ENABLED === 'true') {
         try {
-          mlResults = await this.getMlPrediction(emailData);
+          mlResults = await this.getMlPrediction(emailData, userId);
         } catch (error) {
           console.warn('ML prediction failed, using keyword-based filtering only:', error.message);
         }
       }
 
+      // Apply keyword-based filtering, reusing the deadline the ML service extracted
+      const keywordResults = this.applyKeywordFiltering(fullText, mlResults);
+
       // Combine results
       const finalResults = this.combineResults(keywordResults, mlResults);
 
@@ -87,7 +96,7 @@ class FilterService {
     }
   }
 
-  applyKeywordFiltering(text) {
+  applyKeywordFiltering(text, mlResults = null) {
     const tags = [];
     let priority = 'low';
     let isImportant = false;
@@ -121,7 +130,7 @@ class FilterService {
     }
 
     // Additional heuristics
-    if (text.includes('deadline') && this.containsDateInNearFuture(text)) {
+    if (this.hasNearDeadline(text, mlResults)) {
       priority = 'high';
       isImportant = true;
     }
@@ -129,16 +138,22 @@ class FilterService {
     return { tags, priority, isImportant };
   }
 
-  async getMlPrediction(emailData) {
+  async getMlPrediction(emailData, userId) {
     try {
       const response = await axios.post(`${process.env.ML_API_URL}/predict`, {
         subject: emailData.subject,
         body: emailData.body.text || '',
-        sender: emailData.sender.email
+        sender: emailData.sender.email,
+        date: emailData.date,
+        id: emailData.gmailId,
+        // Scopes the email's similar-email index entry to its owner
+        user_id: userId ? userId.toString() : undefined
       }, {
         timeout: 5000,
         headers: {
-          'Content-Type': 'application/json'
+          'Content-Type': 'application/json',
+          // Gmail sync is backfill work; keep it out of the dashboard's interactive lane
+          'X-Request-Lane': 'bulk'
         }
       });
 
@@ -205,15 +220,56 @@ class FilterService {
     return labels[category] || category;
   }
 
+  hasNearDeadline(text, mlResults) {
+    // The ML service already scanned the email for dates; only rescan the
+    // text when its response has no deadline field (older service, extraction off)
+    if (mlResults && 'deadline' in mlResults) {
+      return this.isInNearFuture(mlResults.deadline);
+    }
+    return text.includes('deadline') && this.containsDateInNearFuture(text);
+  }
+
+  isInNearFuture(isoDate) {
+    if (!isoDate) return false;
+    // Date-only ISO strings parse as UTC midnight; read them as local dates
+    const deadline = new Date(isoDate.length === 10 ? `${isoDate}T00:00:00` : isoDate);
+    return this.isWithinDeadlineHorizon(deadline);
+  }
+
+  isWithinDeadlineHorizon(deadline) {
+    if (Number.isNaN(deadline.getTime())) return false;
+    const startOfToday = new Date();
+    startOfToday.setHours(0, 0, 0, 0);
+    const horizon = new Date(startOfToday);
+    horizon.setDate(horizon.getDate() + NEAR_DEADLINE_DAYS);
+    return deadline >= startOfToday && deadline < horizon;
+  }
+
   containsDateInNearFuture(text) {
-    // Simple heuristic to check if text contains dates in near future
-    const datePatterns = [
-      /\b(today|tomorrow|this week|next week)\b/i,
-      /\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b/,
-      /\b(january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2}\b/i
-    ];
-
-    return datePatterns.some(pattern => pattern.test(text));
+    // Relative words are within the horizon by definition
+    if (/\b(today|tomorrow|this week|next week)\b/i.test(text)) return true;
+
+    // Numeric dates are read month first, like the ML service's default order
+    for (const [, month, day, year] of text.matchAll(/\b(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{2,4})\b/g)) {
+      const fullYear = year.length === 2 ? 2000 + Number(year) : Number(year);
+      const date = new Date(fullYear, Number(month) - 1, Number(day));
+      // Out-of-range parts roll over into another date; skip them
+      if (date.getMonth() !== Number(month) - 1 || date.getDate() !== Number(day)) continue;
+      if (this.isWithinDeadlineHorizon(date)) return true;
+    }
+
+    // Month names without a year mean their next occurrence
+    const monthNames = new RegExp(`\\b(${MONTHS.join('|')})\\s+(\\d{1,2})\\b`, 'gi');
+    for (const [, monthName, day] of text.matchAll(monthNames)) {
+      const startOfToday = new Date();
+      startOfToday.setHours(0, 0, 0, 0);
+      const date = new Date(startOfToday.getFullYear(), MONTHS.indexOf(monthName.toLowerCase()), Number(day));
+      if (date.getDate() !== Number(day)) continue;
+      if (date < startOfToday) date.setFullYear(date.getFullYear() + 1);
+      if (this.isWithinDeadlineHorizon(date)) return true;
+    }
+
+    return false;
   }
 
   // Method to update keywords dynamically